@@ -1,24 +1,85 @@
 #!/usr/bin/env python3
+# -*- coding: gbk -*-
 """
 
 ִ֧conf/xml롢༭áһű
 """
 
 import os
+import io
 import json
+import hashlib
 import tempfile
 import uuid
 import re
+import itertools
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_file, session
+from functools import wraps
+from flask import (Flask, render_template, request, jsonify, send_file, session, make_response, g,
+                   Response, stream_with_context)
 import xmltodict
 from werkzeug.utils import secure_filename
 
+from converters.bulk_template import UUID_NAMESPACE, BulkTemplate, BulkTemplateError, parse_rows
+from converters.capacity import CapacityPlanner, PlacementError
+from converters.clone_provisioning import LIBVIRT_CLONE_FUNCTIONS, CloneError, clone_settings, libvirt_clone
+from converters.config_diff import ConfigDiffer, DiffError
+from converters.config_sections import PVE_CONFIG_SECTIONS
+from converters.device_layout import DeviceLayout, pci_address_xml
+from converters.disk_allocation import (DiskAllocationError, allocation_settings, disk_format, image_extension,
+                                        qemu_img_options)
+from converters.disk_profiles import apply_disk_profile, pve_options_from_driver
+from converters.idempotent_script import (libvirt_disk_plan, render_libvirt_script, render_pve_clone_block,
+                                          render_pve_script)
+from converters.net_tuning import apply_net_tuning, pve_net_options_from_interface
+from converters.pve_parser import parse_disk_config
+from converters.script_runtime import render_runtime, runtime_bodies
+from converters.topology import HostTopology, TopologyError, VmTopology, pve_options_from_domain
+from converters.validator import ConfigValidator
+from services import compression, tracing
+from services.admission import AdmissionController, AdmissionRejected, RouteLimit
+from services.archive import ARCHIVE_FORMATS, ArchiveError, check_format, stream_archive
+from services.history import ConfigHistory, HistoryError
+from services.jobs import JobManager, JobError
+from services.profiling import ProfileStore
+from services.sync import DirectoryIndex
+from services.tracing import traced
+from services.uploads import UploadError, UploadManager
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'vm-config-generator-secret-2024')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
+# PROFILE_ENABLED=1 󣬻Я X-Profile-Token ͷ
+app.config['PROFILE_ENABLED'] = os.environ.get('PROFILE_ENABLED', '0') == '1'
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_STORE = ProfileStore(capacity=int(os.environ.get('PROFILE_BUFFER_SIZE', 20)))
+
+# ·׷٣TRACE_EXPORTER=log JSON־TRACE_EXPORTER=otlp-file дOTLP JSONļ
+tracing.configure(os.environ.get('TRACE_EXPORTER', ''),
+                  os.environ.get('TRACE_FILE', 'traces.otlp.jsonl'))
+
+# CPU/NUMA֣HOST_LAYOUT ָJSONlscpuļúѡCPU˵ʱ
+HOST_TOPOLOGY = None
+if os.environ.get('HOST_LAYOUT'):
+    try:
+        HOST_TOPOLOGY = HostTopology.load(os.environ['HOST_LAYOUT'])
+    except (OSError, TopologyError) as e:
+        print(f"ʧ: {e}")
+
+# 嵥滮δи inventory ʱȡJSONļ
+app.config['HOST_INVENTORY'] = os.environ.get('HOST_INVENTORY', 'host_inventory.json')
+
+# ģ嵥
+app.config['BULK_MAX_ROWS'] = int(os.environ.get('BULK_MAX_ROWS', 10000))
+
+# Ӧѹ Accept-Encoding ѹС COMPRESS_MIN_SIZE ֽڵıӦ Content-Encoding Զѹ
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', compression.DEFAULT_MIN_SIZE))
+app.wsgi_app = compression.DecompressingMiddleware(app.wsgi_app, app.config['MAX_CONTENT_LENGTH'])
+# űеĹ̶ʱԤѹһ
+SCRIPT_STATIC_BLOCKS = compression.StaticBlocks(runtime_bodies() + [LIBVIRT_CLONE_FUNCTIONS])
+
 # ֵ֧
 CONFIG_TYPES = {
     'pve': {
@@ -33,95 +94,41 @@ CONFIG_TYPES = {
     }
 }
 
-# PVEѡ
-PVE_CONFIG_SECTIONS = {
-    'basic': {
-        'name': '',
-        'options': [
-            {'key': 'vmid', 'type': 'number', 'label': 'ID', 'default': 100, 'min': 100, 'max': 999999},
-            {'key': 'name', 'type': 'text', 'label': '', 'default': 'vm-default'},
-            {'key': 'memory', 'type': 'number', 'label': 'ڴ(MB)', 'default': 2048, 'min': 256, 'step': 256},
-            {'key': 'balloon', 'type': 'number', 'label': 'Balloonڴ(MB)', 'default': 0, 'min': 0},
-            {'key': 'cores', 'type': 'number', 'label': 'CPU', 'default': 2, 'min': 1, 'max': 128},
-            {'key': 'sockets', 'type': 'number', 'label': 'CPU', 'default': 1, 'min': 1, 'max': 4},
-            {'key': 'cpu', 'type': 'select', 'label': 'CPU', 'default': 'host', 
-             'options': ['host', 'qemu64', 'kvm64', 'core2duo', 'pentium3', 'qemu32']},
-            {'key': 'numa', 'type': 'checkbox', 'label': 'NUMA', 'default': '0'},
-            {'key': 'ostype', 'type': 'select', 'label': 'ϵͳ', 'default': 'l26',
-             'options': ['l26', 'win11', 'win10', 'win8', 'win7', 'solaris', 'other']},
-            {'key': 'onboot', 'type': 'checkbox', 'label': '', 'default': '1'},
-            {'key': 'startup', 'type': 'text', 'label': '˳', 'default': 'order=1'},
-            {'key': 'agent', 'type': 'checkbox', 'label': 'QEMU Guest Agent', 'default': '1'},
-        ]
-    },
-    'boot': {
-        'name': '',
-        'options': [
-            {'key': 'boot', 'type': 'text', 'label': '豸˳', 'default': 'order=scsi0;ide2;net0'},
-            {'key': 'bios', 'type': 'select', 'label': 'BIOS', 'default': 'ovmf', 'options': ['ovmf', 'seabios']},
-            {'key': 'machine', 'type': 'select', 'label': '', 'default': 'q35', 
-             'options': ['q35', 'pc', 'pc-i440fx']},
-            {'key': 'acpi', 'type': 'checkbox', 'label': 'ACPI', 'default': '1'},
-            {'key': 'kvm', 'type': 'checkbox', 'label': 'KVMӲ⻯', 'default': '1'},
-        ]
-    },
-    'disks': {
-        'name': '',
-        'options': [
-            {'key': 'scsi0', 'type': 'text', 'label': 'SCSI0', 
-             'default': 'local-lvm:vm-100-disk-0,size=32G', 'placeholder': '洢:ID,size=С'},
-            {'key': 'scsi1', 'type': 'text', 'label': 'SCSI1', 'default': ''},
-            {'key': 'virtio0', 'type': 'text', 'label': 'VirtIO0', 'default': ''},
-            {'key': 'ide0', 'type': 'text', 'label': 'IDE0', 'default': ''},
-            {'key': 'ide2', 'type': 'text', 'label': 'CD/DVD', 'default': 'none,media=cdrom'},
-            {'key': 'scsihw', 'type': 'select', 'label': 'SCSI', 'default': 'virtio-scsi-pci',
-             'options': ['virtio-scsi-pci', 'virtio-scsi-single', 'lsi', 'lsi53c895a', 'megasas', 'pvscsi']},
-            {'key': 'discard', 'type': 'checkbox', 'label': 'TRIM', 'default': 'on'},
-            {'key': 'cache', 'type': 'select', 'label': '̻', 'default': 'writeback',
-             'options': ['none', 'writeback', 'writethrough', 'directsync', 'unsafe']},
-        ]
-    },
-    'network': {
-        'name': '',
-        'options': [
-            {'key': 'net0', 'type': 'text', 'label': 'ӿ0', 
-             'default': 'virtio=62:7C:6B:3A:32:1D,bridge=vmbr0,firewall=1'},
-            {'key': 'net1', 'type': 'text', 'label': 'ӿ1', 'default': ''},
-            {'key': 'net2', 'type': 'text', 'label': 'ӿ2', 'default': ''},
-            {'key': 'net3', 'type': 'text', 'label': 'ӿ3', 'default': ''},
-            {'key': 'bridge', 'type': 'text', 'label': 'Ĭ', 'default': 'vmbr0'},
-            {'key': 'firewall', 'type': 'checkbox', 'label': '÷ǽ', 'default': '1'},
-            {'key': 'mtu', 'type': 'number', 'label': 'MTUС', 'default': 1500, 'min': 576, 'max': 9000},
-        ]
-    },
-    'display': {
-        'name': 'ʾ',
-        'options': [
-            {'key': 'vga', 'type': 'select', 'label': 'Կ', 'default': 'std',
-             'options': ['std', 'cirrus', 'vmware', 'qxl', 'virtio', 'none']},
-            {'key': 'memory', 'type': 'number', 'label': 'ԴС(MB)', 'default': 16, 'min': 4, 'max': 512},
-            {'key': 'serial0', 'type': 'text', 'label': '0', 'default': 'socket'},
-            {'key': 'usb0', 'type': 'text', 'label': 'USB', 'default': 'host'},
-            {'key': 'keyboard', 'type': 'select', 'label': '̲', 'default': 'en-us',
-             'options': ['en-us', 'de', 'fr', 'es', 'jp']},
-        ]
-    },
-    'advanced': {
-        'name': '߼ѡ',
-        'options': [
-            {'key': 'smbios1', 'type': 'text', 'label': 'SMBIOS', 
-             'default': 'uuid=4c4c4544-004b-1010-8032-b3c04f4e3132'},
-            {'key': 'vmgenid', 'type': 'text', 'label': 'VM Generation ID', 
-             'default': '4c4c4544-004b-1010-8032-b3c04f4e3132'},
-            {'key': 'hugepages', 'type': 'select', 'label': 'ҳڴ', 'default': '',
-             'options': ['', '2', '1024', '2048', 'any']},
-            {'key': 'hotplug', 'type': 'checkbox', 'label': 'Ȳ', 'default': '1'},
-            {'key': 'protection', 'type': 'checkbox', 'label': 'ֹɾ', 'default': '0'},
-            {'key': 'tags', 'type': 'text', 'label': 'ǩ', 'default': ''},
-            {'key': 'description', 'type': 'textarea', 'label': '', 'default': ''},
-        ]
-    }
-}
+# ѡõУ
+CONFIG_VALIDATOR = ConfigValidator(PVE_CONFIG_SECTIONS)
+CONFIG_DIFFER = ConfigDiffer(PVE_CONFIG_SECTIONS)
+
+# űģʽfull ΪѴʱȷϺ󸲸ǣidempotent ΪݵȲ
+SCRIPT_MODES = ('full', 'idempotent')
+
+def validate_config(config_data, warnings=None):
+    """Уãشбwarnings ʱ׷ӲӰɵľ"""
+    with tracing.span('validate_config') as span:
+        errors = CONFIG_VALIDATOR.validate(config_data, warnings)
+        if isinstance(config_data, dict):
+            try:
+                clone_settings(config_data)
+            except CloneError as e:
+                errors.append({'key': 'clone_storage', 'label': '¡Ŀ洢', 'section': 'provisioning',
+                               'message': str(e)})
+            try:
+                allocation_settings(config_data)
+            except DiskAllocationError as e:
+                # ȡֵڿѡΧʱѡУѾ
+                if not any(error['key'] == e.key for error in errors):
+                    label = CONFIG_VALIDATOR.fields[e.key][1]
+                    errors.append({'key': e.key, 'label': label, 'section': 'disks', 'message': str(e)})
+            if warnings is not None and HOST_TOPOLOGY is not None and not errors:
+                # δЭ˾
+                try:
+                    topology = VmTopology(config_data, HOST_TOPOLOGY)
+                except (TopologyError, ValueError):
+                    topology = None
+                if topology is not None and topology.vcpu_pins:
+                    warnings.extend({'key': 'cpu_pinning', 'label': 'CPU', 'section': 'basic',
+                                     'message': message} for message in topology.warnings)
+        span.set(errors=len(errors))
+    return errors
 
 def load_default_config(config_type='pve'):
     """Ĭ"""
@@ -139,12 +146,14 @@ def load_default_config(config_type='pve'):
                             config[key.strip()] = value.strip()
         except:
             # ļڣʹӲĬֵ
+            # ͬѡԵһγֵĶΪ׼ʾе memory ڴС
             for section in PVE_CONFIG_SECTIONS.values():
                 for opt in section['options']:
-                    config[opt['key']] = opt.get('default', '')
+                    config.setdefault(opt['key'], opt.get('default', ''))
     
     return config
 
+@traced()
 def parse_pve_config(content):
     """PVEļ"""
     config = {}
@@ -168,6 +177,7 @@ def parse_pve_config(content):
     
     return config
 
+@traced()
 def parse_libvirt_xml(content):
     """Libvirt XMLļ"""
     try:
@@ -189,6 +199,9 @@ def parse_libvirt_xml(content):
             config['cpu_mode'] = cpu.get('@mode', '')
             config['cpu_check'] = cpu.get('@check', '')
         
+        # /ġNUMAڵ㡢ҳͰ
+        config.update(pve_options_from_domain(domain))
+        
         # ϵͳ
         os_config = domain.get('os', {})
         if isinstance(os_config, dict):
@@ -206,24 +219,50 @@ def parse_libvirt_xml(content):
             if not isinstance(disks, list):
                 disks = [disks]
             
+            # IO̵߳SCSI´̶ӦPVE iothread=1
+            controllers = devices.get('controller', [])
+            if not isinstance(controllers, list):
+                controllers = [controllers]
+            iothread_controllers = set()
+            for ctrl in controllers:
+                if isinstance(ctrl, dict) and ctrl.get('@type') == 'scsi':
+                    ctrl_driver = ctrl.get('driver')
+                    if isinstance(ctrl_driver, dict) and ctrl_driver.get('@iothread'):
+                        iothread_controllers.add(ctrl.get('@index', '0'))
+            
+            # ÿ߷ֱţscsi0scsi1virtio0 ...
+            bus_counts = {}
             for i, disk in enumerate(disks):
                 if isinstance(disk, dict):
                     device = disk.get('@device', '')
-                    disk_type = disk.get('@type', '')
-                    source = disk.get('source', {})
-                    target = disk.get('target', {})
+                    source = disk.get('source') or {}
+                    target = disk.get('target') or {}
                     
-                    if device == 'disk':
-                        source_file = source.get('@file', '')
+                    if device in ('disk', 'cdrom'):
+                        source_file = source.get('@file', source.get('@dev', ''))
                         target_dev = target.get('@dev', '')
-                        driver = disk.get('driver', {})
-                        if isinstance(driver, dict):
-                            driver_type = driver.get('@type', '')
+                        bus = target.get('@bus') or {'vd': 'virtio', 'hd': 'ide'}.get(target_dev[:2], 'scsi')
+                        if bus not in ('scsi', 'virtio', 'sata', 'ide'):
+                            bus = 'scsi'
+                        driver = disk.get('driver') or {}
+                        driver_type = driver.get('@type', '') if isinstance(driver, dict) else ''
+                        address = disk.get('address') or {}
+                        controller_iothread = (bus == 'scsi' and isinstance(address, dict)
+                                               and address.get('@controller', '0') in iothread_controllers)
+                        perf_options = pve_options_from_driver(driver, target, controller_iothread)
+                        
+                        index = bus_counts.get(bus, 0)
+                        bus_counts[bus] = index + 1
                         
-                        if 'vda' in target_dev:
-                            config['virtio0'] = f"{source_file},format={driver_type}"
-                        elif 'sda' in target_dev:
-                            config['scsi0'] = f"{source_file},format={driver_type}"
+                        value = source_file or 'none'
+                        if device == 'cdrom':
+                            value += ',media=cdrom'
+                        else:
+                            if driver_type:
+                                value += f",format={driver_type}"
+                            for opt_key, opt_value in perf_options.items():
+                                value += f",{opt_key}={opt_value}"
+                        config[f'{bus}{index}'] = value
             
             # 
             interfaces = devices.get('interface', [])
@@ -240,20 +279,46 @@ def parse_libvirt_xml(content):
                     bridge = source.get('@bridge', '')
                     model_type = model.get('@type', '') if isinstance(model, dict) else ''
                     
-                    config[f'net{i}'] = f"{model_type}={mac},bridge={bridge}"
+                    value = f"{model_type}={mac},bridge={bridge}"
+                    for opt_key, opt_value in pve_net_options_from_interface(iface).items():
+                        value += f",{opt_key}={opt_value}"
+                    config[f'net{i}'] = value
         
         return config
     except Exception as e:
         print(f"XML: {e}")
         return {}
 
-def generate_pve_config(config_data):
-    """PVEļ"""
+def generation_time(generated_at=None):
+    """ʱ䣺None Ϊǰʱ䣬ָʱԭʹãַʾд룩"""
+    if generated_at is None:
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return generated_at
+
+def generation_time_header(generated_at=None):
+    """űļͷʱעУдʱΪ"""
+    generated_at = generation_time(generated_at)
+    return f"# ʱ: {generated_at}\n" if generated_at else ''
+
+def deterministic_request():
+    """ǷҪȷdeterministic Ϊʱʱȡ generated_atδָд"""
+    if not request.json.get('deterministic'):
+        return None
+    return str(request.json.get('generated_at') or '')
+
+@traced()
+def generate_pve_config(config_data, generated_at=None):
+    """PVEļݣָ generated_at ʱֻȡ"""
+    config_data = apply_net_tuning(apply_disk_profile(config_data))
+    # ɵ affinity/numaN еֵ
+    topology = VmTopology(config_data, HOST_TOPOLOGY)
+    config_data = {**topology.pve_options(), **config_data}
     lines = []
     
     # 
     lines.append(f"# Proxmox VE ļ")
-    lines.append(f"# ʱ: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    if generation_time(generated_at):
+        lines.append(f"# ʱ: {generation_time(generated_at)}")
     lines.append(f"# ID: {config_data.get('vmid', '100')}")
     lines.append("")
     
@@ -262,6 +327,8 @@ def generate_pve_config(config_data):
         section_has_content = False
         
         for opt in section['options']:
+            if opt.get('pve') is False:
+                continue
             key = opt['key']
             value = config_data.get(key, '')
             if value or value == 0:
@@ -279,70 +346,37 @@ def generate_pve_config(config_data):
     
     return '\n'.join(lines)
 
-def generate_libvirt_xml(config_data):
-    """Libvirt XMLļ"""
+@traced()
+def generate_libvirt_xml(config_data, generated_at=None):
+    """Libvirt XMLļݣָ generated_at ʱȷδõUUIDvmid"""
+    config_data = apply_net_tuning(apply_disk_profile(config_data))
     
     # UUID
-    vm_uuid = config_data.get('smbios1', '').split('=')[-1] if 'uuid=' in config_data.get('smbios1', '') else str(uuid.uuid4())
+    if 'uuid=' in config_data.get('smbios1', ''):
+        vm_uuid = config_data.get('smbios1', '').split('=')[-1]
+    elif generated_at is not None:
+        vm_uuid = str(uuid.uuid5(UUID_NAMESPACE, f"{config_data.get('vmid', '100')}/{config_data.get('name', 'vm-default')}"))
+    else:
+        vm_uuid = str(uuid.uuid4())
     
     # PVEӳ䵽Libvirt
     vm_name = config_data.get('name', 'vm-default')
     memory_mb = int(config_data.get('memory', 2048))
     vcpus = int(config_data.get('cores', 2)) * int(config_data.get('sockets', 1))
     
-    # 
-    disk_config = ""
-    disk_bus = "virtio"
+    # ̡
+    layout = DeviceLayout(config_data)
+    machine_type = 'pc-q35-5.1' if layout.pcie else 'pc-i440fx-5.1'
+    iothreads_xml = f'\n  <iothreads>{layout.iothreads}</iothreads>' if layout.iothreads else ''
     
-    # 
-    for key in ['scsi0', 'scsi1', 'virtio0', 'ide0']:
-        if key in config_data and config_data[key]:
-            disk_value = config_data[key]
-            if ',' in disk_value:
-                disk_parts = disk_value.split(',')
-                disk_path = disk_parts[0]
-                disk_size = '32G'
-                for part in disk_parts:
-                    if 'size=' in part:
-                        disk_size = part.split('=')[1]
-                
-                if key.startswith('scsi'):
-                    disk_bus = 'scsi'
-                    target_dev = 'sda' if key == 'scsi0' else 'sdb'
-                elif key.startswith('virtio'):
-                    disk_bus = 'virtio'
-                    target_dev = 'vda' if key == 'virtio0' else 'vdb'
-                else:
-                    disk_bus = 'ide'
-                    target_dev = 'hda'
-                
-                disk_config = f'''
-    <disk type="file" device="disk">
-      <driver name="qemu" type="qcow2"/>
-      <source file="{disk_path}"/>
-      <target dev="{target_dev}" bus="{disk_bus}"/>
-      <address type="pci" domain="0x0000" bus="0x04" slot="0x00" function="0x0"/>
-    </disk>'''
-                break
-    
-    # 
-    net_config = ""
-    if 'net0' in config_data:
-        net_value = config_data['net0']
-        # MACַ
-        mac_match = re.search(r'([0-9A-Fa-f:]{17})', net_value)
-        bridge_match = re.search(r'bridge=([^,]+)', net_value)
-        
-        mac = mac_match.group(1) if mac_match else '52:54:00:12:34:56'
-        bridge = bridge_match.group(1) if bridge_match else 'virbr0'
-        
-        net_config = f'''
-    <interface type="bridge">
-      <mac address="{mac}"/>
-      <source bridge="{bridge}"/>
-      <model type="virtio"/>
-      <address type="pci" domain="0x0000" bus="0x01" slot="0x00" function="0x0"/>
-    </interface>'''
+    # CPUˡˡNUMAʹҳ
+    topology = VmTopology(config_data, HOST_TOPOLOGY)
+    tuning_xml = ''.join('\n' + fragment for fragment in (
+        topology.render_cputune(layout.iothreads),
+        topology.render_numatune(),
+    ) if fragment)
+    memory_backing = topology.render_memory_backing()
+    memory_backing_xml = '\n' + memory_backing if memory_backing else ''
     
     # XML
     xml_template = f'''<?xml version="1.0" encoding="UTF-8"?>
@@ -350,10 +384,10 @@ def generate_libvirt_xml(config_data):
   <name>{vm_name}</name>
   <uuid>{vm_uuid}</uuid>
   <memory unit="MiB">{memory_mb}</memory>
-  <currentMemory unit="MiB">{memory_mb}</currentMemory>
-  <vcpu placement="static">{vcpus}</vcpu>
+  <currentMemory unit="MiB">{memory_mb}</currentMemory>{memory_backing_xml}
+  <vcpu placement="static">{vcpus}</vcpu>{iothreads_xml}{tuning_xml}
   <os>
-    <type arch="x86_64" machine="pc-q35-5.1">hvm</type>
+    <type arch="x86_64" machine="{machine_type}">hvm</type>
     <boot dev="hd"/>
   </os>
   <features>
@@ -361,7 +395,7 @@ def generate_libvirt_xml(config_data):
     <apic/>
     <vmport state="off"/>
   </features>
-  <cpu mode="host-passthrough" check="none"/>
+{topology.render_cpu()}
   <clock offset="utc">
     <timer name="rtc" tickpolicy="catchup"/>
     <timer name="pit" tickpolicy="delay"/>
@@ -375,22 +409,8 @@ def generate_libvirt_xml(config_data):
     <suspend-to-disk enabled="no"/>
   </pm>
   <devices>
-    <emulator>/usr/bin/qemu-system-x86_64</emulator>{disk_config}{net_config}
-    <controller type="usb" index="0" model="qemu-xhci" ports="15">
-      <address type="pci" domain="0x0000" bus="0x02" slot="0x00" function="0x0"/>
-    </controller>
-    <controller type="sata" index="0">
-      <address type="pci" domain="0x0000" bus="0x00" slot="0x1f" function="0x2"/>
-    </controller>
-    <controller type="pci" index="0" model="pcie-root"/>
-    <controller type="pci" index="1" model="pcie-root-port">
-      <model name="pcie-root-port"/>
-      <target chassis="1" port="0x10"/>
-      <address type="pci" domain="0x0000" bus="0x00" slot="0x02" function="0x0" multifunction="on"/>
-    </controller>
-    <controller type="virtio-serial" index="0">
-      <address type="pci" domain="0x0000" bus="0x03" slot="0x00" function="0x0"/>
-    </controller>
+    <emulator>/usr/bin/qemu-system-x86_64</emulator>
+{layout.render_devices()}
     <serial type="pty">
       <target type="isa-serial" port="0">
         <model name="isa-serial"/>
@@ -413,61 +433,51 @@ def generate_libvirt_xml(config_data):
     </graphics>
     <video>
       <model type="qxl" ram="65536" vram="65536" vgamem="16384" heads="1" primary="yes"/>
-      <address type="pci" domain="0x0000" bus="0x00" slot="0x01" function="0.0"/>
+      {pci_address_xml(layout.video_address)}
     </video>
     <memballoon model="virtio">
-      <address type="pci" domain="0x0000" bus="0x05" slot="0x00" function="0.0"/>
+      {pci_address_xml(layout.memballoon_address)}
     </memballoon>
   </devices>
 </domain>'''
     
     return xml_template
 
-def generate_bash_script(config_data, output_format, output_filename):
-    """һű"""
+@traced()
+def generate_bash_script(config_data, output_format, output_filename, mode='full', automation=False,
+                         generated_at=None):
+    """һűmode Ϊ idempotent ʱɿظִСδ仯Ľű
+    automation ΪTrueʱűĬϲѯʲJSON Lines¼ָ generated_at ʱֻȡ"""
+    
+    if mode == 'idempotent':
+        if output_format == 'pve':
+            return render_pve_script(config_data, generate_pve_config(config_data, generated_at),
+                                     generation_time(generated_at), automation)
+        if output_format == 'libvirt':
+            return render_libvirt_script(config_data, generate_libvirt_xml(config_data, generated_at),
+                                         generation_time(generated_at), automation)
+        raise ValueError('ֵ֧ʽ')
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    time_header = generation_time_header(generated_at)
     
     if output_format == 'pve':
-        config_content = generate_pve_config(config_data)
+        config_content = generate_pve_config(config_data, generated_at)
         config_path = f"/etc/pve/qemu-server/{config_data.get('vmid', '100')}.conf"
+        # ģʱ qm clone дļʹմ
+        clone_block = render_pve_clone_block(config_data, config_content)
+        if clone_block:
+            clone_block = f"\n# ¡\n{clone_block}\n"
+            create_phases = 'run_phase clone_vm\n    run_phase configure_clone'
+        else:
+            clone_block = ''
+            create_phases = 'run_phase create_config\n    run_phase create_disk'
         script = f'''#!/bin/bash
 # ============================================
 # PVEһű
-# ʱ: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-# ID: {config_data.get('vmid', '100')}
+{time_header}# ID: {config_data.get('vmid', '100')}
 # ============================================
 
-set -euo pipefail
-
-# ɫ
-RED='\\033[0;31m'
-GREEN='\\033[0;32m'
-YELLOW='\\033[1;33m'
-BLUE='\\033[0;34m'
-NC='\\033[0m' # No Color
-
-# ־
-log() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - $*"
-}}
-
-log_info() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{BLUE}}INFO${{NC}}: $*"
-}}
-
-log_success() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{GREEN}}SUCCESS${{NC}}: $*"
-}}
-
-log_warning() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{YELLOW}}WARNING${{NC}}: $*"
-}}
-
-log_error() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{RED}}ERROR${{NC}}: $*"
-    exit 1
-}}
+{render_runtime(config_data.get('vmid', '100'), automation)}
 
 # ǷΪrootû
 check_root() {{
@@ -497,11 +507,7 @@ check_vmid() {{
     
     if [ -f "/etc/pve/qemu-server/$vmid.conf" ]; then
         log_warning "ID $vmid Ѵ"
-        read -p "Ƿ񸲸? (y/N): " -n 1 -r
-        echo
-        if [[ ! $REPLY =~ ^[Yy]$ ]]; then
-            log_error "ȡ"
-        fi
+        confirm "Ƿ񸲸?"
     fi
 }}
 
@@ -512,7 +518,7 @@ create_config() {{
     
     log_info "ļ: $config_file"
     
-    cat > "$config_file" << 'EOF'
+    write_file "$config_file" << 'EOF'
 {config_content}
 EOF
     
@@ -523,7 +529,7 @@ EOF
     fi
     
     # Ȩ
-    chmod 644 "$config_file"
+    run chmod 644 "$config_file"
 }}
 
 # 
@@ -552,7 +558,7 @@ create_disk() {{
     log_info ": storage=$storage, size=$size"
     
     # 
-    pvesm alloc "$storage" "$vmid" "vm-$vmid-disk-0" "$size"
+    run pvesm alloc "$storage" "$vmid" "vm-$vmid-disk-0" "$size"
     
     if [ $? -eq 0 ]; then
         log_success "̴ɹ"
@@ -560,7 +566,7 @@ create_disk() {{
         log_error "̴ʧ"
     fi
 }}
-
+{clone_block}
 # ֤
 validate_config() {{
     local vmid={config_data.get('vmid', '100')}
@@ -603,19 +609,18 @@ main() {{
     log_info "ʼPVE"
     
     # 黷
-    check_root
-    check_pve_environment
-    check_vmid
+    run_phase check_root $EXIT_ENVIRONMENT
+    run_phase check_pve_environment $EXIT_ENVIRONMENT
+    run_phase check_vmid
     
     # 
-    create_config
-    create_disk
+    {create_phases}
     
     # ֤
-    validate_config
+    run_phase validate_config
     
     # ʾϢ
-    show_vm_info
+    run_phase show_vm_info
     
     log_success "űִɣ"
 }}
@@ -625,47 +630,35 @@ main "$@"
 '''
     
     elif output_format == 'libvirt':
-        config_content = generate_libvirt_xml(config_data)
+        config_content = generate_libvirt_xml(config_data, generated_at)
         vm_name = config_data.get('name', 'vm-default').replace(' ', '_')
         config_path = f"/tmp/{vm_name}.xml"
+        # ˻ʱһ̴ӻ¡·XMLеһ̵Դ DeviceLayout._apply_clone
+        clone = libvirt_clone(config_data)
+        plan = libvirt_disk_plan(config_data) if clone else []
+        if plan:
+            clone_functions = f"\n{LIBVIRT_CLONE_FUNCTIONS}\n"
+            disk_path = plan[0][0]
+            image_options = plan[0][5] if plan[0][5] != '-' else ''
+            create_disk = f'clone_image "{clone["source"]}" "$disk_path" "$size" {clone["mode"]} "{image_options}"'
+        else:
+            # ʽԤ䡢شСȴ
+            allocation = allocation_settings(config_data)
+            image_format = disk_format(parse_disk_config(config_data.get('scsi0', config_data.get('virtio0', ''))),
+                                       allocation)
+            image_options = qemu_img_options(image_format, allocation)
+            clone_functions = ''
+            disk_path = f'/var/lib/libvirt/images/$vm_name{image_extension(image_format)}'
+            create_disk = (f'run qemu-img create -f {image_format}'
+                           f'{f" -o {image_options}" if image_options else ""} "$disk_path" "$size"')
         
         script = f'''#!/bin/bash
 # ============================================
 # Libvirtһű
-# ʱ: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-# : {config_data.get('name', 'vm-default')}
+{time_header}# : {config_data.get('name', 'vm-default')}
 # ============================================
 
-set -euo pipefail
-
-# ɫ
-RED='\\033[0;31m'
-GREEN='\\033[0;32m'
-YELLOW='\\033[1;33m'
-BLUE='\\033[0;34m'
-NC='\\033[0m' # No Color
-
-# ־
-log() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - $*"
-}}
-
-log_info() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{BLUE}}INFO${{NC}}: $*"
-}}
-
-log_success() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{GREEN}}SUCCESS${{NC}}: $*"
-}}
-
-log_warning() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{YELLOW}}WARNING${{NC}}: $*"
-}}
-
-log_error() {{
-    echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${{RED}}ERROR${{NC}}: $*"
-    exit 1
-}}
+{render_runtime(config_data.get('name', 'vm-default').replace(' ', '_'), automation)}
 
 # 
 check_dependencies() {{
@@ -684,7 +677,7 @@ check_dependencies() {{
     # libvirtd
     if ! systemctl is-active --quiet libvirtd; then
         log_warning "libvirtdδУ..."
-        systemctl start libvirtd || log_error "libvirtdʧ"
+        run systemctl start libvirtd || log_error "libvirtdʧ"
     fi
     
     log_success "ͨ"
@@ -696,16 +689,12 @@ check_vm_exists() {{
     
     if virsh list --all --name | grep -q "^$vm_name$"; then
         log_warning " '$vm_name' Ѵ"
-        read -p "Ƿɾ´? (y/N): " -n 1 -r
-        echo
-        if [[ ! $REPLY =~ ^[Yy]$ ]]; then
-            log_error "ȡ"
-        fi
+        confirm "Ƿɾ´?"
         
         # ɾ
         log_info "ɾ..."
-        virsh destroy "$vm_name" 2>/dev/null || true
-        virsh undefine "$vm_name" 2>/dev/null || true
+        run virsh destroy "$vm_name" 2>/dev/null || true
+        run virsh undefine "$vm_name" 2>/dev/null || true
     fi
 }}
 
@@ -716,7 +705,7 @@ create_xml_config() {{
     
     log_info "XMLļ: $xml_file"
     
-    cat > "$xml_file" << 'EOF'
+    write_file "$xml_file" << 'EOF'
 {config_content}
 EOF
     
@@ -726,11 +715,11 @@ EOF
         log_error "XMLļʧ"
     fi
 }}
-
+{clone_functions}
 # 
 create_virtual_disk() {{
     local vm_name="{config_data.get('name', 'vm-default').replace(' ', '_')}"
-    local disk_path="/var/lib/libvirt/images/$vm_name.qcow2"
+    local disk_path="{disk_path}"
     
     # ǷѴڴ
     local disk_config="{config_data.get('scsi0', config_data.get('virtio0', ''))}"
@@ -748,17 +737,17 @@ create_virtual_disk() {{
     log_info ": $disk_path ($size)"
     
     # Ŀ¼ڣ
-    mkdir -p /var/lib/libvirt/images
+    run mkdir -p /var/lib/libvirt/images
     
     # 
-    qemu-img create -f qcow2 "$disk_path" "$size"
+    {create_disk}
     
     if [ $? -eq 0 ]; then
         log_success "̴ɹ"
         
         # Ȩ
-        chown libvirt-qemu:libvirt-qemu "$disk_path" 2>/dev/null || true
-        chmod 660 "$disk_path"
+        run chown libvirt-qemu:libvirt-qemu "$disk_path" 2>/dev/null || true
+        run chmod 660 "$disk_path"
     else
         log_error "̴ʧ"
     fi
@@ -771,7 +760,7 @@ define_virtual_machine() {{
     
     log_info ": $vm_name"
     
-    virsh define "$xml_file"
+    run virsh define "$xml_file"
     
     if [ $? -eq 0 ]; then
         log_success "ɹ"
@@ -786,7 +775,7 @@ configure_autostart() {{
     
     if [ "{config_data.get('onboot', '0')}" = "1" ]; then
         log_info ""
-        virsh autostart "$vm_name"
+        run virsh autostart "$vm_name"
         
         if [ $? -eq 0 ]; then
             log_success "óɹ"
@@ -807,7 +796,7 @@ show_vm_info() {{
     echo ": $vm_name"
     echo "ڴ: {config_data.get('memory', '2048')}MB"
     echo "CPU: {config_data.get('vcpus', '2')} vCPUs"
-    echo ": /var/lib/libvirt/images/$vm_name.qcow2"
+    echo ": {disk_path}"
     echo ""
     echo ":"
     echo "  : virsh start $vm_name"
@@ -839,28 +828,28 @@ main() {{
     log_info "ʼLibvirt"
     
     # 
-    check_dependencies
+    run_phase check_dependencies $EXIT_ENVIRONMENT
     
     # ǷѴ
-    check_vm_exists
+    run_phase check_vm_exists
     
     # 
-    create_virtual_disk
+    run_phase create_virtual_disk
     
     # XML
-    create_xml_config
+    run_phase create_xml_config
     
     # 
-    define_virtual_machine
+    run_phase define_virtual_machine
     
     # Զ
-    configure_autostart
+    run_phase configure_autostart
     
     # ֤
-    validate_configuration
+    run_phase validate_configuration
     
     # ʾϢ
-    show_vm_info
+    run_phase show_vm_info
     
     log_success "űִɣ"
 }}
@@ -871,12 +860,238 @@ main "$@"
     
     return script
 
+def run_convert_job(item):
+    """񣺽ļ"""
+    if item.get('type', 'pve') == 'pve':
+        return parse_pve_config(item.get('content', ''))
+    return parse_libvirt_xml(item.get('content', ''))
+
+def run_generate_job(item):
+    """PVELibvirtļ"""
+    config_data = item.get('config', {})
+    output_type = item.get('output_type', 'pve')
+    CONFIG_VALIDATOR.check(config_data)
+    
+    if output_type == 'pve':
+        content = generate_pve_config(config_data)
+    elif output_type == 'libvirt':
+        content = generate_libvirt_xml(config_data)
+    else:
+        raise ValueError('ֵ֧')
+    
+    return {'output_type': output_type, 'content': content}
+
+def run_script_job(item):
+    """һű"""
+    output_format = item.get('output_format', 'pve')
+    CONFIG_VALIDATOR.check(item.get('config', {}))
+    filename = item.get('filename', 'vm-deploy.sh')
+    script_mode = item.get('script_mode', 'full')
+    if script_mode not in SCRIPT_MODES:
+        raise ValueError('ֵ֧Ľűģʽ')
+    if output_format not in CONFIG_TYPES:
+        raise ValueError('ֵ֧Ĳʽ')
+    script = generate_bash_script(item.get('config', {}), output_format, filename, script_mode,
+                                  bool(item.get('automation')))
+    return {'output_format': output_format, 'filename': filename, 'content': script}
+
+# ̨JOB_WORKERS ͬʱִеݱ JOB_DB 
+JOB_MANAGER = JobManager(
+    os.environ.get('JOB_DB', 'jobs.sqlite3'),
+    {
+        'convert': run_convert_job,
+        'generate': run_generate_job,
+        'script': run_script_job,
+    },
+    max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_items=int(os.environ.get('JOB_MAX_ITEMS', 10000))
+)
+JOB_MANAGER.recover()
+
+# ֿϴ MAX_CONTENT_LENGTH ù鵵ֿϴеݱ UPLOAD_DIRȺͽ UPLOAD_DB
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+UPLOAD_MANAGER = UploadManager(
+    os.environ.get('UPLOAD_DB', 'uploads.sqlite3'),
+    os.environ.get('UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'vmcg-uploads')),
+    {
+        'pve': parse_pve_config,
+        'libvirt': parse_libvirt_xml,
+    },
+    max_size=int(os.environ.get('UPLOAD_MAX_SIZE', 1024 ** 3)),
+    ttl=int(os.environ.get('UPLOAD_TTL', 24 * 3600))
+)
+
+# ʷÿαֻ׷ӱ仯ļÿ HISTORY_SNAPSHOT_EVERY 汾дһݿգݱ HISTORY_DB 
+CONFIG_HISTORY = ConfigHistory(
+    os.environ.get('HISTORY_DB', 'history.sqlite3'),
+    snapshot_every=int(os.environ.get('HISTORY_SNAPSHOT_EVERY', 50))
+)
+
+# Ŀ¼ͬ SYNC_DIRSĿ¼ os.pathsep ָе <vmid>.conf  *.xmlڴά
+SYNC_INDEX = None
+if os.environ.get('SYNC_DIRS'):
+    SYNC_INDEX = DirectoryIndex(
+        [d for d in os.environ['SYNC_DIRS'].split(os.pathsep) if d],
+        {
+            'pve': parse_pve_config,
+            'libvirt': parse_libvirt_xml,
+        },
+        interval=float(os.environ.get('SYNC_INTERVAL', 2)),
+        rescan_interval=float(os.environ.get('SYNC_RESCAN_INTERVAL', 60)),
+        use_inotify=os.environ.get('SYNC_INOTIFY', '1') == '1'
+    )
+    SYNC_INDEX.start()
+
+# ׼ƣCPUܼ·ɵĲŶԤУ顢桢ã󣨵롢ɡ
+# ͬһڵGILĬֻͬʱһҪߵʱӽ
+# ɱأؽͷͻʱһֱŶӣʱ503
+# ֿϴдύ˲ռʹõĲڼϴж
+app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+
+def admission_limits(max_active):
+    """·ɵ׼ƣADMISSION_LIMITSJSONɰ·ɸǣ {"generate": {"concurrency": 4}}"""
+    interactive = {'priority': 'interactive', 'concurrency': max_active, 'queue': 64, 'timeout': 10}
+    batch = {'priority': 'batch', 'concurrency': 2, 'queue': 8, 'timeout': 30}
+    upload = {'priority': 'interactive', 'concurrency': 2, 'queue': 16, 'timeout': 30, 'methods': ('PUT', 'POST')}
+    limits = {
+        'preview': interactive,
+        'validate': interactive,
+        'save_config': interactive,
+        'load_default': dict(interactive, methods=('GET',)),
+        'plan_topology': interactive,
+        'generate': interactive,
+        'import_config': dict(batch, concurrency=1, queue=4),
+        'bulk_render': batch,
+        'export_archive': batch,
+        'plan_placement': batch,
+        'diff_configs': batch,
+        'write_upload_chunk': upload,
+        'commit_upload': upload,
+    }
+    overrides = json.loads(os.environ.get('ADMISSION_LIMITS', '') or '{}')
+    return {route: RouteLimit(**dict(limit, **overrides.get(route, {}))) for route, limit in limits.items()}
+
+ADMISSION = None
+if app.config['ADMISSION_ENABLED']:
+    _max_active = int(os.environ.get('ADMISSION_MAX_ACTIVE', 8))
+    ADMISSION = AdmissionController(admission_limits(_max_active), max_active=_max_active,
+                                    max_batch=int(os.environ.get('ADMISSION_MAX_BATCH', 1)))
+
+@app.before_request
+def admit_request():
+    """·׼룺Ŷ429Ŷӳʱ503 Retry-Afterڶȡ֮ǰִ"""
+    if ADMISSION is None or not ADMISSION.limited(request.endpoint, request.method):
+        return None
+    try:
+        g.admission = ADMISSION.acquire(request.endpoint)
+    except AdmissionRejected as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
+def pause_for_interactive(results):
+    """ʱ飬нʱͣóCPU"""
+    ticket = g.get('admission')
+    for result in results:
+        if ticket is not None:
+            ADMISSION.pause(ticket)
+        yield result
+
+@app.teardown_request
+def release_admission(exc):
+    ticket = g.pop('admission', None)
+    if ticket is not None:
+        ADMISSION.release(ticket)
+
+@app.before_request
+def start_request_trace():
+    """Ϊ·׷٣spanнJSON"""
+    trace = tracing.start_trace('http.request',
+                                method=request.method,
+                                route=request.path,
+                                request_size=request.content_length or 0)
+    g.trace = trace
+    if trace is not None and request.is_json:
+        with tracing.span('request.decode', bytes=request.content_length or 0) as span:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict) and isinstance(payload.get('config'), dict):
+                span.set(config_keys=len(payload['config']))
+
+@app.after_request
+def finish_request_trace(response):
+    """¼Ӧд׶ΣӦرպ󵼳׷"""
+    trace = g.pop('trace', None)
+    if trace is None:
+        return response
+    
+    trace.root.set(status=response.status_code)
+    write_span = tracing.Span(trace, 'response.write', trace.root,
+                              {'response_size': response.content_length or 0})
+    
+    def close():
+        write_span.end()
+        trace.finish()
+    
+    if response.direct_passthrough:
+        # send_fileֱӦᴥcall_on_closeǰ׷
+        close()
+    else:
+        response.call_on_close(close)
+    return response
+
+@app.teardown_request
+def detach_request_trace(exc):
+    tracing.detach()
+
+@app.after_request
+def compress_response(response):
+    """ Accept-Encoding ѹӦ׷ټ¼ӦС֮ǰִУ"""
+    return compression.compress_response(response, request.headers.get('Accept-Encoding', ''),
+                                         app.config['COMPRESS_MIN_SIZE'], SCRIPT_STATIC_BLOCKS)
+
+def profiling_requested():
+    """жϵǰǷҪ"""
+    if app.config['PROFILE_ENABLED']:
+        return True
+    token = app.config['PROFILE_TOKEN']
+    return bool(token) and request.headers.get('X-Profile-Token') == token
+
+def profiling_access_allowed():
+    """жϵǰǷԲ鿴"""
+    token = app.config['PROFILE_TOKEN']
+    if token:
+        return request.headers.get('X-Profile-Token') == token
+    return app.config['PROFILE_ENABLED']
+
+def profiled(view):
+    """ͼеתýcProfile/tracemalloc"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiling_requested():
+            return view(*args, **kwargs)
+        
+        meta = {'method': request.method}
+        if request.is_json and isinstance(request.json, dict):
+            for key in ('output_type', 'output_format', 'format'):
+                if key in request.json:
+                    meta[key] = request.json[key]
+        
+        with PROFILE_STORE.profile(request.path, meta) as record:
+            response = make_response(view(*args, **kwargs))
+        
+        response.headers['X-Profile-Id'] = record['id']
+        return response
+    return wrapper
+
 @app.route('/')
 def index():
     """ҳ"""
-    return render_template('index.html', 
-                         config_types=CONFIG_TYPES,
-                         sections=PVE_CONFIG_SECTIONS)
+    with tracing.span('template.render', template='index.html'):
+        return render_template('index.html', 
+                             config_types=CONFIG_TYPES,
+                             sections=PVE_CONFIG_SECTIONS)
 
 @app.route('/editor')
 def editor():
@@ -887,10 +1102,11 @@ def editor():
     # Ĭ
     config_data = load_default_config(config_type)
     
-    return render_template('editor.html',
-                         config_type=config_type,
-                         config_data=config_data,
-                         sections=PVE_CONFIG_SECTIONS)
+    with tracing.span('template.render', template='editor.html'):
+        return render_template('editor.html',
+                             config_type=config_type,
+                             config_data=config_data,
+                             sections=PVE_CONFIG_SECTIONS)
 
 @app.route('/import', methods=['GET', 'POST'])
 def import_config():
@@ -906,7 +1122,10 @@ def import_config():
         file_type = request.form.get('type', 'pve')
         
         # ȡļ
-        content = file.read().decode('utf-8', errors='ignore')
+        with tracing.span('upload.decode', filename=file.filename) as span:
+            raw = file.read()
+            content = raw.decode('utf-8', errors='ignore')
+            span.set(bytes=len(raw))
         
         # ļ
         if file_type == 'pve':
@@ -920,108 +1139,675 @@ def import_config():
             'type': file_type
         })
     
-    return render_template('import.html', config_types=CONFIG_TYPES)
+    with tracing.span('template.render', template='import.html'):
+        return render_template('import.html', config_types=CONFIG_TYPES)
+
+def upload_error(e):
+    """ֿϴĴӦƫʱѽյֽ"""
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """ֿϴϴIDͽĿС"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        upload_id = UPLOAD_MANAGER.create(payload.get('filename', ''), payload.get('type', 'pve'),
+                                          payload.get('size'), payload.get('sha256'))
+    except UploadError as e:
+        return upload_error(e)
+    
+    return jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'offset': 0,
+        'chunk_size': min(app.config['UPLOAD_CHUNK_SIZE'], app.config['MAX_CONTENT_LENGTH'])
+    }), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def write_upload_chunk(upload_id):
+    """дһݣΪԭʼֽڣƫ Upload-Offset ͷ offset """
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+    except ValueError:
+        return jsonify({'error': 'ȱƫƫ'}), 400
+    
+    with tracing.span('upload.chunk', offset=offset, bytes=request.content_length or 0):
+        try:
+            received = UPLOAD_MANAGER.write(upload_id, offset, request.stream, request.content_length)
+        except UploadError as e:
+            return upload_error(e)
+    
+    upload = UPLOAD_MANAGER.get(upload_id)
+    return jsonify({'success': True, 'offset': received, 'files': upload['files'], 'configs': upload['configs']})
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """ѯѽյƫͽȣߺݴ"""
+    upload = UPLOAD_MANAGER.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'ϴ'}), 404
+    return jsonify(upload)
+
+@app.route('/api/uploads/<upload_id>/commit', methods=['POST'])
+def commit_upload(upload_id):
+    """ϴʣݣֻһʱͬ /import ֱӷظ"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        upload = UPLOAD_MANAGER.commit(upload_id, payload.get('sha256'))
+    except UploadError as e:
+        return upload_error(e)
+    
+    body = {'success': True, 'upload': upload}
+    if upload['files'] == 1:
+        result = UPLOAD_MANAGER.results(upload_id, 0, 1)[0]
+        if 'config' in result:
+            body.update(config=result['config'], type=result['type'])
+    return jsonify(body)
+
+@app.route('/api/uploads/<upload_id>/results', methods=['GET'])
+def get_upload_results(upload_id):
+    """ȡѽãϴмɻȡ"""
+    upload = UPLOAD_MANAGER.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'ϴ'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    results = UPLOAD_MANAGER.results(upload_id, offset, limit)
+    next_offset = results[-1]['index'] + 1 if results else offset
+    
+    return jsonify({
+        'upload': upload,
+        'results': results,
+        'next_offset': next_offset
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """ϴɾѽյݺͽ"""
+    if not UPLOAD_MANAGER.abort(upload_id):
+        return jsonify({'error': 'ϴ'}), 404
+    return jsonify({'success': True})
 
 @app.route('/api/save-config', methods=['POST'])
 def save_config():
-    """"""
+    """ݣͬʱ¼ʷ"""
     try:
         config_data = request.json.get('config', {})
         config_type = request.json.get('type', 'pve')
+        # δָIDʱñỰID
+        config_id = request.json.get('config_id') or session.get('config_id') or uuid.uuid4().hex
+        saved = CONFIG_HISTORY.record(config_id, config_data, config_type)
         
         # 浽session
         session['config_data'] = config_data
         session['config_type'] = config_type
+        session['config_id'] = config_id
         
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'config_id': config_id, 'version': saved['version']})
+    except HistoryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/history/<config_id>', methods=['GET'])
+def get_history(config_id):
+    """ʷſ°汾šյİ汾š״κʱ"""
+    history = CONFIG_HISTORY.get(config_id)
+    if history is None:
+        return jsonify({'error': 'ʷ'}), 404
+    return jsonify(history)
+
+@app.route('/api/history/<config_id>/versions', methods=['GET'])
+def list_history_versions(config_id):
+    """汾гÿ汾仯ļkey ֻгü仯İ汾"""
+    history = CONFIG_HISTORY.get(config_id)
+    if history is None:
+        return jsonify({'error': 'ʷ'}), 404
+    
+    offset = request.args.get('offset', 1, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    versions = CONFIG_HISTORY.changes(config_id, offset, limit, request.args.get('key'))
+    next_offset = versions[-1]['version'] + 1 if versions else offset
+    
+    return jsonify({
+        'history': history,
+        'versions': versions,
+        'next_offset': next_offset
+    })
+
+@app.route('/api/history/<config_id>/config', methods=['GET'])
+def get_history_config(config_id):
+    """ؽĳ汾versionĳʱ㣨atUnixʱISO 8601ʱ䣩ãĬΪ°汾"""
+    version = request.args.get('version', type=int)
+    at = request.args.get('at')
+    if at is not None:
+        try:
+            at = float(at)
+        except ValueError:
+            try:
+                at = datetime.fromisoformat(at).timestamp()
+            except ValueError:
+                return jsonify({'error': 'at UnixʱISO 8601ʱ'}), 400
+    
+    result = CONFIG_HISTORY.config_at(config_id, version, at)
+    if result is None:
+        return jsonify({'error': '汾'}), 404
+    return jsonify(dict(result, config_id=config_id))
+
+def not_modified(etag):
+    """If-None-Match ETagѹ壩ƥʱ304Ӧ򷵻NoneԤûиãPOSTͬ"""
+    matched = next((tag for tag in compression.etag_variants(etag) if tag in request.if_none_match), None)
+    if matched is None:
+        return None
+    response = app.response_class(status=304)
+    response.set_etag(matched)
+    response.cache_control.no_cache = True
+    return response
+
+def conditional_json(payload):
+    """شǿETagӦSHA-256JSONӦIf-None-Match ƥʱ304"""
+    response = jsonify(payload)
+    etag = hashlib.sha256(response.get_data()).hexdigest()
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    response.set_etag(etag)
+    # ÿζҪ֤
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/api/load-default', methods=['GET'])
 def load_default():
     """Ĭ"""
     config_type = request.args.get('type', 'pve')
     config_data = load_default_config(config_type)
-    return jsonify({'config': config_data})
+    return conditional_json({'config': config_data})
 
 @app.route('/generate', methods=['POST'])
+@profiled
 def generate():
     """ļű"""
     try:
         config_data = request.json.get('config', {})
         output_type = request.json.get('output_type', 'script')  # script, pve, libvirt
         output_format = request.json.get('output_format', 'pve')  # pve, libvirt
+        script_mode = request.json.get('script_mode', 'full')  # full, idempotent
+        automation = bool(request.json.get('automation'))  # Ĭ --yes --json
+        generated_at = deterministic_request()  # ȷ
+        
+        if script_mode not in SCRIPT_MODES:
+            return jsonify({'error': f"űģʽ {', '.join(SCRIPT_MODES)} ֮һ"}), 400
+        
+        errors = validate_config(config_data)
+        if errors:
+            return jsonify({'error': 'Уʧ', 'errors': errors}), 400
         
         if output_type == 'script':
             # һű
-            script = generate_bash_script(config_data, output_format, 'vm-deploy.sh')
-            
-            # ʱļ
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.sh', delete=False) as f:
-                f.write(script)
-                temp_path = f.name
-            
-            return send_file(
-                temp_path,
-                as_attachment=True,
-                download_name='vm-deploy.sh',
-                mimetype='application/x-shellscript'
-            )
+            content = generate_bash_script(config_data, output_format, 'vm-deploy.sh', script_mode, automation,
+                                           generated_at)
+            download_name = 'vm-deploy.sh'
+            mimetype = 'application/x-shellscript'
         
         elif output_type == 'pve':
             # PVEļ
-            config_content = generate_pve_config(config_data)
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.conf', delete=False) as f:
-                f.write(config_content)
-                temp_path = f.name
-            
-            return send_file(
-                temp_path,
-                as_attachment=True,
-                download_name=f'vm-{config_data.get("vmid", "100")}.conf',
-                mimetype='text/plain'
-            )
+            content = generate_pve_config(config_data, generated_at)
+            download_name = f'vm-{config_data.get("vmid", "100")}.conf'
+            mimetype = 'text/plain'
         
         elif output_type == 'libvirt':
             # Libvirt XMLļ
-            config_content = generate_libvirt_xml(config_data)
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
-                f.write(config_content)
-                temp_path = f.name
-            
-            return send_file(
-                temp_path,
-                as_attachment=True,
-                download_name=f'{config_data.get("name", "vm")}.xml',
-                mimetype='application/xml'
-            )
+            content = generate_libvirt_xml(config_data, generated_at)
+            download_name = f'{config_data.get("name", "vm")}.xml'
+            mimetype = 'application/xml'
         
         else:
             return jsonify({'error': 'ֵ֧'}), 400
+        
+        # ǿETagΪļݵSHA-256δ仯ʱ304
+        data = content.encode('utf-8')
+        etag = hashlib.sha256(data).hexdigest()
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return send_file(
+            io.BytesIO(data),
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype,
+            etag=etag
+        )
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/preview', methods=['POST'])
+@profiled
 def preview():
     """Ԥļ"""
     try:
         config_data = request.json.get('config', {})
         output_format = request.json.get('format', 'pve')
+        generated_at = deterministic_request()  # ȷ
+        
+        errors = validate_config(config_data)
+        if errors:
+            return jsonify({'error': 'Уʧ', 'errors': errors}), 400
         
         if output_format == 'pve':
-            content = generate_pve_config(config_data)
+            content = generate_pve_config(config_data, generated_at)
         else:
-            content = generate_libvirt_xml(config_data)
+            content = generate_libvirt_xml(config_data, generated_at)
         
-        return jsonify({
+        return conditional_json({
             'success': True,
             'content': content
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/validate', methods=['POST'])
+def validate():
+    """У鵥ãconfigһãconfigs"""
+    if 'configs' in request.json:
+        failures = CONFIG_VALIDATOR.validate_many(request.json.get('configs', []))
+        return jsonify({'valid': not failures, 'failures': failures})
+    
+    warnings = []
+    errors = validate_config(request.json.get('config', {}), warnings)
+    return jsonify({'valid': not errors, 'errors': errors, 'warnings': warnings})
+
+@app.route('/api/topology', methods=['POST'])
+def plan_topology():
+    """CPU/NUMAˣ host_layout ָ֣JSONlscpu"""
+    config_data = request.json.get('config', {})
+    host_layout = request.json.get('host_layout')
+    
+    host = HOST_TOPOLOGY
+    if host_layout:
+        try:
+            host = HostTopology.parse(host_layout)
+        except TopologyError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    errors = validate_config(config_data)
+    if errors:
+        return jsonify({'error': 'Уʧ', 'errors': errors}), 400
+    
+    topology = VmTopology(config_data, host)
+    return jsonify({
+        'host': host.to_dict() if host else None,
+        'plan': topology.to_dict(),
+        'pve': topology.pve_options(),
+        'warnings': topology.warnings,
+    })
+
+@app.route('/api/placement', methods=['POST'])
+def plan_placement():
+    """һ÷䵽ϣscripts ΪʱΪÿ̨ύű"""
+    configs = request.json.get('configs', [])
+    if not isinstance(configs, list) or not configs:
+        return jsonify({'error': 'бΪ'}), 400
+    
+    failures = CONFIG_VALIDATOR.validate_many(configs)
+    if failures:
+        return jsonify({'error': 'Уʧ', 'failures': failures}), 400
+    
+    try:
+        inventory = request.json.get('inventory')
+        overcommit = request.json.get('overcommit')
+        if inventory:
+            planner = CapacityPlanner.from_inventory(inventory, overcommit)
+        else:
+            planner = CapacityPlanner.load(app.config['HOST_INVENTORY'], overcommit)
+    except FileNotFoundError:
+        return jsonify({'error': 'δṩ嵥'}), 400
+    except PlacementError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    with tracing.span('placement.plan', vms=len(configs), hosts=len(planner.hosts)):
+        result = planner.plan(configs)
+    
+    if request.json.get('scripts'):
+        output_format = request.json.get('output_format', 'pve')
+        script_mode = request.json.get('script_mode', 'full')
+        automation = bool(request.json.get('automation'))
+        if script_mode not in SCRIPT_MODES:
+            return jsonify({'error': f"űģʽ {', '.join(SCRIPT_MODES)} ֮һ"}), 400
+        script_jobs = {}
+        for host in result['hosts']:
+            if not host['vm_indices']:
+                continue
+            items = [{'config': configs[i], 'output_format': output_format, 'script_mode': script_mode,
+                      'automation': automation,
+                      'filename': f"{host['name']}-vm-{configs[i].get('vmid', i)}-deploy.sh"}
+                     for i in host['vm_indices']]
+            try:
+                script_jobs[host['name']] = JOB_MANAGER.submit('script', items)
+            except JobError as e:
+                return jsonify({'error': str(e)}), 400
+        result['script_jobs'] = script_jobs
+    
+    return jsonify(result)
+
+@app.route('/api/diff', methods=['POST'])
+def diff_configs():
+    """Ƚãold/new Ϊֵ䣬 old_content/new_content Ϊļ"""
+    try:
+        if 'old_content' in request.json or 'new_content' in request.json:
+            config_type = request.json.get('type', 'pve')
+            if config_type not in CONFIG_TYPES:
+                return jsonify({'error': 'ֵ֧'}), 400
+            old = CONFIG_DIFFER.load(request.json.get('old_content', ''), config_type)
+            new = CONFIG_DIFFER.load(request.json.get('new_content', ''), config_type)
+        else:
+            old_config = request.json.get('old', {})
+            new_config = request.json.get('new', {})
+            if not isinstance(old_config, dict) or not isinstance(new_config, dict):
+                return jsonify({'error': 'ñǶ'}), 400
+            old = CONFIG_DIFFER.normalize(old_config)
+            new = CONFIG_DIFFER.normalize(new_config)
+        changes = CONFIG_DIFFER.diff(old, new)
+    except DiffError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    changed_sections = sorted({change['section'] for change in changes})
+    return jsonify({'identical': not changes, 'changed_sections': changed_sections, 'changes': changes})
+
+@app.route('/api/bulk', methods=['POST'])
+def bulk_render():
+    """ɻúͲrows  csvļű"""
+    base = request.json.get('config', {})
+    outputs = request.json.get('outputs', ['pve'])
+    output_format = request.json.get('output_format', 'pve')
+    script_mode = request.json.get('script_mode', 'full')
+    automation = bool(request.json.get('automation'))
+    
+    if script_mode not in SCRIPT_MODES:
+        return jsonify({'error': f"űģʽ {', '.join(SCRIPT_MODES)} ֮һ"}), 400
+    if output_format not in CONFIG_TYPES:
+        return jsonify({'error': f"ʽ {', '.join(CONFIG_TYPES)} ֮һ"}), 400
+    available = {
+        'pve': generate_pve_config,
+        'libvirt': generate_libvirt_xml,
+        'script': lambda config_data: generate_bash_script(
+            config_data, output_format, f"vm-{config_data.get('vmid', '')}-deploy.sh", script_mode, automation),
+    }
+    if not isinstance(outputs, list) or not outputs or any(o not in available for o in outputs):
+        return jsonify({'error': f"ͱ {', '.join(available)} еһ"}), 400
+    
+    try:
+        table = request.json.get('csv', request.json.get('rows'))
+        rows = parse_rows(table) if table is not None else None
+        template = BulkTemplate(base, rows, request.json.get('patterns'),
+                                count=request.json.get('count'),
+                                max_rows=app.config['BULK_MAX_ROWS'])
+        with tracing.span('bulk.render', rows=len(template.rows), outputs=','.join(outputs)):
+            results = list(pause_for_interactive(template.render({o: available[o] for o in outputs},
+                                                                 CONFIG_VALIDATOR)))
+    except BulkTemplateError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    failed = sum(1 for r in results if 'errors' in r)
+    return jsonify({'count': len(results), 'failed': failed, 'stats': template.stats, 'results': results})
+
+@app.route('/api/export', methods=['POST'])
+def export_archive():
+    """ɵļͲűɱߴΪ tar.gz / tar.zst / zip """
+    outputs = request.json.get('outputs', ['pve', 'libvirt', 'script'])
+    output_format = request.json.get('output_format', 'pve')
+    archive_format = request.json.get('format', 'tar.gz')
+    script_mode = request.json.get('script_mode', 'full')
+    automation = bool(request.json.get('automation'))
+    
+    if script_mode not in SCRIPT_MODES:
+        return jsonify({'error': f"űģʽ {', '.join(SCRIPT_MODES)} ֮һ"}), 400
+    if output_format not in CONFIG_TYPES:
+        return jsonify({'error': f"ʽ {', '.join(CONFIG_TYPES)} ֮һ"}), 400
+    renderers = {
+        'pve': generate_pve_config,
+        'libvirt': generate_libvirt_xml,
+        'script': lambda config_data: generate_bash_script(
+            config_data, output_format, 'vm-deploy.sh', script_mode, automation),
+    }
+    if not isinstance(outputs, list) or not outputs or any(o not in renderers for o in outputs):
+        return jsonify({'error': f"ͱ {', '.join(renderers)} еһ"}), 400
+    renderers = {o: renderers[o] for o in outputs}
+    
+    try:
+        check_format(archive_format)
+        configs = request.json.get('configs')
+        if configs is not None:
+            # ֱӸб
+            if not isinstance(configs, list) or not configs:
+                return jsonify({'error': 'configs Ƿǿб'}), 400
+            if len(configs) > app.config['BULK_MAX_ROWS']:
+                return jsonify({'error': f" {app.config['BULK_MAX_ROWS']}"}), 400
+            results = _render_configs(configs, renderers)
+        else:
+            #  + ͬ /api/bulk
+            table = request.json.get('csv', request.json.get('rows'))
+            rows = parse_rows(table) if table is not None else None
+            template = BulkTemplate(request.json.get('config', {}), rows, request.json.get('patterns'),
+                                    count=request.json.get('count'),
+                                    max_rows=app.config['BULK_MAX_ROWS'])
+            results = template.render(renderers, CONFIG_VALIDATOR)
+        # ȡһʹУʧܵȴڿʼǰ
+        first = next(results)
+    except (ArchiveError, BulkTemplateError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    manifest_info = {'output_format': output_format, 'vms': 0, 'errors': []}
+    files = _archive_files(pause_for_interactive(itertools.chain([first], results)), manifest_info)
+    
+    archive_name = f"vm-configs-{datetime.now().strftime('%Y%m%d%H%M%S')}.{archive_format}"
+    response = Response(stream_with_context(stream_archive(files, archive_format, manifest_info)),
+                        mimetype=ARCHIVE_FORMATS[archive_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{archive_name}"'
+    return response
+
+def _render_configs(configs, renderers):
+    """У鲢бʽͬ BulkTemplate.render"""
+    for index, config_data in enumerate(configs):
+        if not isinstance(config_data, dict):
+            yield {'index': index, 'vmid': None, 'name': None,
+                   'errors': [{'key': '', 'message': 'ñǶ'}]}
+            continue
+        errors = CONFIG_VALIDATOR.validate(config_data)
+        if errors:
+            yield {'index': index, 'vmid': config_data.get('vmid'), 'name': config_data.get('name'),
+                   'errors': errors}
+            continue
+        outputs = {}
+        try:
+            for output_type, renderer in renderers.items():
+                outputs[output_type] = renderer(config_data)
+        except Exception as e:
+            # ѿʼ鵵嵥ж
+            yield {'index': index, 'vmid': config_data.get('vmid'), 'name': config_data.get('name'),
+                   'errors': [{'key': '', 'message': f" {output_type} ʧ: {e}"}]}
+            continue
+        yield {'index': index, 'vmid': config_data.get('vmid'), 'name': config_data.get('name'),
+               'outputs': outputs}
+
+def _archive_files(results, manifest_info):
+    """ɽתΪ鵵е (·, )ÿ̨һĿ¼Уʧܵ嵥"""
+    extensions = {'pve': 'conf', 'libvirt': 'xml'}
+    used = set()
+    # Ӧﲻ¼׷ٽ׶
+    for result in results:
+        if 'errors' in result:
+            manifest_info['errors'].append(result)
+            continue
+        
+        vmid = secure_filename(str(result.get('vmid') or '')) or str(result['index'])
+        directory = f"vm-{vmid}"
+        if directory in used:
+            directory = f"{directory}-{result['index']}"
+        used.add(directory)
+        manifest_info['vms'] += 1
+        
+        for output_type, content in result['outputs'].items():
+            if output_type == 'script':
+                yield f"{directory}/vm-deploy.sh", content
+            else:
+                yield f"{directory}/vm-{vmid}.{extensions[output_type]}", content
+
+@app.route('/api/sync', methods=['GET', 'POST'])
+def sync_status():
+    """Ŀ¼ͬ״̬POST Ƚ mtime/size ɨ"""
+    if SYNC_INDEX is None:
+        return jsonify({'enabled': False})
+    body = {'enabled': True}
+    if request.method == 'POST':
+        body['changed'] = SYNC_INDEX.scan()
+    body.update(SYNC_INDEX.status())
+    return jsonify(body)
+
+@app.route('/api/sync/configs', methods=['GET'])
+def list_synced_configs():
+    """ҳгͬĿ¼еãpath ʱظļ"""
+    if SYNC_INDEX is None:
+        return jsonify({'error': 'δͬĿ¼'}), 404
+    
+    path = request.args.get('path')
+    if path:
+        entry = SYNC_INDEX.get(path)
+        if entry is None:
+            return jsonify({'error': 'ò'}), 404
+        return jsonify(entry)
+    
+    config_type = request.args.get('type')
+    if config_type not in (None, 'pve', 'libvirt'):
+        return jsonify({'error': 'ͱ pve  libvirt'}), 400
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    return jsonify(SYNC_INDEX.list(offset, limit, config_type, request.args.get('since', 0, type=int)))
+
+@app.route('/api/sync/profiles', methods=['GET'])
+def list_synced_profiles():
+    """ͬĿ¼ʹ profileCPUʾ߼̺ͬȥͳ"""
+    if SYNC_INDEX is None:
+        return jsonify({'error': 'δͬĿ¼'}), 404
+    return jsonify(SYNC_INDEX.profiles(min(request.args.get('limit', 20, type=int), 1000)))
+
+@app.route('/api/sync/profiles/<fingerprint>', methods=['GET'])
+def get_synced_profile(fingerprint):
+    """ʹĳ profile ĳļ"""
+    if SYNC_INDEX is None:
+        return jsonify({'error': 'δͬĿ¼'}), 404
+    shared = SYNC_INDEX.sharing(fingerprint)
+    if shared is None:
+        return jsonify({'error': 'ָƲ'}), 404
+    return jsonify(dict(shared, fingerprint=fingerprint, count=len(shared['members'])))
+
+@app.route('/api/admission', methods=['GET'])
+def admission_stats():
+    """·ɵ׼״̬"""
+    if ADMISSION is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(ADMISSION.stats(), enabled=True))
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """ύID"""
+    kind = request.json.get('kind', '')
+    items = request.json.get('items', [])
+    options = request.json.get('options', {})
+    
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'items Ƕб'}), 400
+    if not isinstance(options, dict):
+        return jsonify({'error': 'options Ƕ'}), 400
+    
+    # options ΪõĲ output_type
+    if options:
+        items = [{**options, **item} for item in items]
+    
+    # ύʱУ飬ִеһʧ
+    if kind in ('generate', 'script'):
+        failures = CONFIG_VALIDATOR.validate_many([item.get('config', {}) for item in items])
+        if failures:
+            return jsonify({'error': 'Уʧ', 'failures': failures}), 400
+    
+    try:
+        job_id = JOB_MANAGER.submit(kind, items)
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """г"""
+    return jsonify({'jobs': JOB_MANAGER.list()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """ѯ"""
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        return jsonify({'error': '񲻴'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """ȡ"""
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        return jsonify({'error': '񲻴'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    results = JOB_MANAGER.results(job_id, offset, limit)
+    next_offset = results[-1]['index'] + 1 if results else offset
+    
+    return jsonify({
+        'job': job,
+        'results': results,
+        'next_offset': next_offset
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """ȡ"""
+    if JOB_MANAGER.get(job_id) is None:
+        return jsonify({'error': '񲻴'}), 404
+    return jsonify({'success': JOB_MANAGER.cancel(job_id)})
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """ге¼"""
+    if not profiling_access_allowed():
+        return jsonify({'error': 'Ȩ'}), 403
+    
+    return jsonify({
+        'capacity': PROFILE_STORE.capacity,
+        'profiles': PROFILE_STORE.list()
+    })
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """鿴ص¼"""
+    if not profiling_access_allowed():
+        return jsonify({'error': 'Ȩ'}), 403
+    
+    record = PROFILE_STORE.get(profile_id)
+    if record is None:
+        return jsonify({'error': '¼'}), 404
+    
+    # format=pstats ԭʼͳݣ pstats/snakeviz 
+    if request.args.get('format') == 'pstats':
+        response = make_response(record['raw_stats'])
+        response.headers['Content-Type'] = 'application/octet-stream'
+        response.headers['Content-Disposition'] = f'attachment; filename=profile-{profile_id}.pstats'
+        return response
+    
+    return jsonify({key: value for key, value in record.items() if key != 'raw_stats'})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=34567, debug=False)
\ No newline at end of file
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+ASGI入口
+在事件循环中以非阻塞方式读取上传内容、流式写出响应，
+Flask应用中的解析/生成等CPU密集工作交给有界线程池执行
+
+运行方式：
+    uvicorn asgi:app --host 0.0.0.0 --port 34567
+"""
+
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+# 线程池大小决定同时执行解析/生成的请求数，上传和下载阶段不占用线程
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+# 请求体超过该大小后转存到临时文件，避免大文件上传占用内存
+SPOOL_MAX_MEMORY = int(os.environ.get('ASGI_SPOOL_MAX_MEMORY', 1024 * 1024))
+
+
+class RequestTooLarge(Exception):
+    """请求体超过 MAX_CONTENT_LENGTH"""
+
+
+class ClientDisconnected(Exception):
+    """客户端在请求体传输完成前断开"""
+
+
+class AsgiAdapter:
+    """
+    把WSGI应用包装为ASGI应用
+
+    Args:
+        wsgi_app: WSGI应用
+        max_workers (int): 执行WSGI应用的线程数
+        max_content_length (int): 允许的最大请求体字节数，None为不限制
+    """
+
+    def __init__(self, wsgi_app, max_workers=ASGI_WORKERS, max_content_length=None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_content_length = max_content_length
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='vmcg-asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"不支持的ASGI协议类型: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        """在事件循环中逐块读取请求体，慢速上传不占用工作线程"""
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        size = 0
+        more_body = True
+
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                raise ClientDisconnected()
+
+            chunk = message.get('body', b'')
+            if chunk:
+                size += len(chunk)
+                if self.max_content_length is not None and size > self.max_content_length:
+                    body.close()
+                    raise RequestTooLarge()
+                body.write(chunk)
+            more_body = message.get('more_body', False)
+
+        body.seek(0)
+        return body, size
+
+    @staticmethod
+    def _build_environ(scope, body, size):
+        """根据ASGI scope构建WSGI environ"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'CONTENT_LENGTH': str(size),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        for raw_name, raw_value in scope.get('headers', []):
+            name = raw_name.decode('latin-1').upper().replace('-', '_')
+            value = raw_value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+                continue
+            if name == 'CONTENT_LENGTH':
+                continue
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+        return environ
+
+    def _start(self, environ):
+        """
+        在线程池中调用WSGI应用并取出第一块响应数据
+
+        Returns:
+            tuple: (状态行, 响应头, WSGI返回值, 响应迭代器, 第一块数据)
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            return lambda data: None
+
+        app_iter = self.wsgi_app(environ, start_response)
+        iterator = iter(app_iter)
+        first_chunk = next(iterator, None)
+        return response['status'], response['headers'], app_iter, iterator, first_chunk
+
+    @staticmethod
+    def _close(app_iter):
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+
+    async def _send_simple(self, send, status, body):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                        (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+
+        try:
+            body, size = await self._read_body(receive)
+        except RequestTooLarge:
+            await self._send_simple(send, 413, '请求体过大'.encode('utf-8'))
+            return
+        except ClientDisconnected:
+            return
+
+        try:
+            environ = self._build_environ(scope, body, size)
+            # 同一请求的各步可能在不同线程中执行，都在同一个上下文中运行，
+            # stream_with_context 的请求上下文和 teardown_request 才能在后续数据块和 close 中使用
+            ctx = contextvars.copy_context()
+            status, headers, app_iter, iterator, chunk = await loop.run_in_executor(
+                self.executor, ctx.run, self._start, environ)
+
+            try:
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers],
+                })
+
+                # 后续数据块（如send_file的文件内容）在线程池中读取，在事件循环中写出
+                while chunk is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await loop.run_in_executor(self.executor, ctx.run, next, iterator, None)
+
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                await loop.run_in_executor(self.executor, ctx.run, self._close, app_iter)
+        finally:
+            body.close()
+
+
+app = AsgiAdapter(flask_app,
+                  max_content_length=flask_app.config.get('MAX_CONTENT_LENGTH'))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+批量模板基准测试
+由一个基础配置和 --vms 行参数表批量生成PVE配置、Libvirt XML和部署脚本，比较模板替换与逐行完整生成的耗时，
+并核对模板替换的结果与 generate_* 逐行生成的结果一致。参数表：
+- verbatim：每行只改变 vmid、名称、网卡MAC和磁盘卷名，应全部使用模板替换
+- machine、scsihw、numa、hugepages、disk_profile、net_multiqueue：每行另外轮流取该键的几个值，
+  这些值决定生成函数的分支（如 machine 为 q35 时使用SATA），与第一行不同的行必须完整生成
+另外只给出数量、不覆盖任何字段时，核对各虚拟机的名称、UUID、MAC和磁盘卷互不相同
+
+用法：
+    python benchmarks/bench_bulk.py [--vms 1000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+import app as app_module  # noqa: E402
+from converters.bulk_template import BulkTemplate  # noqa: E402
+
+# 不写入生成时间，相同输入得到相同输出
+RENDERERS = {
+    'pve': lambda config: app_module.generate_pve_config(config, generated_at=''),
+    'libvirt': lambda config: app_module.generate_libvirt_xml(config, generated_at=''),
+    'script': lambda config: app_module.generate_bash_script(
+        config, 'pve', f"vm-{config.get('vmid', '')}-deploy.sh", generated_at=''),
+}
+
+PATTERNS = {
+    'name': 'web-{n:05d}',
+    'net0': 'virtio={mac},bridge=vmbr0,firewall=1',
+    'scsi0': 'local-lvm:vm-{vmid}-disk-0,size=32G',
+}
+
+BRANCHES = {
+    'machine': ['q35', 'pc'],
+    'scsihw': ['virtio-scsi-pci', 'virtio-scsi-single', 'lsi'],
+    'numa': ['0', '1'],
+    'hugepages': ['2', '1024', 'any'],
+    'disk_profile': ['db-nvme', 'throughput', 'safe'],
+    'net_multiqueue': ['0', '1'],
+}
+
+
+def make_rows(rng, count, branch=None):
+    rows = []
+    for i in range(count):
+        row = {'vmid': str(1000 + i), 'mac': ':'.join(['52', '54', '00'] + [f"{rng.randrange(256):02X}"
+                                                                        for _ in range(3)])}
+        if branch is not None:
+            row[branch] = BRANCHES[branch][i % len(BRANCHES[branch])]
+        rows.append(row)
+    return rows
+
+
+def check_unique(base, count):
+    """只给出数量时，生成结果中应互不相同的值出现重复的项"""
+    template = BulkTemplate(base, count=count, max_rows=count)
+    seen = {}
+    for result in template.render(RENDERERS, app_module.CONFIG_VALIDATOR):
+        outputs = result.get('outputs', {})
+        values = re.findall(r'<(name|uuid)>([^<]*)<', outputs.get('libvirt', ''))
+        values += re.findall(r'<(mac) address="([^"]*)"', outputs.get('libvirt', ''))
+        values += re.findall(r'^(scsi0|vmgenid): ([^,\n]*)', outputs.get('pve', ''), re.M)
+        for value in values:
+            seen[value] = seen.get(value, 0) + 1
+    return sorted(f"{kind}={value}" for (kind, value), n in seen.items() if n > 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量模板基准测试')
+    parser.add_argument('--vms', type=int, default=1000, help='每组参数表的行数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = dict(app_module.load_default_config('pve'), sockets='2')
+    failed = False
+    for label, branch in [('verbatim', None)] + [(key, key) for key in BRANCHES]:
+        template = BulkTemplate(base, make_rows(rng, args.vms, branch), PATTERNS, max_rows=args.vms)
+
+        start = time.perf_counter()
+        results = list(template.render(RENDERERS, app_module.CONFIG_VALIDATOR))
+        templated = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [{o: renderer(template.instance(i)) for o, renderer in RENDERERS.items()}
+                    for i in range(len(template.rows))]
+        rendered = time.perf_counter() - start
+
+        errors = [r for r in results if 'errors' in r]
+        mismatched = [r['index'] for r in results if 'outputs' in r and r['outputs'] != expected[r['index']]]
+        print(f"{label}: {args.vms} 行，模板替换 {template.stats['templated_rows']} 行"
+              f"（{', '.join(template.stats['template_outputs']) or '无'}），完整生成 {template.stats['rendered_rows']} 行；"
+              f"耗时 {templated:.2f}s，逐行完整生成 {rendered:.2f}s")
+        if errors or mismatched:
+            print(f"{label}: {len(errors)} 行生成失败，{len(mismatched)} 行与逐行生成结果不一致"
+                  f"（如第 {(mismatched or [None])[0]} 行）")
+            failed = True
+        if branch is None and template.stats['rendered_rows']:
+            print(f"{label}: 只改变原样写入的字段时应全部使用模板替换")
+            failed = True
+
+    duplicates = check_unique(app_module.load_default_config('pve'), args.vms)
+    print(f"只给出数量：{args.vms} 台虚拟机的名称、UUID、MAC和磁盘卷{'有重复' if duplicates else '互不相同'}")
+    if duplicates:
+        print('重复的值：' + ', '.join(duplicates[:5]))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+响应压缩基准测试
+对默认配置的预览和生成请求按各压缩编码测量传输字节数和平均耗时，核对解压结果与未压缩响应一致，
+并比较部署脚本gzip压缩时拼接预先压缩的运行时部分与整体压缩的耗时
+
+用法：
+    python benchmarks/bench_compression.py [--rounds 200]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+import app as app_module  # noqa: E402
+from services import compression  # noqa: E402
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return compression.brotli.decompress(data)
+    return compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def measure(client, path, payload, encoding, rounds):
+    """返回 (平均耗时ms, 响应体)"""
+    headers = {'Accept-Encoding': encoding or 'identity'}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response = client.post(path, json=payload, headers=headers)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    return elapsed, response.get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应压缩基准测试')
+    parser.add_argument('--rounds', type=int, default=200, help='每种请求的重复次数')
+    args = parser.parse_args()
+
+    client = app_module.app.test_client()
+    config = app_module.load_default_config('pve')
+    cases = [
+        ('预览 PVE', '/api/preview', {'config': config, 'format': 'pve'}),
+        ('预览 Libvirt', '/api/preview', {'config': config, 'format': 'libvirt'}),
+        ('脚本 PVE', '/generate', {'config': config, 'output_type': 'script', 'output_format': 'pve'}),
+        ('脚本 Libvirt', '/generate', {'config': config, 'output_type': 'script', 'output_format': 'libvirt'}),
+        ('Libvirt XML', '/generate', {'config': config, 'output_type': 'libvirt'}),
+    ]
+
+    failed = False
+    for label, path, payload in cases:
+        payload = dict(payload, deterministic=True)
+        identity_ms, plain = measure(client, path, payload, None, args.rounds)
+        print(f"{label}: 未压缩 {len(plain)}B，{identity_ms:.2f}ms")
+        for encoding in compression.available_encodings():
+            elapsed, data = measure(client, path, payload, encoding, args.rounds)
+            valid = len(plain) < app_module.app.config['COMPRESS_MIN_SIZE'] or decompress(data, encoding) == plain
+            print(f"  {encoding}: {len(data)}B（{len(data) / len(plain):.0%}），{elapsed:.2f}ms，"
+                  f"内容{'一致' if valid else '不一致'}")
+            failed = failed or not valid
+
+    # 部署脚本gzip：拼接预先压缩的运行时部分 vs 整体压缩
+    script = app_module.generate_bash_script(config, 'pve', 'vm-deploy.sh').encode('utf-8')
+    timings = {}
+    for name, blocks in (('整体压缩', None), ('预先压缩', app_module.SCRIPT_STATIC_BLOCKS)):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            data = compression.compress(script, 'gzip', blocks)
+        timings[name] = ((time.perf_counter() - start) / args.rounds * 1000, len(data))
+        failed = failed or decompress(data, 'gzip') != script
+    print('脚本gzip压缩: ' + '，'.join(f"{name} {ms:.3f}ms/{size}B" for name, (ms, size) in timings.items()))
+
+    if failed:
+        print('解压结果与未压缩响应不一致')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+配置目录差异比较基准测试
+在临时目录中生成两份配置（其中一部分被修改），测量 ConfigDiffer.diff_directories 的耗时
+
+用法：
+    python benchmarks/bench_config_diff.py [--files 5000] [--changed 0.01] [--max-seconds 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from converters.config_diff import ConfigDiffer  # noqa: E402
+from converters.config_sections import PVE_CONFIG_SECTIONS  # noqa: E402
+
+CONFIG_TEMPLATE = """# Proxmox VE 配置文件
+# 生成时间: {timestamp}
+vmid: {vmid}
+name: vm-{vmid}
+memory: {memory}
+cores: {cores}
+sockets: 1
+cpu: host
+numa: 0
+ostype: l26
+boot: order=scsi0;ide2;net0
+scsi0: local-lvm:vm-{vmid}-disk-0,size=32G
+scsi1: local-lvm:vm-{vmid}-disk-1,size=100G,cache=none
+ide2: none,media=cdrom
+scsihw: virtio-scsi-pci
+net0: virtio=52:54:00:{mac},bridge=vmbr0,firewall=1
+vga: std
+"""
+
+
+def write_config(path, vmid, memory, cores, timestamp):
+    mac = f"{vmid >> 16 & 0xff:02x}:{vmid >> 8 & 0xff:02x}:{vmid & 0xff:02x}"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(CONFIG_TEMPLATE.format(vmid=vmid, memory=memory, cores=cores, mac=mac,
+                                       timestamp=timestamp))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ConfigDiffer 目录比较基准测试')
+    parser.add_argument('--files', type=int, default=5000, help='每个目录中的配置文件数')
+    parser.add_argument('--changed', type=float, default=0.01, help='被修改的文件比例')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='耗时上限，超过视为失败')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        old_dir = os.path.join(tmp, 'old')
+        new_dir = os.path.join(tmp, 'new')
+        os.makedirs(old_dir)
+        os.makedirs(new_dir)
+
+        expected = 0
+        for i in range(args.files):
+            vmid = 100 + i
+            name = f'{vmid}.conf'
+            write_config(os.path.join(old_dir, name), vmid, 2048, 2, '2024-01-01 00:00:00')
+            if rng.random() < args.changed:
+                expected += 1
+                write_config(os.path.join(new_dir, name), vmid, 4096, 4, '2024-01-02 00:00:00')
+            elif rng.random() < 0.1:
+                # 只有生成时间不同，解析后相同
+                write_config(os.path.join(new_dir, name), vmid, 2048, 2, '2024-01-02 00:00:00')
+            else:
+                write_config(os.path.join(new_dir, name), vmid, 2048, 2, '2024-01-01 00:00:00')
+
+        start = time.perf_counter()
+        result = ConfigDiffer(PVE_CONFIG_SECTIONS).diff_directories(old_dir, new_dir)
+        elapsed = time.perf_counter() - start
+
+    print(f"文件 {args.files}，耗时 {elapsed:.3f}s")
+    print(f"变化 {len(result['changed'])}（预期 {expected}），相同 {result['identical']}")
+
+    if len(result['changed']) != expected:
+        print('变化文件数与预期不符')
+        return 1
+    if elapsed > args.max_seconds:
+        print('比较耗时超过上限')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+配置去重基准测试
+生成 --vms 份PVE配置文件内容（少数几种CPU、启动、显示、高级和磁盘/网卡参数组合，名称、vmid、卷名和MAC各不相同），
+用 parse_pve_config 解析后分别保存为普通字典和去重存储，比较内存占用（tracemalloc）和保存耗时，
+测量按 profile 查找共用虚拟机的耗时，并核对还原的配置与原配置一致
+
+用法：
+    python benchmarks/bench_dedup.py [--vms 100000] [--profiles 12]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+import app as app_module  # noqa: E402
+from services.dedup import ConfigStore  # noqa: E402
+
+VARIANTS = {
+    'cpu': ['cores: 2\nsockets: 1\ncpu: host\nnuma: 0', 'cores: 4\nsockets: 1\ncpu: host\nnuma: 0',
+            'cores: 8\nsockets: 2\ncpu: x86-64-v2-AES\nnuma: 1'],
+    'boot': ['boot: order=scsi0;ide2;net0\nbios: ovmf\nmachine: q35\nostype: l26\nonboot: 1\nagent: 1',
+             'boot: order=scsi0;net0\nbios: seabios\nmachine: pc\nostype: win11\nonboot: 1\nagent: 1'],
+    'display': ['vga: std\nserial0: socket', 'vga: qxl'],
+    'advanced': ['hotplug: disk,network,usb\nprotection: 0\nballoon: 0', 'hotplug: 0\nprotection: 1\nballoon: 1024'],
+    'disks': ['scsihw: virtio-scsi-single\n'
+              'scsi0: {storage}:vm-{vmid}-disk-0,cache=writeback,discard=on,iothread=1,size=32G',
+              'scsihw: virtio-scsi-pci\nscsi0: {storage}:vm-{vmid}-disk-0,cache=none,size=64G\n'
+              'scsi1: {storage}:vm-{vmid}-disk-1,cache=none,size=200G'],
+    'network': ['net0: virtio={mac},bridge=vmbr0,firewall=1', 'net0: virtio={mac},bridge=vmbr1,tag=20'],
+}
+
+
+def make_config(rng, vmid, profiles):
+    parts = rng.choice(profiles)
+    mac = ':'.join(f"{rng.randrange(256):02X}" for _ in range(6))
+    text = '\n'.join([f"name: vm-{vmid}", f"memory: {rng.choice([2048, 4096, 8192])}",
+                      f"smbios1: uuid={rng.getrandbits(128):032x}"] + parts)
+    return text.format(vmid=vmid, mac=mac, storage=rng.choice(['local-lvm', 'ceph']))
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置去重基准测试')
+    parser.add_argument('--vms', type=int, default=100000, help='虚拟机数')
+    parser.add_argument('--profiles', type=int, default=12, help='分组组合的种类数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    profiles = [[rng.choice(values) for values in VARIANTS.values()] for _ in range(args.profiles)]
+    texts = [make_config(rng, 100 + i, profiles) for i in range(args.vms)]
+
+    plain, plain_size, plain_time = measure(
+        lambda: {i: app_module.parse_pve_config(text) for i, text in enumerate(texts)})
+
+    def build_store():
+        store = ConfigStore()
+        for i, text in enumerate(texts):
+            store.add(i, app_module.parse_pve_config(text))
+        return store
+
+    store, store_size, store_time = measure(build_store)
+    print(f"{args.vms} 台虚拟机：普通字典 {plain_size / 1024 ** 2:.1f}MB（{plain_time:.2f}s），"
+          f"去重存储 {store_size / 1024 ** 2:.1f}MB（{store_time:.2f}s），"
+          f"减少 {1 - store_size / plain_size:.0%}")
+    print(f"去重统计：{store.stats()}")
+
+    profile = store.fingerprints(0)['profile']
+    rounds = 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        shared = store.sharing(profile)
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    print(f"按 profile 查找：{len(shared['members'])} 台共用，平均 {elapsed:.3f}ms")
+
+    mismatched = sum(1 for i in rng.sample(range(args.vms), min(args.vms, 5000)) if store.get(i) != plain[i])
+    if mismatched:
+        print(f"{mismatched} 份还原的配置与原配置不一致")
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Libvirt XML生成基准测试
+测量不同磁盘数量下 generate_libvirt_xml 的耗时，检查生成时间随磁盘数线性增长；
+并核对从基础镜像克隆时，部署脚本创建的镜像路径与XML中第一个磁盘的来源一致
+
+用法：
+    python benchmarks/bench_device_layout.py [--repeat 200] [--max-ratio 1.5]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+from app import generate_bash_script, generate_libvirt_xml, load_default_config  # noqa: E402
+
+DISK_COUNTS = [1, 8, 16, 32, 64]
+NIC_COUNT = 4
+
+
+def build_config(disk_count):
+    """生成带有指定数量磁盘（SCSI和VirtIO各半）和4块网卡的配置"""
+    config = load_default_config('pve')
+    for key in [k for k in config if k.startswith(('scsi', 'virtio', 'sata', 'ide', 'net'))
+                and k != 'scsihw']:
+        del config[key]
+
+    for i in range(disk_count):
+        if i % 2 == 0:
+            config[f'scsi{i // 2}'] = f'local-lvm:vm-100-disk-{i},size=32G'
+        else:
+            config[f'virtio{i // 2}'] = f'local-lvm:vm-100-disk-{i},size=32G'
+
+    for i in range(NIC_COUNT):
+        config[f'net{i}'] = f'virtio=52:54:00:00:00:{i:02x},bridge=vmbr{i}'
+    return config
+
+
+def check_clone_paths():
+    """
+    克隆部署时XML中第一个磁盘的来源应为脚本创建的覆盖层/副本，基础镜像只作为后备文件
+
+    Returns:
+        list: 不一致的说明，为空表示一致
+    """
+    problems = []
+    for disk in ('local-lvm:vm-100-disk-0,size=32G', '/srv/images/vm-100.qcow2,size=32G'):
+        for mode in ('linked', 'full'):
+            config = dict(load_default_config('pve'), scsi0=disk, clone_mode=mode,
+                          clone_source='/var/lib/libvirt/images/base.qcow2')
+            xml = generate_libvirt_xml(config, generated_at='')
+            source = re.search(r'<disk type="file" device="disk">.*?<source file="([^"]*)"', xml, re.S).group(1)
+
+            script = generate_bash_script(config, 'libvirt', 'vm-deploy.sh', 'full', generated_at='')
+            target = re.search(r'^\s*local disk_path="([^"]*)"', script, re.M)
+            if target is None or 'clone_image "/var/lib/libvirt/images/base.qcow2" "$disk_path"' not in script:
+                problems.append(f"{disk} {mode}: 部署脚本没有克隆第一个磁盘")
+            elif target.group(1) != source:
+                problems.append(f"{disk} {mode}: 部署脚本创建 {target.group(1)}，XML中的来源为 {source}")
+
+            script = generate_bash_script(config, 'libvirt', 'vm-deploy.sh', 'idempotent', generated_at='')
+            rows = [line.split() for line in script.splitlines() if line.endswith(f' {mode} -')
+                    or re.search(rf' /var/lib/libvirt/images/base\.qcow2 {mode} ', line)]
+            if not rows or rows[0][0] != source:
+                problems.append(f"{disk} {mode}: 幂等部署脚本的克隆目标 {rows[0][0] if rows else '-'}，"
+                                f"XML中的来源为 {source}")
+    return problems
+
+
+def measure(config, repeat):
+    """返回单次生成的平均耗时（秒）"""
+    generate_libvirt_xml(config)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        generate_libvirt_xml(config)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate_libvirt_xml 磁盘数量基准测试')
+    parser.add_argument('--repeat', type=int, default=200, help='每种磁盘数量的重复次数')
+    parser.add_argument('--max-ratio', type=float, default=1.5,
+                        help='64盘与8盘单盘耗时之比的上限，超过视为非线性')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'磁盘数':>6} {'耗时(ms)':>10} {'单盘(us)':>10}")
+    for count in DISK_COUNTS:
+        elapsed = measure(build_config(count), args.repeat)
+        results[count] = elapsed
+        print(f"{count:>6} {elapsed * 1000:>10.3f} {elapsed / count * 1e6:>10.1f}")
+
+    # 扣除与磁盘无关的固定开销后比较单盘耗时
+    base = results[1]
+    per_disk_8 = (results[8] - base) / 7
+    per_disk_64 = (results[64] - base) / 63
+    ratio = per_disk_64 / per_disk_8 if per_disk_8 > 0 else 0
+    print(f"\n单盘增量耗时 64盘/8盘 = {ratio:.2f}")
+
+    failed = False
+    if ratio > args.max_ratio:
+        print('生成时间随磁盘数量超线性增长')
+        failed = True
+
+    problems = check_clone_paths()
+    for problem in problems:
+        print(problem)
+    print(f"克隆部署的镜像路径与XML磁盘来源{'不一致' if problems else '一致'}")
+    return 1 if failed or problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+归档导出基准测试
+通过 /api/export 由一个基础配置批量生成虚拟机的配置文件和部署脚本并流式打包，
+测量每种归档格式的耗时、归档大小和（可选）峰值内存，并核对清单中的校验和
+
+用法：
+    python benchmarks/bench_export.py [--vms 10000] [--formats tar.gz,tar.zst,zip] [--max-seconds 30] [--memory]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import tracemalloc
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+import app as app_module  # noqa: E402
+from services.archive import MANIFEST_NAME, zstandard  # noqa: E402
+
+
+def read_archive(data, archive_format):
+    """解压归档，返回 路径 -> 内容"""
+    files = {}
+    if archive_format == 'zip':
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for name in archive.namelist():
+                files[name] = archive.read(name)
+        return files
+
+    if archive_format == 'tar.zst':
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        for member in archive.getmembers():
+            files[member.name] = archive.extractfile(member).read()
+    return files
+
+
+def export(client, payload, keep=True):
+    """调用 /api/export 并逐块读取响应"""
+    response = client.post('/api/export', json=payload, buffered=False)
+    chunks = []
+    for chunk in response.response:
+        if keep:
+            chunks.append(chunk)
+    response.close()
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='归档导出基准测试')
+    parser.add_argument('--vms', type=int, default=10000, help='虚拟机数量')
+    parser.add_argument('--formats', default='tar.gz,tar.zst,zip', help='归档格式，逗号分隔')
+    parser.add_argument('--max-seconds', type=float, default=30.0, help='单个格式的耗时上限，超过视为失败')
+    parser.add_argument('--memory', action='store_true', help='另外测量导出过程的峰值内存')
+    args = parser.parse_args()
+
+    app_module.app.config['BULK_MAX_ROWS'] = max(app_module.app.config['BULK_MAX_ROWS'], args.vms)
+    client = app_module.app.test_client()
+    base = dict(app_module.load_default_config('pve'), vmid='1000')
+    payload = {'config': base, 'count': args.vms, 'patterns': {'name': 'vm-{n:05d}'},
+               'outputs': ['pve', 'libvirt', 'script']}
+
+    failed = False
+    for archive_format in args.formats.split(','):
+        if archive_format == 'tar.zst' and zstandard is None:
+            print(f"{archive_format}: 未安装 zstandard，跳过")
+            continue
+
+        start = time.perf_counter()
+        chunks = export(client, dict(payload, format=archive_format))
+        elapsed = time.perf_counter() - start
+        data = b''.join(chunks)
+
+        files = read_archive(data, archive_format)
+        manifest = json.loads(files[MANIFEST_NAME])
+        valid = all(hashlib.sha256(files[entry['path']]).hexdigest() == entry['sha256']
+                    for entry in manifest['files'])
+
+        line = (f"{archive_format}: 虚拟机 {manifest['vms']}，文件 {len(manifest['files'])}，"
+                f"归档 {len(data) / 1024 / 1024:.1f}MB，耗时 {elapsed:.2f}s，"
+                f"最大块 {max(len(c) for c in chunks) / 1024:.0f}KB")
+        if args.memory:
+            # tracemalloc 会明显拖慢生成，单独再导出一次；输出块收到后即丢弃
+            tracemalloc.start()
+            export(client, dict(payload, format=archive_format), keep=False)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f"，峰值内存 {peak / 1024 / 1024:.1f}MB"
+        print(line + f"，校验和{'正确' if valid else '错误'}")
+
+        if not valid or manifest['vms'] != args.vms:
+            print('归档内容与预期不符')
+            failed = True
+        if elapsed > args.max_seconds:
+            print('导出耗时超过上限')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+配置历史基准测试
+一个配置连续自动保存 --saves 次（每次修改一个字段），另有 --configs 个配置各保存若干次，
+测量保存耗时、按版本号和时间点重建历史版本的耗时，并与从第一个版本开始完整重放增量比较；
+核对重建结果与当时保存的配置一致
+
+用法：
+    python benchmarks/bench_history.py [--saves 5000] [--configs 200] [--lookups 500]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('JOB_DB', ':memory:')
+os.environ.setdefault('UPLOAD_DB', ':memory:')
+os.environ.setdefault('HISTORY_DB', ':memory:')
+
+import app as app_module  # noqa: E402
+from services.history import ConfigHistory  # noqa: E402
+
+EDITS = [
+    ('memory', ['1024', '2048', '4096', '8192']),
+    ('cores', ['1', '2', '4', '8']),
+    ('name', [f"vm-{n:02d}" for n in range(50)]),
+    ('description', ['web', 'db', 'cache', 'build']),
+    ('net1', ['virtio,bridge=vmbr1', None]),
+]
+
+
+def full_replay(history, config_id, version):
+    """不使用快照，从第一个版本开始重放增量"""
+    rows = history._execute(
+        'SELECT key, value FROM history_deltas WHERE config_id = ? AND version <= ? ORDER BY version',
+        (config_id, version))
+    config = {}
+    for row in rows:
+        if row['value'] is None:
+            config.pop(row['key'], None)
+        else:
+            config[row['key']] = json.loads(row['value'])
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置历史基准测试')
+    parser.add_argument('--saves', type=int, default=5000, help='被测配置的保存次数')
+    parser.add_argument('--configs', type=int, default=200, help='其他配置的数量')
+    parser.add_argument('--lookups', type=int, default=500, help='重建历史版本的次数')
+    parser.add_argument('--snapshot-every', type=int, default=50, help='快照间隔版本数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    history = ConfigHistory(':memory:', snapshot_every=args.snapshot_every)
+    base = app_module.load_default_config('pve')
+
+    for n in range(args.configs):
+        config = dict(base, name=f"other-{n}")
+        for _ in range(20):
+            key, values = rng.choice(EDITS)
+            config[key] = rng.choice(values)
+            history.record(f"other-{n}", config)
+
+    # 被测配置：记录每个版本的配置和保存时间用于核对
+    config = dict(base)
+    expected = {}
+    start = time.perf_counter()
+    for _ in range(args.saves):
+        key, values = rng.choice(EDITS)
+        value = rng.choice(values)
+        if value is None:
+            config.pop(key, None)
+        else:
+            config[key] = value
+        saved = history.record('vm-100', config)
+        expected[saved['version']] = dict(config)
+    save_ms = (time.perf_counter() - start) / args.saves * 1000
+    versions = sorted(expected)
+    print(f"保存: {args.saves} 次，{len(versions)} 个版本，平均 {save_ms:.3f}ms")
+
+    failed = False
+    samples = [rng.choice(versions) for _ in range(args.lookups)]
+    for label, lookup in (('按版本号重建', lambda v: history.config_at('vm-100', version=v)['config']),
+                          ('完整重放', lambda v: full_replay(history, 'vm-100', v))):
+        start = time.perf_counter()
+        for version in samples:
+            result = lookup(version)
+            failed = failed or result != expected[version]
+        elapsed = (time.perf_counter() - start) / len(samples) * 1000
+        print(f"{label}: 平均 {elapsed:.3f}ms")
+
+    # 按时间点查找：每个版本的保存时间应取回该版本
+    saved_at = {item['version']: item['saved_at']
+                for offset in range(1, versions[-1] + 1, 1000)
+                for item in history.changes('vm-100', offset, 1000)}
+    start = time.perf_counter()
+    for version in samples:
+        result = history.config_at('vm-100', at=saved_at[version])
+        failed = failed or result['config'] != expected[result['version']]
+    elapsed = (time.perf_counter() - start) / len(samples) * 1000
+    print(f"按时间点重建: 平均 {elapsed:.3f}ms")
+
+    start = time.perf_counter()
+    pages = 0
+    offset = 1
+    while True:
+        page = history.changes('vm-100', offset, 100, key='memory')
+        if not page:
+            break
+        pages += 1
+        offset = page[-1]['version'] + 1
+    print(f"列出 memory 的全部变化: {pages} 页，{(time.perf_counter() - start) * 1000:.2f}ms")
+
+    if failed:
+        print('重建结果与保存的配置不一致')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+编辑器负载测试
+在子进程中启动应用，按编辑器的请求模式并发模拟多个用户：加载默认配置后反复修改字段，
+每次修改（输入停止500ms后）自动保存 /api/save-config，随后请求两种格式的 /api/preview（带 If-None-Match），
+偶尔导出 /generate 或上传 /import。按路由统计吞吐、延迟分位数和错误率。
+每个用户的操作序列由 --seed 决定，相同参数的多次运行发出相同的请求。
+--batch-users 同时运行批量用户，在编辑器用户结束前反复请求 /api/bulk，用于检查准入控制下批量任务
+对预览延迟的影响（可用 ADMISSION_ENABLED=0 启动对比）；429/503 按 Retry-After 等待后重试，单独统计为拒绝
+
+用法：
+    python benchmarks/bench_load.py [--users 20] [--edits 50] [--think 0.5] [--server wsgi|asgi]
+                                    [--batch-users 4] [--batch-count 200]
+                                    [--url http://127.0.0.1:34567] [--json results.json]
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 浏览器默认发送的 Accept-Encoding
+BROWSER_ENCODINGS = 'gzip, deflate, br, zstd'
+
+# 模拟修改的字段和取值，取值范围小，重复修改为相同的值时预览返回304
+EDITS = [
+    ('memory', ['1024', '2048', '4096', '8192']),
+    ('cores', ['1', '2', '4', '8']),
+    ('sockets', ['1', '2']),
+    ('name', [f"vm-{n:02d}" for n in range(20)]),
+    ('description', ['web', 'db', 'cache', 'build']),
+]
+
+# 准入控制拒绝请求的状态码，不计入错误
+REJECTED = (429, 503)
+
+SCRIPT_TARGETS = ['pve', 'libvirt']
+EXPORT_TYPES = ['script', 'pve', 'libvirt']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port):
+    """在子进程中启动应用，返回进程对象"""
+    env = dict(os.environ, JOB_DB=':memory:', UPLOAD_DB=':memory:', HISTORY_DB=':memory:',
+               UPLOAD_DIR=tempfile.mkdtemp(prefix='vmcg-load-'))
+    if kind == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--log-level', 'warning', '--no-access-log']
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(port)]
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def serve(port):
+    """--serve：以多线程WSGI服务器运行应用（不输出访问日志）"""
+    import logging
+    from werkzeug.serving import make_server
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def fetch_import_content(host, port):
+    """用默认配置生成 /import 上传的PVE配置文件（不计入统计）"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.request('GET', '/api/load-default?type=pve')
+    config = json.loads(conn.getresponse().read())['config']
+    conn.request('POST', '/generate', body=json.dumps({'config': config, 'output_type': 'pve'}),
+                 headers={'Content-Type': 'application/json'})
+    content = conn.getresponse().read().decode('utf-8')
+    conn.close()
+    return content
+
+
+def wait_ready(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/api/load-default?type=pve')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class EditorUser:
+    """
+    一个编辑器用户的请求序列
+
+    Args:
+        index (int): 用户序号
+        args: 命令行参数
+        host (str): 服务器地址
+        port (int): 服务器端口
+        import_content (str): /import 上传的配置文件内容
+    """
+
+    def __init__(self, index, args, host, port, import_content):
+        self.args = args
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.conn = http.client.HTTPConnection(host, port, timeout=args.timeout)
+        self.import_content = import_content
+        self.cookie = None
+        self.etags = {}
+        self.samples = []  # (路由, 状态码, 耗时秒)
+
+    def request(self, method, path, body=None, headers=None, route=None):
+        """发送请求并读完响应体，记录耗时；连接失败记为状态码0"""
+        headers = dict(headers or {})
+        headers['Accept-Encoding'] = self.args.accept_encoding
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        route = route or f"{method} {urllib.parse.urlsplit(path).path}"
+
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.samples.append((route, 0, time.perf_counter() - start))
+            return None, None, b''
+        self.samples.append((route, response.status, time.perf_counter() - start))
+
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, response, data
+
+    def post_json(self, path, payload, headers=None, route=None):
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        return self.request('POST', path, json.dumps(payload).encode('utf-8'), headers, route)
+
+    def run(self, deadline):
+        status, _, data = self.request('GET', '/api/load-default?type=pve')
+        if status != 200:
+            return
+        config = json.loads(data)['config']
+
+        for _ in range(self.args.edits):
+            if deadline and time.monotonic() >= deadline:
+                break
+            key, values = self.rng.choice(EDITS)
+            config[key] = self.rng.choice(values)
+            if self.args.think:
+                time.sleep(self.args.think)
+
+            # 自动保存，随后刷新两种格式的预览
+            self.post_json('/api/save-config', {'config': config, 'type': 'pve'})
+            for output_format in ('pve', 'libvirt'):
+                headers = {}
+                if output_format in self.etags:
+                    headers['If-None-Match'] = self.etags[output_format]
+                status, response, _ = self.post_json(
+                    '/api/preview', {'config': config, 'format': output_format, 'deterministic': True}, headers)
+                if status == 200:
+                    self.etags[output_format] = response.getheader('ETag')
+
+            roll = self.rng.random()
+            if roll < self.args.generate_ratio:
+                # 导出前先保存
+                self.post_json('/api/save-config', {'config': config, 'type': 'pve'})
+                self.post_json('/generate', {'config': config,
+                                             'output_type': self.rng.choice(EXPORT_TYPES),
+                                             'output_format': self.rng.choice(SCRIPT_TARGETS)})
+            elif roll < self.args.generate_ratio + self.args.import_ratio:
+                self.upload()
+        self.conn.close()
+
+    def upload(self):
+        """以 multipart/form-data 上传配置文件到 /import"""
+        boundary = f"----vmcg{self.rng.getrandbits(64):016x}"
+        body = (f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="type"\r\n\r\npve\r\n'
+                f"--{boundary}\r\n"
+                'Content-Disposition: form-data; name="file"; filename="vm.conf"\r\n'
+                'Content-Type: text/plain\r\n\r\n'
+                f"{self.import_content}\r\n"
+                f"--{boundary}--\r\n").encode('utf-8')
+        self.request('POST', '/import', body, {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+
+
+class BatchUser(EditorUser):
+    """反复提交批量生成请求，直到编辑器用户结束；被拒绝时按 Retry-After 等待"""
+
+    def run(self, stop):
+        status, _, data = self.request('GET', '/api/load-default?type=pve')
+        if status != 200:
+            return
+        config = json.loads(data)['config']
+
+        while not stop.is_set():
+            status, response, _ = self.post_json('/api/bulk', {
+                'config': config,
+                'count': self.args.batch_count,
+                'patterns': {'name': 'batch-{n}'},
+                'outputs': ['pve', 'libvirt', 'script'],
+            })
+            if status in REJECTED:
+                stop.wait(float(response.getheader('Retry-After') or 1))
+        self.conn.close()
+
+
+def percentile(sorted_values, fraction):
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def pad(text, width, right=False):
+    """按显示宽度（中文占两列）补齐"""
+    text = str(text)
+    fill = ' ' * max(0, width - sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text))
+    return fill + text if right else text + fill
+
+
+def summarize(samples, elapsed):
+    """按路由汇总：请求数、304数、拒绝数、错误数、吞吐和延迟分位数（毫秒）"""
+    routes = {}
+    for route, status, latency in samples:
+        routes.setdefault(route, []).append((status, latency))
+    routes['总计'] = [(status, latency) for _, status, latency in samples]
+
+    summary = {}
+    for route, items in routes.items():
+        latencies = sorted(latency * 1000 for _, latency in items)
+        errors = sum(1 for status, _ in items if status == 0 or (status >= 400 and status not in REJECTED))
+        summary[route] = {
+            'requests': len(items),
+            'not_modified': sum(1 for status, _ in items if status == 304),
+            'rejected': sum(1 for status, _ in items if status in REJECTED),
+            'errors': errors,
+            'error_rate': round(errors / len(items), 4),
+            'throughput': round(len(items) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编辑器负载测试')
+    parser.add_argument('--users', type=int, default=20, help='并发用户数')
+    parser.add_argument('--edits', type=int, default=50, help='每个用户的修改次数')
+    parser.add_argument('--duration', type=float, default=0, help='最长运行秒数，0为不限制')
+    parser.add_argument('--think', type=float, default=0.5, help='每次修改前的等待秒数（自动保存的防抖时间）')
+    parser.add_argument('--generate-ratio', type=float, default=0.05, help='每次修改后导出的概率')
+    parser.add_argument('--import-ratio', type=float, default=0.02, help='每次修改后导入的概率')
+    parser.add_argument('--batch-users', type=int, default=0, help='同时运行的批量用户数')
+    parser.add_argument('--batch-count', type=int, default=200, help='每个批量请求生成的虚拟机数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi', help='启动的服务器类型')
+    parser.add_argument('--url', help='测试已运行的服务器，不启动子进程')
+    parser.add_argument('--accept-encoding', default=BROWSER_ENCODINGS, help='请求头 Accept-Encoding')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单个请求的超时秒数')
+    parser.add_argument('--max-error-rate', type=float, default=0.0, help='总错误率超过该值时退出码为1')
+    parser.add_argument('--json', help='把汇总结果写入JSON文件')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return 0
+
+    server = None
+    if args.url:
+        parts = urllib.parse.urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        server = start_server(args.server, port)
+
+    try:
+        if not wait_ready(host, port):
+            print('服务器未就绪')
+            return 1
+
+        import_content = fetch_import_content(host, port)
+
+        users = [EditorUser(i, args, host, port, import_content) for i in range(args.users)]
+        deadline = time.monotonic() + args.duration if args.duration else None
+        threads = [threading.Thread(target=user.run, args=(deadline,)) for user in users]
+        stop = threading.Event()
+        batch_users = [BatchUser(args.users + i, args, host, port, import_content) for i in range(args.batch_users)]
+        batch_threads = [threading.Thread(target=user.run, args=(stop,)) for user in batch_users]
+        start = time.perf_counter()
+        for thread in batch_threads + threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in batch_threads:
+            thread.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    samples = [sample for user in users + batch_users for sample in user.samples]
+    summary = summarize(samples, elapsed)
+    print(f"服务器 {args.url or args.server}，用户 {args.users}，批量用户 {args.batch_users}，耗时 {elapsed:.1f}s")
+    columns = [('路由', 24), ('请求数', 8), ('304', 6), ('拒绝', 6), ('错误率', 8), ('吞吐/s', 9),
+               ('p50ms', 9), ('p95ms', 9), ('p99ms', 9), ('最大ms', 9)]
+    print(''.join(pad(name, width, i > 0) for i, (name, width) in enumerate(columns)))
+    for route, stats in summary.items():
+        values = [route, stats['requests'], stats['not_modified'], stats['rejected'], f"{stats['error_rate']:.2%}", stats['throughput'],
+                  stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['max_ms']]
+        print(''.join(pad(value, width, i > 0) for i, (value, (_, width)) in enumerate(zip(values, columns))))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k not in ('serve', 'port', 'json')},
+                       'elapsed': round(elapsed, 3), 'routes': summary}, f, ensure_ascii=False, indent=2)
+
+    if summary['总计']['error_rate'] > args.max_error_rate:
+        print('错误率超过上限')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
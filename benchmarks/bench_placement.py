@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+容量规划基准测试
+生成随机的虚拟机配置和宿主机清单，测量 CapacityPlanner.plan 的耗时
+
+用法：
+    python benchmarks/bench_placement.py [--vms 10000] [--hosts 500] [--max-seconds 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from converters.capacity import CapacityPlanner  # noqa: E402
+
+VM_SHAPES = [
+    # (memory, cores, sockets, 磁盘)
+    (1024, 1, 1, ['32G']),
+    (2048, 2, 1, ['32G']),
+    (4096, 2, 1, ['64G', '100G']),
+    (8192, 4, 1, ['128G']),
+    (16384, 8, 2, ['256G', '512G']),
+    (65536, 16, 2, ['1T']),
+]
+
+HOST_SHAPES = [
+    # (cpus, memory_mb, storage_gb)
+    (32, 131072, 4000),
+    (64, 262144, 8000),
+    (128, 524288, 16000),
+]
+
+
+def build_configs(count, rng):
+    configs = []
+    for i in range(count):
+        memory, cores, sockets, disks = rng.choice(VM_SHAPES)
+        config = {'vmid': 100 + i, 'name': f'vm-{i:05d}', 'memory': memory,
+                  'cores': cores, 'sockets': sockets}
+        if rng.random() < 0.3:
+            config['balloon'] = memory // 2
+        for n, size in enumerate(disks):
+            config[f'scsi{n}'] = f'local-lvm:vm-{100 + i}-disk-{n},size={size}'
+        config['ide2'] = 'none,media=cdrom'
+        configs.append(config)
+    return configs
+
+
+def build_hosts(count, rng):
+    hosts = []
+    for i in range(count):
+        cpus, memory, storage = rng.choice(HOST_SHAPES)
+        hosts.append({'name': f'pve{i:03d}', 'cpus': cpus, 'memory_mb': memory,
+                      'storage_gb': storage, 'reserved_memory_mb': 4096})
+    return hosts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CapacityPlanner 装箱基准测试')
+    parser.add_argument('--vms', type=int, default=10000, help='虚拟机数量')
+    parser.add_argument('--hosts', type=int, default=500, help='宿主机数量')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='耗时上限，超过视为失败')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    configs = build_configs(args.vms, rng)
+    planner = CapacityPlanner(build_hosts(args.hosts, rng), {'cpu': 4.0, 'memory': 1.2})
+
+    start = time.perf_counter()
+    result = planner.plan(configs)
+    elapsed = time.perf_counter() - start
+
+    summary = result['summary']
+    print(f"虚拟机 {summary['vms']}，宿主机 {args.hosts}，耗时 {elapsed:.3f}s")
+    print(f"已分配 {summary['placed']}，未分配 {summary['unplaced']}，使用宿主机 {summary['hosts_used']}")
+
+    if elapsed > args.max_seconds:
+        print('装箱耗时超过上限')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
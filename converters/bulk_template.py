@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+批量模板
+由一个基础配置和参数表（CSV或JSON）批量生成虚拟机配置，参数可使用 vm-{i:03d} 这样的模板。
+基础配置只生成一次：原样写入输出的字段（vmid、名称、网卡MAC、磁盘卷名）用占位符代替，每行只替换占位符；
+其它被覆盖的字段（如 machine、scsihw、numa）会改变生成函数的分支，固定为第一行的值，取值不同的行、
+无法安全替换的行或输出格式退回为逐行完整生成。
+每台虚拟机必须不同的字段（名称、smbios1的uuid、vmgenid、网卡MAC、磁盘卷名）未被覆盖时由本行的 vmid 和名称派生
+"""
+
+import csv
+import io
+import re
+import uuid
+from string import Formatter
+
+from converters.pve_parser import NET_KEY_RE
+
+# 占位符类别由第一行的值决定，其余行的值符合该类别时才能直接替换（整数也符合 word）
+SLOT_CLASSES = (
+    ('int', re.compile(r'^(0|[1-9][0-9]{0,8})$')),
+    ('mac', re.compile(r'^[0-9A-Fa-f]{2}(:[0-9A-Fa-f]{2}){5}$')),
+    ('word', re.compile(r'^[A-Za-z0-9_.-]+$')),
+)
+
+SLOT_PATTERNS = dict(SLOT_CLASSES)
+
+# 值原样写入输出、不影响其它内容的配置键
+VERBATIM_KEYS = ('vmid', 'name', 'vmgenid')
+
+# 卷名在存储名之后的磁盘键
+VOLUME_KEY_RE = re.compile(r'^(scsi|virtio|sata|ide|efidisk|tpmstate)[0-9]+$')
+
+# 确定性输出和批量生成时由 vmid/名称 派生UUID的命名空间
+UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'urn:vm-config-generator')
+
+# 派生值在模板中的变量名，网卡MAC为 _mac_ 加网卡键名（如 _mac_net0）
+DERIVED_VMID = '_vmid'
+DERIVED_UUID = '_uuid'
+DERIVED_VMGENID = '_vmgenid'
+DERIVED_MAC = '_mac_'
+
+UUID_RE = re.compile(r'^[0-9A-Fa-f]{8}(-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12}$')
+
+
+class BulkTemplateError(ValueError):
+    """参数表或模板无效"""
+
+
+def parse_rows(table):
+    """
+    解析参数表
+
+    Args:
+        table (str|list): CSV文本（第一行为列名）或JSON对象列表
+
+    Returns:
+        list: 每行一个字典，值为字符串
+    """
+    if isinstance(table, str):
+        reader = csv.DictReader(io.StringIO(table.strip()))
+        return [{k.strip(): (v or '').strip() for k, v in row.items() if k} for row in reader]
+    if isinstance(table, list):
+        rows = []
+        for index, row in enumerate(table):
+            if not isinstance(row, dict):
+                raise BulkTemplateError(f"参数表第{index + 1}行必须是对象")
+            rows.append({str(k): '' if v is None else str(v) for k, v in row.items()})
+        return rows
+    raise BulkTemplateError('参数表必须是CSV文本或对象列表')
+
+
+def _slot_class(value):
+    for name, pattern in SLOT_CLASSES:
+        if pattern.match(value):
+            return name
+    return None
+
+
+def _sentinel(slot_class, slot, variant):
+    """生成占位符；两组占位符（variant 0/1）用于检查生成函数是否原样输出被覆盖的值"""
+    if slot_class == 'int':
+        return str(900000000 + slot * 10 + variant)
+    if slot_class == 'mac':
+        # 同时包含大小写字母，生成函数改变大小写时能被检查出来
+        return f"0a:Bc:{variant:02d}:{slot >> 16 & 255:02x}:{slot >> 8 & 255:02x}:{slot & 255:02x}"
+    return f"bLk{slot}x{variant}Q"
+
+
+def _escape(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def derived_mac(vmid, net_index):
+    """
+    由 vmid 和网卡序号派生的MAC地址：本地管理的单播地址 02:序号:vmid的4个字节，vmid不同的虚拟机不会重复；
+    vmid 不是整数时取其UUID的前4个字节
+    """
+    if str(vmid).isdigit() and int(vmid) < 2 ** 32:
+        tail = int(vmid).to_bytes(4, 'big')
+    else:
+        tail = uuid.uuid5(UUID_NAMESPACE, str(vmid)).bytes[:4]
+    return ':'.join(f"{b:02X}" for b in bytes([0x02, net_index & 255]) + tail)
+
+
+class BulkTemplate:
+    """
+    批量模板
+
+    Args:
+        base (dict): 基础配置
+        rows (list): parse_rows 解析得到的参数表；为None时按 count 生成空行
+        patterns (dict): 配置键到模板的映射，模板可引用内置变量和参数表的列
+        count (int): 没有参数表时生成的虚拟机数量
+        max_rows (int): 允许的最大行数
+
+    参数表中被模板引用的列只作为变量；其余列直接覆盖同名配置键（值中也可以使用模板）。
+    未覆盖 vmid 时按基础 vmid 依次递增
+    """
+
+    def __init__(self, base, rows=None, patterns=None, count=None, max_rows=10000):
+        if not isinstance(base, dict):
+            raise BulkTemplateError('基础配置必须是对象')
+        if rows is None:
+            try:
+                count = int(count or 0)
+            except (TypeError, ValueError):
+                raise BulkTemplateError('数量必须是整数')
+            rows = [{} for _ in range(count)]
+        if not rows:
+            raise BulkTemplateError('参数表不能为空')
+        if len(rows) > max_rows:
+            raise BulkTemplateError(f"行数超过上限 {max_rows}")
+
+        self.base = base
+        self.rows = rows
+        try:
+            self.base_vmid = int(base.get('vmid', 100))
+        except (TypeError, ValueError):
+            self.base_vmid = 100
+
+        patterns = dict(patterns or {})
+        referenced = set()
+        for pattern in patterns.values():
+            referenced.update(self._fields(pattern))
+
+        # 未被模板引用的列直接覆盖配置键
+        columns = []
+        for row in rows:
+            for column in row:
+                if column not in referenced and column not in patterns and column not in columns:
+                    columns.append(column)
+        self.columns = columns
+        for column in columns:
+            patterns[column] = '{' + column + '}'
+        if 'vmid' not in patterns:
+            patterns['vmid'] = '{vmid}'
+        self.derived_fields = self._derive_patterns(patterns)
+        self.patterns = patterns
+
+        # 模板拆分为字面量和占位符，每个 {字段:格式} 是一个占位符
+        self.slots = []
+        self.templates = {}
+        for key, pattern in patterns.items():
+            pieces = []
+            for literal, field, spec, conversion in Formatter().parse(str(pattern)):
+                if literal:
+                    pieces.append(literal)
+                if field is not None:
+                    pieces.append(len(self.slots))
+                    self.slots.append((field, spec or '', conversion))
+            self.templates[key] = pieces
+
+        self.override_keys = list(patterns)
+
+    def _derive_patterns(self, patterns):
+        """
+        基础配置中每台虚拟机必须不同、又没有被覆盖的字段改为派生模板，否则所有虚拟机的UUID、MAC和磁盘卷相同：
+        名称追加 -vmid；smbios1 的uuid和 vmgenid 为 vmid/名称 的uuid5；网卡MAC见 derived_mac；
+        磁盘卷名 vm-<基础vmid>-disk-N 改为本行的 vmid
+
+        Returns:
+            set: 模板中用到的派生变量名
+        """
+        derived = set()
+        for key, value in self.base.items():
+            if key in patterns or not isinstance(value, str) or not value:
+                continue
+            text = _escape(value)
+            if key == 'name':
+                patterns[key] = text + '-{' + DERIVED_VMID + '}'
+            elif key == 'smbios1':
+                text, count = re.subn(r'((?:^|,)uuid=)[^,]*', r'\g<1>{' + DERIVED_UUID + '}', text)
+                if count:
+                    patterns[key] = text
+            elif key == 'vmgenid':
+                # vmgenid 为 1 时由PVE生成
+                if UUID_RE.match(value):
+                    patterns[key] = '{' + DERIVED_VMGENID + '}'
+            elif NET_KEY_RE.match(key):
+                head, sep, rest = value.partition(',')
+                model, _, mac = head.partition('=')
+                if SLOT_PATTERNS['mac'].match(mac):
+                    patterns[key] = f"{_escape(model)}={{{DERIVED_MAC}{key}}}{sep}{_escape(rest)}"
+            elif VOLUME_KEY_RE.match(key):
+                text, count = re.subn(rf'^([^,:]+:)vm-{self.base_vmid}-', r'\g<1>vm-{' + DERIVED_VMID + '}-', text)
+                if count:
+                    patterns[key] = text
+        # 用户模板中也可以引用派生变量
+        for pattern in patterns.values():
+            derived.update(field for field in self._fields(pattern)
+                           if field in (DERIVED_VMID, DERIVED_UUID, DERIVED_VMGENID) or field.startswith(DERIVED_MAC))
+        return derived
+
+    @staticmethod
+    def _fields(pattern):
+        fields = set()
+        try:
+            for _, field, _, _ in Formatter().parse(str(pattern)):
+                if field is not None:
+                    fields.add(field)
+        except ValueError as e:
+            raise BulkTemplateError(f"模板格式错误: {pattern}: {e}")
+        return fields
+
+    def _variables(self, index, row):
+        # 内置变量：i（从0开始的序号）、n（从1开始的序号）、vmid（参数表中的vmid或基础vmid + i）
+        variables = dict(row)
+        variables['i'] = index
+        variables['n'] = index + 1
+        vmid = row.get('vmid', '')
+        variables['vmid'] = int(vmid) if str(vmid).isdigit() else self.base_vmid + index
+
+        # 某行缺少的覆盖列保留基础配置中的值
+        for column in self.columns:
+            if column not in row:
+                variables[column] = '' if self.base.get(column) is None else str(self.base[column])
+
+        # 单元格中也可以使用模板，如 name 列写 web-{n}
+        for column, value in row.items():
+            if '{' in value:
+                variables[column] = self._format(index, value, variables)
+        return variables
+
+    def _format(self, index, text, variables):
+        try:
+            return text.format(**variables) if '{' in text else text
+        except (KeyError, IndexError, ValueError) as e:
+            raise BulkTemplateError(f"第{index + 1}行模板错误: {text}: {e}")
+
+    def slot_values(self, index):
+        """计算第 index 行每个占位符的值"""
+        variables = self._variables(index, self.rows[index])
+        values = [None] * len(self.slots)
+        self._fill(index, values, variables, lambda field: field not in self.derived_fields)
+        if self.derived_fields:
+            # 派生值取决于本行最终的 vmid 和名称，名称中可以引用 _vmid
+            variables[DERIVED_VMID] = self._text('vmid', values)
+            self._fill(index, values, variables, lambda field: field == DERIVED_VMID)
+            name = self._text('name', values) if 'name' in self.templates else str(self.base.get('name') or '')
+            variables.update(self._derived_values(variables[DERIVED_VMID], name))
+            self._fill(index, values, variables, lambda field: field in self.derived_fields)
+        return values
+
+    def _fill(self, index, values, variables, selected):
+        for slot, (field, spec, conversion) in enumerate(self.slots):
+            if not selected(field):
+                continue
+            if field not in variables:
+                raise BulkTemplateError(f"第{index + 1}行缺少变量: {field}")
+            value = variables[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            try:
+                values[slot] = format(value, spec)
+            except ValueError:
+                # CSV中的数字是字符串，{x:03d} 需要整数
+                try:
+                    values[slot] = format(int(value), spec)
+                except (TypeError, ValueError) as e:
+                    raise BulkTemplateError(f"第{index + 1}行变量 {field} 格式错误: {e}")
+
+    def _text(self, key, values):
+        return ''.join(p if isinstance(p, str) else values[p] or '' for p in self.templates[key])
+
+    def _derived_values(self, vmid, name):
+        seed = f"{vmid}/{name}"
+        derived = {}
+        for field in self.derived_fields:
+            if field == DERIVED_UUID:
+                derived[field] = str(uuid.uuid5(UUID_NAMESPACE, seed))
+            elif field == DERIVED_VMGENID:
+                derived[field] = str(uuid.uuid5(UUID_NAMESPACE, seed + '/vmgenid'))
+            elif field.startswith(DERIVED_MAC):
+                match = NET_KEY_RE.match(field[len(DERIVED_MAC):])
+                derived[field] = derived_mac(vmid, int(match.group(1)) if match else 0)
+        return derived
+
+    def _build(self, slot_values):
+        config = dict(self.base)
+        for key, pieces in self.templates.items():
+            config[key] = ''.join(p if isinstance(p, str) else slot_values[p] for p in pieces)
+        return config
+
+    def instance(self, index):
+        """生成第 index 行的完整配置"""
+        return self._build(self.slot_values(index))
+
+    def _verbatim_slots(self, slot_values):
+        """
+        每个占位符的值是否原样写入输出：vmid、name、vmgenid，smbios1的uuid，网卡的MAC（virtio=MAC,...）
+        和磁盘的卷名（存储:卷名,...）。
+        其它位置的值可能决定生成函数的分支（如 machine 为 q35 时使用SATA），用占位符生成无法检查出来
+        """
+        verbatim = [False] * len(self.slots)
+        for key, pieces in self.templates.items():
+            text = ''
+            for piece in pieces:
+                if isinstance(piece, str):
+                    text += piece
+                    continue
+                if key in VERBATIM_KEYS:
+                    verbatim[piece] = True
+                elif NET_KEY_RE.match(key):
+                    verbatim[piece] = '=' in text and ',' not in text
+                elif VOLUME_KEY_RE.match(key):
+                    verbatim[piece] = ':' in text and ',' not in text
+                elif key == 'smbios1':
+                    verbatim[piece] = bool(re.search(r'(^|,)uuid=$', text))
+                text += slot_values[piece]
+        return verbatim
+
+    def render(self, renderers, validator=None):
+        """
+        一次遍历生成所有行的输出
+
+        Args:
+            renderers (dict): 输出类型到生成函数的映射，生成函数接收配置字典返回字符串
+            validator (ConfigValidator): 可选，基础配置只校验一次，每行只校验被覆盖的字段
+
+        Yields:
+            dict: index、vmid、name、outputs（输出类型 -> 内容），该行校验或生成失败时为 errors
+        """
+        if validator is not None:
+            base_errors = validator.validate({k: v for k, v in self.base.items()
+                                              if k not in self.override_keys})
+            if base_errors:
+                raise BulkTemplateError('基础配置校验失败: ' + '; '.join(
+                    f"{e['key']}: {e['message']}" for e in base_errors))
+
+        first_values = self.slot_values(0)
+        first_config = self._build(first_values)
+        # 只有原样写入输出的占位符逐行替换（类别为None的占位符固定为第一行的值）
+        slot_classes = [_slot_class(value) if verbatim else None
+                        for value, verbatim in zip(first_values, self._verbatim_slots(first_values))]
+        compiled = self._compile(renderers, slot_classes, first_values)
+        self.stats = {'template_outputs': sorted(compiled), 'templated_rows': 0, 'rendered_rows': 0}
+
+        for index in range(len(self.rows)):
+            if index == 0:
+                values, config = first_values, first_config
+            else:
+                try:
+                    values = self.slot_values(index)
+                except BulkTemplateError as e:
+                    yield {'index': index, 'vmid': None, 'name': None,
+                           'errors': [{'key': '', 'message': str(e)}]}
+                    continue
+                config = self._build(values)
+
+            if validator is not None:
+                errors = validator.validate({k: config.get(k) for k in self.override_keys})
+                if errors:
+                    yield {'index': index, 'vmid': config.get('vmid'), 'name': config.get('name'),
+                           'errors': errors}
+                    continue
+
+            # 替换的占位符都符合第一行确定的类别、其余占位符与第一行相同时直接替换，否则完整生成
+            substitutable = all(SLOT_PATTERNS[cls].match(value) if cls is not None else value == first
+                                for value, first, cls in zip(values, first_values, slot_classes))
+            outputs = {}
+            try:
+                for output_type, renderer in renderers.items():
+                    template = compiled.get(output_type)
+                    if template is not None and substitutable:
+                        pattern, rendered, lookup = template
+                        outputs[output_type] = pattern.sub(lambda m: values[lookup[m.group(0)]], rendered)
+                    else:
+                        outputs[output_type] = renderer(config)
+            except Exception as e:
+                yield {'index': index, 'vmid': config.get('vmid'), 'name': config.get('name'),
+                       'errors': [{'key': '', 'message': f"生成 {output_type} 失败: {e}"}]}
+                continue
+
+            if substitutable and compiled:
+                self.stats['templated_rows'] += 1
+            else:
+                self.stats['rendered_rows'] += 1
+            yield {'index': index, 'vmid': config.get('vmid'), 'name': config.get('name'),
+                   'outputs': outputs}
+
+    def _compile(self, renderers, slot_classes, first_values):
+        """
+        用两组占位符各生成一次，生成结果只相差占位符时该输出可以逐行替换
+
+        Args:
+            slot_classes (list): 每个占位符的类别，为None的占位符不替换，取第一行的值
+            first_values (list): 第一行每个占位符的值
+
+        Returns:
+            dict: 输出类型 -> (占位符正则, 生成结果, 占位符到序号的映射)
+        """
+        if all(cls is None for cls in slot_classes):
+            return {}
+
+        sentinels = [[_sentinel(cls, slot, variant) if cls is not None else first_values[slot]
+                      for slot, cls in enumerate(slot_classes)]
+                     for variant in (0, 1)]
+        configs = [self._build(values) for values in sentinels]
+
+        compiled = {}
+        for output_type, renderer in renderers.items():
+            try:
+                first = renderer(configs[0])
+                second = renderer(configs[1])
+            except Exception:
+                continue
+
+            lookup = {sentinels[0][slot]: slot for slot, cls in enumerate(slot_classes) if cls is not None}
+            pattern = re.compile('|'.join(re.escape(s) for s in sorted(lookup, key=len, reverse=True)))
+            swapped = pattern.sub(lambda m: sentinels[1][lookup[m.group(0)]], first)
+            if swapped == second:
+                compiled[output_type] = (pattern, first, lookup)
+        return compiled
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+宿主机容量规划
+按内存、vCPU、磁盘三个维度把一批虚拟机配置装箱到宿主机上（首次适应递减），
+支持CPU、内存、磁盘超分比
+"""
+
+import json
+
+from converters.pve_parser import collect_disk_keys, parse_disk_config, vcpu_count
+
+# 磁盘大小单位到GB的换算，不带单位时按GB计算
+SIZE_UNITS_GB = {'K': 1 / (1024 * 1024), 'M': 1 / 1024, 'G': 1, 'T': 1024}
+
+DEFAULT_OVERCOMMIT = {'cpu': 1.0, 'memory': 1.0, 'disk': 1.0}
+
+DIMENSIONS = ('memory', 'cpu', 'disk')
+
+# 浮点累加误差容限
+EPSILON = 1e-9
+
+
+class PlacementError(ValueError):
+    """宿主机清单无效"""
+
+
+def parse_size_gb(size):
+    """
+    解析PVE磁盘大小，如 "32G"、"512M"、"1T"
+
+    Returns:
+        float: GB数，无法解析时为0
+    """
+    size = str(size or '').strip().upper()
+    if not size:
+        return 0.0
+    unit = size[-1]
+    if unit in SIZE_UNITS_GB:
+        size = size[:-1]
+    else:
+        unit = 'G'
+    try:
+        return float(size) * SIZE_UNITS_GB[unit]
+    except ValueError:
+        return 0.0
+
+
+def vm_demand(config_data):
+    """
+    计算虚拟机对 (内存MB, vCPU, 磁盘GB) 的需求
+
+    启用Balloon（0 < balloon < memory）时按Balloon下限计算内存；
+    磁盘为所有非光驱磁盘的 size= 之和
+    """
+    try:
+        memory = int(config_data.get('memory', 0) or 0)
+        balloon = int(config_data.get('balloon', 0) or 0)
+    except (TypeError, ValueError):
+        memory, balloon = 0, 0
+    if 0 < balloon < memory:
+        memory = balloon
+
+    disk = 0.0
+    for key, _, _ in collect_disk_keys(config_data):
+        options = parse_disk_config(config_data[key])
+        if options.get('media') != 'cdrom':
+            disk += parse_size_gb(options.get('size'))
+    return (float(memory), float(vcpu_count(config_data)), disk)
+
+
+class _FirstFitTree:
+    """
+    按宿主机顺序查找第一台剩余容量足够的宿主机
+
+    线段树的每个节点保存子树中每个维度剩余容量的最大值，任一维度最大值不足的子树整体跳过，
+    查找和更新都只访问少量节点
+    """
+
+    def __init__(self, remaining):
+        size = 1
+        while size < len(remaining):
+            size *= 2
+        self.size = size
+        self.tree = [[-1.0] * (2 * size) for _ in DIMENSIONS]
+        for dim in range(len(DIMENSIONS)):
+            column = self.tree[dim]
+            for i, values in enumerate(remaining):
+                column[size + i] = values[dim]
+            for node in range(size - 1, 0, -1):
+                column[node] = max(column[2 * node], column[2 * node + 1])
+
+    def _fits(self, node, demand):
+        for dim, value in enumerate(demand):
+            if self.tree[dim][node] < value - EPSILON:
+                return False
+        return True
+
+    def find(self, demand):
+        """返回第一台能容纳需求的宿主机序号，没有时返回-1"""
+        if not self._fits(1, demand):
+            return -1
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if not self._fits(node, demand):
+                continue
+            if node >= self.size:
+                return node - self.size
+            # 先压右子树，保证左子树（序号更小的宿主机）先被检查
+            stack.append(2 * node + 1)
+            stack.append(2 * node)
+        return -1
+
+    def consume(self, index, demand):
+        """扣减宿主机剩余容量"""
+        for dim, value in enumerate(demand):
+            column = self.tree[dim]
+            node = self.size + index
+            column[node] -= value
+            node //= 2
+            while node:
+                column[node] = max(column[2 * node], column[2 * node + 1])
+                node //= 2
+
+
+class CapacityPlanner:
+    """
+    宿主机容量规划器
+
+    Args:
+        hosts (list): 宿主机清单，每项包含 name、cpus、memory_mb、storage_gb，
+            可选 reserved_memory_mb 和单台宿主机的 overcommit
+        overcommit (dict): 全局超分比，键为 cpu、memory、disk
+    """
+
+    def __init__(self, hosts, overcommit=None):
+        if not isinstance(hosts, list) or not hosts:
+            raise PlacementError('宿主机清单不能为空')
+
+        ratios = dict(DEFAULT_OVERCOMMIT)
+        ratios.update(_parse_ratios(overcommit))
+        self.overcommit = ratios
+
+        self.hosts = []
+        names = set()
+        for index, host in enumerate(hosts):
+            if not isinstance(host, dict):
+                raise PlacementError(f"第{index + 1}台宿主机必须是对象")
+            name = str(host.get('name') or f"host{index}")
+            if name in names:
+                raise PlacementError(f"宿主机名称重复: {name}")
+            names.add(name)
+
+            host_ratios = dict(ratios)
+            host_ratios.update(_parse_ratios(host.get('overcommit')))
+            try:
+                physical = {
+                    'memory': float(host.get('memory_mb', 0)) - float(host.get('reserved_memory_mb', 0)),
+                    'cpu': float(host.get('cpus', 0)),
+                    'disk': float(host.get('storage_gb', 0)),
+                }
+            except (TypeError, ValueError):
+                raise PlacementError(f"宿主机 {name} 的容量必须是数字")
+
+            self.hosts.append({
+                'name': name,
+                'capacity': {dim: max(0.0, physical[dim] * host_ratios[dim]) for dim in DIMENSIONS},
+            })
+
+    @classmethod
+    def from_inventory(cls, inventory, overcommit=None):
+        """
+        从宿主机清单JSON创建：{"hosts": [...], "overcommit": {...}} 或宿主机列表；
+        参数 overcommit 覆盖清单中的全局超分比
+        """
+        if isinstance(inventory, str):
+            try:
+                inventory = json.loads(inventory)
+            except ValueError as e:
+                raise PlacementError(f"宿主机清单不是有效的JSON: {e}")
+
+        if isinstance(inventory, dict):
+            ratios, hosts = inventory.get('overcommit') or {}, inventory.get('hosts')
+        else:
+            ratios, hosts = {}, inventory
+        # 合并前先检查类型，其余检查见 _parse_ratios
+        if not isinstance(ratios, dict) or not isinstance(overcommit or {}, dict):
+            raise PlacementError('超分比必须是对象')
+        return cls(hosts, dict(ratios, **(overcommit or {})))
+
+    @classmethod
+    def load(cls, path, overcommit=None):
+        """从JSON文件加载宿主机清单"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_inventory(f.read(), overcommit)
+
+    def plan(self, configs):
+        """
+        计算分配方案：按需求占宿主机最大容量的比例（主导份额）从大到小排序，
+        依次放到第一台剩余容量足够的宿主机上
+
+        Args:
+            configs (list): 配置字典列表
+
+        Returns:
+            dict: assignments（按输入顺序，host 为None表示未分配）、hosts（每台宿主机的
+                容量、已分配量、利用率和虚拟机序号）、unplaced、summary
+        """
+        demands = [vm_demand(config_data) for config_data in configs]
+
+        largest = [max(host['capacity'][dim] for host in self.hosts) for dim in DIMENSIONS]
+        scale = [value if value > 0 else 1.0 for value in largest]
+
+        def dominant_share(index):
+            return max(value / scale[dim] for dim, value in enumerate(demands[index]))
+
+        order = sorted(range(len(configs)), key=dominant_share, reverse=True)
+
+        remaining = [tuple(host['capacity'][dim] for dim in DIMENSIONS) for host in self.hosts]
+        tree = _FirstFitTree(remaining)
+        placement = [None] * len(configs)
+        host_vms = [[] for _ in self.hosts]
+        allocated = [[0.0] * len(DIMENSIONS) for _ in self.hosts]
+
+        for index in order:
+            demand = demands[index]
+            host_index = tree.find(demand)
+            if host_index < 0:
+                continue
+            tree.consume(host_index, demand)
+            placement[index] = host_index
+            host_vms[host_index].append(index)
+            for dim, value in enumerate(demand):
+                allocated[host_index][dim] += value
+
+        assignments = []
+        unplaced = []
+        for index, config_data in enumerate(configs):
+            host_index = placement[index]
+            entry = {
+                'index': index,
+                'vmid': config_data.get('vmid'),
+                'name': config_data.get('name'),
+                'host': self.hosts[host_index]['name'] if host_index is not None else None,
+            }
+            assignments.append(entry)
+            if host_index is None:
+                unplaced.append(dict(entry, reason=self._unplaced_reason(demands[index], largest)))
+
+        hosts = []
+        for host_index, host in enumerate(self.hosts):
+            capacity = host['capacity']
+            used = dict(zip(DIMENSIONS, allocated[host_index]))
+            hosts.append({
+                'name': host['name'],
+                'vm_indices': sorted(host_vms[host_index]),
+                'capacity': capacity,
+                'allocated': used,
+                'utilization': {dim: round(used[dim] / capacity[dim], 4) if capacity[dim] else 0.0
+                                for dim in DIMENSIONS},
+            })
+
+        return {
+            'assignments': assignments,
+            'hosts': hosts,
+            'unplaced': unplaced,
+            'summary': {
+                'vms': len(configs),
+                'placed': len(configs) - len(unplaced),
+                'unplaced': len(unplaced),
+                'hosts_used': sum(1 for vms in host_vms if vms),
+                'overcommit': self.overcommit,
+            },
+        }
+
+    @staticmethod
+    def _unplaced_reason(demand, largest):
+        labels = {'memory': '内存', 'cpu': 'vCPU', 'disk': '磁盘'}
+        too_large = [labels[dim] for dim, value in zip(DIMENSIONS, demand)
+                     if value > largest[DIMENSIONS.index(dim)] + EPSILON]
+        if too_large:
+            return f"超过单台宿主机最大容量: {'、'.join(too_large)}"
+        return '宿主机剩余容量不足'
+
+
+def _parse_ratios(overcommit):
+    if not overcommit:
+        return {}
+    if not isinstance(overcommit, dict):
+        raise PlacementError('超分比必须是对象')
+
+    ratios = {}
+    for dim, value in overcommit.items():
+        if dim not in DEFAULT_OVERCOMMIT:
+            raise PlacementError(f"不支持的超分维度: {dim}")
+        try:
+            ratio = float(value)
+        except (TypeError, ValueError):
+            raise PlacementError(f"超分比必须是数字: {dim}")
+        if ratio <= 0:
+            raise PlacementError(f"超分比必须大于0: {dim}")
+        ratios[dim] = ratio
+    return ratios
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+克隆部署
+从模板或基础镜像克隆虚拟机，代替创建并填充空磁盘：PVE使用 qm clone（链接克隆或完整克隆），
+Libvirt使用以基础镜像为后备文件的qcow2覆盖层（<backingStore>），链接克隆只写入与基础镜像不同的数据
+"""
+
+import re
+import shlex
+
+CLONE_MODES = ('linked', 'full')
+
+# 克隆得到的磁盘卷名由宿主机分配，比较配置时去掉卷名，只比较之后的参数（光驱除外）
+CLONE_DISK_RE = r'^((?:scsi|virtio|sata|ide)[0-9]+): [^,]*,?'
+CLONE_DISK_SED = r'/media=cdrom/!s/^((scsi|virtio|sata|ide)[0-9]+): [^,]*,?/\1: /'
+
+
+class CloneError(ValueError):
+    """克隆参数无效"""
+
+
+def clone_settings(config_data):
+    """
+    读取克隆参数
+
+    Args:
+        config_data (dict): 配置字典
+
+    Returns:
+        dict: source、mode、storage；未设置 clone_source 时返回None
+
+    Raises:
+        CloneError: 克隆方式无效，或链接克隆指定了目标存储
+    """
+    source = str(config_data.get('clone_source', '') or '').strip()
+    if not source:
+        return None
+
+    mode = str(config_data.get('clone_mode', '') or 'linked')
+    if mode not in CLONE_MODES:
+        raise CloneError(f"克隆方式必须是 {', '.join(CLONE_MODES)} 之一")
+    storage = str(config_data.get('clone_storage', '') or '').strip()
+    # 链接克隆必须与模板位于同一存储
+    if storage and mode != 'full':
+        raise CloneError('只有完整克隆可以指定目标存储')
+    return {'source': source, 'mode': mode, 'storage': storage}
+
+
+def pve_clone(config_data):
+    """clone_source 为模板虚拟机ID时返回克隆参数，否则返回None"""
+    settings = clone_settings(config_data)
+    if settings and settings['source'].isdigit():
+        return settings
+    return None
+
+
+def libvirt_clone(config_data):
+    """clone_source 为基础镜像的绝对路径时返回克隆参数，否则返回None"""
+    settings = clone_settings(config_data)
+    if settings and settings['source'].startswith('/'):
+        return settings
+    return None
+
+
+def pve_clone_command(config_data, settings):
+    """生成 qm clone 命令"""
+    args = ['qm', 'clone', settings['source'], str(config_data.get('vmid', '100')),
+            '--name', str(config_data.get('name', 'vm-default')),
+            '--full', '1' if settings['mode'] == 'full' else '0']
+    if settings['storage']:
+        args += ['--storage', settings['storage']]
+    return ' '.join(shlex.quote(arg) for arg in args)
+
+
+def normalize_clone_lines(lines):
+    """去掉磁盘参数中的卷名并重新排序，与脚本中 sed -E CLONE_DISK_SED | LC_ALL=C sort 的结果一致"""
+    disk_re = re.compile(CLONE_DISK_RE)
+    normalized = [line if 'media=cdrom' in line else disk_re.sub(r'\1: ', line) for line in lines]
+    return sorted(normalized, key=lambda line: line.encode('utf-8'))
+
+
+def render_pve_clone_functions(config_data, settings):
+    """
+    生成PVE克隆部署的Bash函数
+
+    依赖脚本中已定义的 VMID、CONFIG_FILE 以及 desired_config、current_config 函数
+
+    Args:
+        config_data (dict): 配置字典
+        settings (dict): pve_clone 返回的克隆参数
+
+    Returns:
+        str: Bash代码
+    """
+    mode_label = '完整克隆' if settings['mode'] == 'full' else '链接克隆'
+    return f'''# 从模板 {settings['source']} {mode_label}，已存在的同ID虚拟机先删除
+clone_vm() {{
+    if [ -f "$CONFIG_FILE" ]; then
+        log_info "删除现有虚拟机 $VMID"
+        run qm destroy "$VMID" || log_error "删除现有虚拟机失败"
+    fi
+    log_info "从模板 {settings['source']} 克隆虚拟机 $VMID（{mode_label}）"
+    run {pve_clone_command(config_data, settings)} || log_error "克隆虚拟机失败"
+}}
+
+# 让虚拟机与目标配置一致：已有磁盘沿用克隆出的卷，只扩容和修改参数（只扩不缩），
+# 模板中没有的磁盘按目标大小新建卷；其余参数只修改有变化的，目标配置中没有的参数删除
+configure_clone() {{
+    local line key value cur vol opts size current_size gb
+    local -a set_args=() removed=()
+    local -A current=() desired=()
+    while IFS= read -r line; do
+        [ -n "$line" ] || continue
+        current["${{line%%: *}}"]="${{line#*: }}"
+    done < <(current_config)
+
+    while IFS= read -r line; do
+        [ -n "$line" ] || continue
+        key="${{line%%: *}}"
+        value="${{line#*: }}"
+        desired["$key"]=1
+        if [[ "$key" =~ ^(scsi|virtio|sata|ide)[0-9]+$ ]] && [[ "$value" != *media=cdrom* ]]; then
+            opts=""
+            [[ "$value" != *,* ]] || opts="${{value#*,}}"
+            size=$(echo "$value" | grep -o 'size=[^,]*' | cut -d'=' -f2 || true)
+            cur="${{current[$key]-}}"
+            if [ -n "$cur" ]; then
+                vol="${{cur%%,*}}"
+                current_size=$(echo "$cur" | grep -o 'size=[^,]*' | cut -d'=' -f2 || true)
+                if [ -n "$size" ] && [ -n "$current_size" ] && [ "$(to_bytes "$current_size")" -lt "$(to_bytes "$size")" ]; then
+                    log_info "扩容磁盘 $key: $current_size -> $size"
+                    run qm resize "$VMID" "$key" "$size" || log_error "磁盘扩容失败: $key"
+                    current_size=$size
+                fi
+                if [ -n "$current_size" ]; then
+                    opts=$(echo "$opts" | sed "s/size=[^,]*/size=$current_size/")
+                fi
+                value="$vol${{opts:+,$opts}}"
+            else
+                gb=$(( ($(to_bytes "${{size:-32G}}") + 1073741823) / 1073741824 ))
+                opts=$(echo "$opts" | sed -E 's/(^|,)size=[^,]*//; s/^,//')
+                value="${{value%%:*}}:$gb${{opts:+,$opts}}"
+                log_info "新建磁盘 $key: $value"
+            fi
+        fi
+        if [ "${{current[$key]-}}" != "$value" ]; then
+            set_args+=("--$key" "$value")
+        fi
+    done < <(desired_config)
+
+    # 删除的磁盘会变为 unusedN，卷本身不会被销毁
+    for key in "${{!current[@]}}"; do
+        [ -n "${{desired[$key]-}}" ] || removed+=("$key")
+    done
+    if [ ${{#removed[@]}} -gt 0 ]; then
+        log_info "删除参数: ${{removed[*]}}"
+        set_args+=(--delete "$(IFS=,; echo "${{removed[*]}}")")
+    fi
+
+    if [ ${{#set_args[@]}} -gt 0 ]; then
+        run qm set "$VMID" "${{set_args[@]}}" >/dev/null || log_error "修改虚拟机配置失败"
+    fi
+}}'''
+
+
+# Libvirt镜像克隆，ensure_disks 和 create_virtual_disk 共用
+LIBVIRT_CLONE_FUNCTIONS = r'''# 镜像的虚拟容量（字节）
+image_size() {
+    qemu-img info -U --output=json "$1" 2>/dev/null \
+        | grep -o '"virtual-size": *[0-9]*' | grep -o '[0-9]*$' || true
+}
+
+# clone_image 基础镜像 目标路径 大小 方式 [创建参数]：linked 创建以基础镜像为后备文件的qcow2覆盖层，
+# full 完整复制为独立的qcow2镜像；目标大小超过基础镜像时扩容
+clone_image() {
+    local base=$1 path=$2 size=$3 mode=$4 options=${5:-} base_size
+    [ -f "$base" ] || log_error "基础镜像不存在: $base"
+    run mkdir -p "$(dirname "$path")"
+    if [ "$mode" = "linked" ]; then
+        log_info "创建链接克隆: $path <- $base"
+        run qemu-img create -f qcow2 ${options:+-o "$options"} -b "$base" -F qcow2 "$path" >/dev/null \
+            || log_error "链接克隆失败: $path"
+    else
+        log_info "完整克隆: $base -> $path"
+        run qemu-img convert -O qcow2 ${options:+-o "$options"} "$base" "$path" || log_error "完整克隆失败: $path"
+    fi
+    base_size=$(image_size "$base")
+    if [ -n "$base_size" ] && [ "$base_size" -lt "$(to_bytes "$size")" ]; then
+        run qemu-img resize -f qcow2 "$path" "$size" >/dev/null || log_error "虚拟磁盘扩容失败: $path"
+    fi
+    run chown libvirt-qemu:libvirt-qemu "$path" 2>/dev/null || true
+    run chmod 660 "$path"
+}'''
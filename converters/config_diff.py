@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+配置差异比较
+把PVE配置（磁盘、网卡拆分为子参数）或Libvirt XML（按元素）规范化为分节结构，
+为每一节计算哈希指纹，只比较指纹不同的节；支持比较两个目录下的大量配置文件
+
+命令行用法：
+    python -m converters.config_diff OLD NEW [--json]
+OLD/NEW 同为文件或同为目录，有差异时退出码为1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import xmltodict
+
+from converters.config_sections import PVE_CONFIG_SECTIONS
+from converters.pve_parser import (DISK_KEY_RE, NET_KEY_RE, parse_disk_config,
+                                   parse_network_config, parse_pve_config)
+
+CONFIG_EXTENSIONS = ('.conf', '.xml')
+
+# Libvirt设备按以下子元素识别同一设备，避免插入一个设备后其余设备全部显示为变化
+DEVICE_IDENTITY = {
+    'disk': ('target', '@dev'),
+    'interface': ('mac', '@address'),
+    'controller': ('@type', '@index'),
+    'hostdev': ('source', 'address', '@bus'),
+}
+
+
+class DiffError(ValueError):
+    """配置无法解析或无法比较"""
+
+
+def _fingerprint(data):
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _flatten(value, prefix, out):
+    """把xmltodict的嵌套结构展开为 路径 -> 文本 的映射"""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _flatten(child, f"{prefix}/{key}" if prefix else key, out)
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            _flatten(child, f"{prefix}[{index}]", out)
+    else:
+        out[prefix or '#text'] = '' if value is None else str(value)
+    return out
+
+
+def _device_key(tag, index, device):
+    path = DEVICE_IDENTITY.get(tag)
+    if path and isinstance(device, dict):
+        if tag == 'controller':
+            return f"{tag}[{device.get('@type', '')}{device.get('@index', '')}]"
+        value = device
+        for step in path:
+            value = value.get(step) if isinstance(value, dict) else None
+        if value:
+            return f"{tag}[{value}]"
+    return f"{tag}[{index}]"
+
+
+class ConfigDiffer:
+    """
+    配置差异比较器
+
+    Args:
+        sections (dict): 配置分节定义，格式同 PVE_CONFIG_SECTIONS；为None时PVE配置只分为
+            disks、network 和 general 三节
+    """
+
+    def __init__(self, sections=None):
+        self.key_sections = {}
+        for section_key, section in (sections or {}).items():
+            for opt in section['options']:
+                self.key_sections.setdefault(opt['key'], section_key)
+
+    def _section_of(self, key):
+        if DISK_KEY_RE.match(key):
+            return 'disks'
+        if NET_KEY_RE.match(key):
+            return 'network'
+        return self.key_sections.get(key, 'general')
+
+    def normalize(self, config_data):
+        """
+        规范化PVE配置字典：磁盘和网卡拆分为子参数，其余值转换为字符串，
+        空值视为未设置（生成配置文件时同样不会输出）
+
+        Returns:
+            dict: format、sections（节 -> 键 -> 值或子参数字典）、每节指纹和整体指纹
+        """
+        sections = {}
+        for key, value in config_data.items():
+            if value is None or value == '':
+                continue
+            if DISK_KEY_RE.match(key):
+                value = {k: str(v) for k, v in parse_disk_config(str(value)).items()}
+            elif NET_KEY_RE.match(key):
+                value = {k: str(v) for k, v in parse_network_config(str(value)).items()}
+            else:
+                value = str(value)
+            sections.setdefault(self._section_of(key), {})[key] = value
+        return self._snapshot('pve', sections)
+
+    def normalize_libvirt(self, content):
+        """
+        规范化Libvirt XML：每个顶层元素为一节，devices 下每种设备为一节，
+        设备按目标设备名、MAC等识别，元素和属性展开为子参数
+        """
+        try:
+            domain = xmltodict.parse(content).get('domain') or {}
+        except Exception as e:
+            raise DiffError(f"XML解析失败: {e}")
+        if not isinstance(domain, dict):
+            raise DiffError('XML中没有domain元素')
+
+        sections = {}
+        for tag, value in domain.items():
+            if tag == 'devices' and isinstance(value, dict):
+                for device_tag, devices in value.items():
+                    if not isinstance(devices, list):
+                        devices = [devices]
+                    entries = sections.setdefault(f"devices/{device_tag}", {})
+                    for index, device in enumerate(devices):
+                        key = _device_key(device_tag, index, device)
+                        entries[key] = _flatten(device, '', {}) if isinstance(device, dict) else str(device)
+            elif isinstance(value, (dict, list)):
+                sections[tag] = {tag: _flatten(value, '', {})}
+            else:
+                sections[tag] = {tag: '' if value is None else str(value)}
+        return self._snapshot('libvirt', sections)
+
+    def _snapshot(self, config_format, sections):
+        fingerprints = {name: _fingerprint(entries) for name, entries in sections.items()}
+        return {
+            'format': config_format,
+            'sections': sections,
+            'fingerprints': fingerprints,
+            'fingerprint': _fingerprint(sorted(fingerprints.items())),
+        }
+
+    def load(self, content, config_format):
+        """解析配置文件内容并规范化"""
+        if config_format == 'libvirt':
+            return self.normalize_libvirt(content)
+        return self.normalize(parse_pve_config(content))
+
+    def load_file(self, path):
+        """按扩展名解析配置文件（.xml 为Libvirt，其余为PVE）"""
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        return self.load(content, 'libvirt' if path.endswith('.xml') else 'pve')
+
+    def diff(self, old, new):
+        """
+        比较两个规范化后的配置，只展开指纹不同的节
+
+        Returns:
+            list: 变化列表，每项包含 section、key、option（子参数，可选）、
+                change（added/removed/changed）、old、new
+        """
+        if old['format'] != new['format']:
+            raise DiffError('只能比较相同格式的配置')
+        if old['fingerprint'] == new['fingerprint']:
+            return []
+
+        changes = []
+        old_fps, new_fps = old['fingerprints'], new['fingerprints']
+        for section in sorted(set(old_fps) | set(new_fps)):
+            if old_fps.get(section) == new_fps.get(section):
+                continue
+            old_entries = old['sections'].get(section, {})
+            new_entries = new['sections'].get(section, {})
+            for key in sorted(set(old_entries) | set(new_entries)):
+                _diff_value(changes, section, key, old_entries.get(key), new_entries.get(key))
+        return changes
+
+    def diff_files(self, old_path, new_path):
+        return self.diff(self.load_file(old_path), self.load_file(new_path))
+
+    def diff_directories(self, old_dir, new_dir):
+        """
+        比较两个目录下同名（相对路径）的配置文件，内容完全相同的文件不解析
+
+        Returns:
+            dict: changed（有差异的文件及变化）、added、removed、identical（相同文件数）、errors
+        """
+        old_files = _collect_files(old_dir)
+        new_files = _collect_files(new_dir)
+
+        result = {'changed': [], 'added': sorted(set(new_files) - set(old_files)),
+                  'removed': sorted(set(old_files) - set(new_files)), 'identical': 0, 'errors': []}
+
+        for name in sorted(set(old_files) & set(new_files)):
+            old_path, new_path = old_files[name], new_files[name]
+            try:
+                if _same_bytes(old_path, new_path):
+                    result['identical'] += 1
+                    continue
+                changes = self.diff_files(old_path, new_path)
+            except (OSError, DiffError) as e:
+                result['errors'].append({'path': name, 'error': str(e)})
+                continue
+
+            if changes:
+                result['changed'].append({'path': name, 'changes': changes})
+            else:
+                # 只有注释、空行或键顺序不同
+                result['identical'] += 1
+        return result
+
+
+def _diff_value(changes, section, key, old, new):
+    if old == new:
+        return
+    if old is None:
+        changes.append({'section': section, 'key': key, 'change': 'added', 'old': None, 'new': new})
+    elif new is None:
+        changes.append({'section': section, 'key': key, 'change': 'removed', 'old': old, 'new': None})
+    elif isinstance(old, dict) and isinstance(new, dict):
+        for option in sorted(set(old) | set(new)):
+            old_value, new_value = old.get(option), new.get(option)
+            if old_value == new_value:
+                continue
+            change = 'added' if old_value is None else 'removed' if new_value is None else 'changed'
+            changes.append({'section': section, 'key': key, 'option': option,
+                            'change': change, 'old': old_value, 'new': new_value})
+    else:
+        changes.append({'section': section, 'key': key, 'change': 'changed', 'old': old, 'new': new})
+
+
+def _collect_files(root):
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(CONFIG_EXTENSIONS):
+                path = os.path.join(dirpath, filename)
+                files[os.path.relpath(path, root)] = path
+    return files
+
+
+def _same_bytes(old_path, new_path):
+    if os.path.getsize(old_path) != os.path.getsize(new_path):
+        return False
+    with open(old_path, 'rb') as f_old, open(new_path, 'rb') as f_new:
+        return f_old.read() == f_new.read()
+
+
+def format_changes(changes, indent='  '):
+    """把变化列表格式化为文本"""
+    signs = {'added': '+', 'removed': '-', 'changed': '~'}
+    lines = []
+    for change in changes:
+        name = f"{change['key']}.{change['option']}" if 'option' in change else change['key']
+        if change['change'] == 'changed':
+            detail = f"{change['old']} -> {change['new']}"
+        else:
+            detail = change['new'] if change['change'] == 'added' else change['old']
+        lines.append(f"{indent}{signs[change['change']]} [{change['section']}] {name}: {detail}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='比较两个配置文件或两个配置目录')
+    parser.add_argument('old', help='旧配置文件或目录')
+    parser.add_argument('new', help='新配置文件或目录')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = parser.parse_args(argv)
+
+    differ = ConfigDiffer(PVE_CONFIG_SECTIONS)
+    if os.path.isdir(args.old) and os.path.isdir(args.new):
+        result = differ.diff_directories(args.old, args.new)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            for item in result['changed']:
+                print(item['path'])
+                print(format_changes(item['changes']))
+            for name in result['added']:
+                print(f"+ {name}")
+            for name in result['removed']:
+                print(f"- {name}")
+            for item in result['errors']:
+                print(f"! {item['path']}: {item['error']}")
+            print(f"\n变化 {len(result['changed'])}，新增 {len(result['added'])}，"
+                  f"删除 {len(result['removed'])}，相同 {result['identical']}")
+        different = result['changed'] or result['added'] or result['removed'] or result['errors']
+    elif os.path.isfile(args.old) and os.path.isfile(args.new):
+        try:
+            changes = differ.diff_files(args.old, args.new)
+        except DiffError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 2
+        if args.json:
+            print(json.dumps(changes, ensure_ascii=False, indent=2))
+        elif changes:
+            print(format_changes(changes, indent=''))
+        different = bool(changes)
+    else:
+        print('错误: OLD 和 NEW 必须同为文件或同为目录', file=sys.stderr)
+        return 2
+
+    return 1 if different else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+PVE配置选项定义
+界面表单、配置校验（ConfigValidator）和配置差异比较（ConfigDiffer）共用的分节选项表，
+命令行的 config_diff 与 /api/diff 使用同一份定义
+"""
+
+from converters.clone_provisioning import CLONE_MODES
+from converters.disk_allocation import CLUSTER_SIZES, DISK_FORMATS, PREALLOCATION_MODES
+from converters.disk_profiles import DISK_PROFILES
+
+# PVE配置选项分类
+PVE_CONFIG_SECTIONS = {
+    'basic': {
+        'name': '基本配置',
+        'options': [
+            {'key': 'vmid', 'type': 'number', 'label': '虚拟机ID', 'default': 100, 'min': 100, 'max': 999999,
+             'required': True},
+            {'key': 'name', 'type': 'text', 'label': '虚拟机名称', 'default': 'vm-default', 'required': True},
+            {'key': 'memory', 'type': 'number', 'label': '内存(MB)', 'default': 2048, 'min': 256, 'step': 256,
+             'required': True},
+            {'key': 'balloon', 'type': 'number', 'label': 'Balloon内存(MB)', 'default': 0, 'min': 0},
+            {'key': 'cores', 'type': 'number', 'label': 'CPU核心数', 'default': 2, 'min': 1, 'max': 128,
+             'required': True},
+            {'key': 'sockets', 'type': 'number', 'label': 'CPU插槽数', 'default': 1, 'min': 1, 'max': 4,
+             'required': True},
+            {'key': 'cpu', 'type': 'select', 'label': 'CPU类型', 'default': 'host', 
+             'options': ['host', 'qemu64', 'kvm64', 'core2duo', 'pentium3', 'qemu32']},
+            {'key': 'numa', 'type': 'checkbox', 'label': '启用NUMA', 'default': '0'},
+            # 仅在配置了宿主机布局时生效，生成 affinity 和 <cputune>
+            {'key': 'cpu_pinning', 'type': 'checkbox', 'label': 'CPU绑核', 'default': '0', 'pve': False},
+            {'key': 'ostype', 'type': 'select', 'label': '操作系统类型', 'default': 'l26',
+             'options': ['l26', 'win11', 'win10', 'win8', 'win7', 'solaris', 'other']},
+            {'key': 'onboot', 'type': 'checkbox', 'label': '开机自启', 'default': '1'},
+            {'key': 'startup', 'type': 'text', 'label': '启动顺序', 'default': 'order=1'},
+            {'key': 'agent', 'type': 'checkbox', 'label': 'QEMU Guest Agent', 'default': '1'},
+        ]
+    },
+    'boot': {
+        'name': '启动设置',
+        'options': [
+            {'key': 'boot', 'type': 'text', 'label': '启动设备顺序', 'default': 'order=scsi0;ide2;net0'},
+            {'key': 'bios', 'type': 'select', 'label': 'BIOS', 'default': 'ovmf', 'options': ['ovmf', 'seabios']},
+            {'key': 'machine', 'type': 'select', 'label': '机器类型', 'default': 'q35', 
+             'options': ['q35', 'pc', 'pc-i440fx']},
+            {'key': 'acpi', 'type': 'checkbox', 'label': '启用ACPI', 'default': '1'},
+            {'key': 'kvm', 'type': 'checkbox', 'label': '启用KVM硬件虚拟化', 'default': '1'},
+        ]
+    },
+    'disks': {
+        'name': '磁盘配置',
+        'options': [
+            {'key': 'scsi0', 'type': 'text', 'label': 'SCSI磁盘0', 
+             'default': 'local-lvm:vm-100-disk-0,size=32G', 'placeholder': '存储:ID,size=大小'},
+            {'key': 'scsi1', 'type': 'text', 'label': 'SCSI磁盘1', 'default': ''},
+            {'key': 'virtio0', 'type': 'text', 'label': 'VirtIO磁盘0', 'default': ''},
+            {'key': 'ide0', 'type': 'text', 'label': 'IDE磁盘0', 'default': ''},
+            {'key': 'ide2', 'type': 'text', 'label': 'CD/DVD驱动器', 'default': 'none,media=cdrom'},
+            {'key': 'scsihw', 'type': 'select', 'label': 'SCSI控制器类型', 'default': 'virtio-scsi-pci',
+             'options': ['virtio-scsi-pci', 'virtio-scsi-single', 'lsi', 'lsi53c895a', 'megasas', 'pvscsi']},
+            {'key': 'discard', 'type': 'checkbox', 'label': '启用TRIM', 'default': 'on'},
+            {'key': 'cache', 'type': 'select', 'label': '磁盘缓存', 'default': 'writeback',
+             'options': ['none', 'writeback', 'writethrough', 'directsync', 'unsafe']},
+            # 仅用于生成，展开到每个磁盘的参数中，不写入PVE配置文件
+            {'key': 'disk_profile', 'type': 'select', 'label': '磁盘性能配置', 'default': '',
+             'options': [''] + list(DISK_PROFILES), 'pve': False},
+            # 仅用于Libvirt：部署脚本中 qemu-img create 的参数和 <driver> 的镜像格式，磁盘上的 format= 优先
+            {'key': 'disk_format', 'type': 'select', 'label': '镜像格式', 'default': 'qcow2',
+             'options': list(DISK_FORMATS), 'pve': False},
+            {'key': 'preallocation', 'type': 'select', 'label': '预分配', 'default': 'off',
+             'options': list(PREALLOCATION_MODES), 'pve': False},
+            {'key': 'cluster_size', 'type': 'select', 'label': 'qcow2簇大小', 'default': '',
+             'options': list(CLUSTER_SIZES), 'pve': False},
+            {'key': 'lazy_refcounts', 'type': 'checkbox', 'label': 'qcow2延迟引用计数', 'default': '0',
+             'pve': False},
+            {'key': 'extended_l2', 'type': 'checkbox', 'label': 'qcow2扩展L2表', 'default': '0', 'pve': False},
+        ]
+    },
+    'network': {
+        'name': '网络配置',
+        'options': [
+            {'key': 'net0', 'type': 'text', 'label': '网络接口0', 
+             'default': 'virtio=62:7C:6B:3A:32:1D,bridge=vmbr0,firewall=1'},
+            {'key': 'net1', 'type': 'text', 'label': '网络接口1', 'default': ''},
+            {'key': 'net2', 'type': 'text', 'label': '网络接口2', 'default': ''},
+            {'key': 'net3', 'type': 'text', 'label': '网络接口3', 'default': ''},
+            {'key': 'bridge', 'type': 'text', 'label': '默认网桥', 'default': 'vmbr0'},
+            {'key': 'firewall', 'type': 'checkbox', 'label': '启用防火墙', 'default': '1'},
+            {'key': 'mtu', 'type': 'number', 'label': 'MTU大小', 'default': 1500, 'min': 576, 'max': 9000},
+            # 仅用于生成，virtio网卡的队列数设为vCPU数
+            {'key': 'net_multiqueue', 'type': 'checkbox', 'label': '网卡多队列', 'default': '1', 'pve': False},
+        ]
+    },
+    'display': {
+        'name': '显示设置',
+        'options': [
+            {'key': 'vga', 'type': 'select', 'label': '显卡类型', 'default': 'std',
+             'options': ['std', 'cirrus', 'vmware', 'qxl', 'virtio', 'none']},
+            {'key': 'memory', 'type': 'number', 'label': '显存大小(MB)', 'default': 16, 'min': 4, 'max': 512},
+            {'key': 'serial0', 'type': 'text', 'label': '串口0', 'default': 'socket'},
+            {'key': 'usb0', 'type': 'text', 'label': 'USB控制器', 'default': 'host'},
+            {'key': 'keyboard', 'type': 'select', 'label': '键盘布局', 'default': 'en-us',
+             'options': ['en-us', 'de', 'fr', 'es', 'jp']},
+        ]
+    },
+    'advanced': {
+        'name': '高级选项',
+        'options': [
+            {'key': 'smbios1', 'type': 'text', 'label': 'SMBIOS设置', 
+             'default': 'uuid=4c4c4544-004b-1010-8032-b3c04f4e3132'},
+            {'key': 'vmgenid', 'type': 'text', 'label': 'VM Generation ID', 
+             'default': '4c4c4544-004b-1010-8032-b3c04f4e3132'},
+            {'key': 'hugepages', 'type': 'select', 'label': '大页内存', 'default': '',
+             'options': ['', '2', '1024', '2048', 'any']},
+            {'key': 'hotplug', 'type': 'checkbox', 'label': '启用热插拔', 'default': '1'},
+            {'key': 'protection', 'type': 'checkbox', 'label': '防止删除', 'default': '0'},
+            {'key': 'tags', 'type': 'text', 'label': '标签', 'default': ''},
+            {'key': 'description', 'type': 'textarea', 'label': '描述', 'default': ''},
+        ]
+    },
+    # 仅用于生成部署脚本：PVE填写模板虚拟机ID，Libvirt填写基础镜像的绝对路径
+    'provisioning': {
+        'name': '克隆部署',
+        'options': [
+            {'key': 'clone_source', 'type': 'text', 'label': '克隆来源', 'default': '',
+             'placeholder': '模板ID或基础镜像路径', 'pve': False},
+            {'key': 'clone_mode', 'type': 'select', 'label': '克隆方式', 'default': 'linked',
+             'options': list(CLONE_MODES), 'pve': False},
+            {'key': 'clone_storage', 'type': 'text', 'label': '克隆目标存储', 'default': '',
+             'placeholder': '仅完整克隆', 'pve': False},
+        ]
+    }
+}
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Libvirt设备布局
+把PVE配置中的所有 scsiN/virtioN/sataN/ideN 磁盘和 netN 网卡映射为Libvirt设备，
+并分配互不冲突的PCI地址和驱动器地址
+"""
+
+import re
+from xml.sax.saxutils import quoteattr
+
+from converters.clone_provisioning import libvirt_clone
+from converters.disk_allocation import allocation_settings, disk_format, metadata_cache_size
+from converters.disk_profiles import libvirt_driver_attrs, profile_queue_count
+from converters.net_tuning import libvirt_net_tuning
+from converters.pve_parser import (collect_disk_keys, collect_net_keys,
+                                   parse_disk_config, parse_network_config)
+
+# PVE scsihw 到 Libvirt SCSI控制器型号
+SCSI_CONTROLLER_MODELS = {
+    'virtio-scsi-pci': 'virtio-scsi',
+    'virtio-scsi-single': 'virtio-scsi',
+    'lsi': 'lsilogic',
+    'lsi53c895a': 'lsilogic',
+    'megasas': 'lsisas1078',
+    'pvscsi': 'vmpvscsi',
+}
+
+# 每个控制器可挂载的设备数
+SCSI_UNITS = {'virtio-scsi': 16384}
+SCSI_UNITS_DEFAULT = 7
+SATA_UNITS = 6
+
+DEFAULT_BRIDGE = 'virbr0'
+
+# 磁盘来源不是本地文件时（如 local-lvm:vm-100-disk-0）使用的镜像目录
+LIBVIRT_IMAGE_DIR = '/var/lib/libvirt/images'
+
+
+def disk_name(prefix, index):
+    """
+    按Libvirt规则生成磁盘设备名：0 -> vda，25 -> vdz，26 -> vdaa
+
+    Args:
+        prefix (str): 前缀，如 vd、sd、hd
+        index (int): 从0开始的序号
+
+    Returns:
+        str: 设备名
+    """
+    suffix = ''
+    index += 1
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        suffix = chr(97 + rem) + suffix
+    return prefix + suffix
+
+
+def is_image_file(source):
+    """磁盘来源是否为需要创建的本地镜像文件（块设备和存储卷名不是）"""
+    return bool(source) and source.startswith('/') and not source.startswith('/dev/')
+
+
+def is_q35(machine):
+    """q35机型使用PCIe拓扑，pc/i440fx使用传统PCI总线"""
+    return not machine or 'q35' in machine
+
+
+def pci_address_xml(address):
+    """
+    生成PCI地址元素
+
+    Args:
+        address (tuple): (bus, slot, function)
+    """
+    bus, slot, function = address
+    return (f'<address type="pci" domain="0x0000" bus="0x{bus:02x}" '
+            f'slot="0x{slot:02x}" function="0x{function:x}"/>')
+
+
+def drive_address_xml(controller, bus, unit, target=0):
+    return (f'<address type="drive" controller="{controller}" bus="{bus}" '
+            f'target="{target}" unit="{unit}"/>')
+
+
+class PciAddressAllocator:
+    """
+    PCI地址分配器，每次分配为O(1)
+
+    q35：每个设备挂在独立的 pcie-root-port 上，根端口依次占用 00:02.0 - 00:1e.7
+    pc：设备直接占用总线0的插槽，插满后在最后一个插槽放置 pci-bridge 继续分配
+
+    Args:
+        machine (str): 机型
+    """
+
+    # q35上 00:01.0 为显卡，00:1f.x 为芯片组自带设备
+    PCIE_FIRST_SLOT = 0x02
+    PCIE_LAST_SLOT = 0x1e
+    # i440fx上 00:00 为主桥，00:01 为PIIX，00:02 为显卡
+    PCI_FIRST_SLOT = 0x03
+    PCI_LAST_SLOT = 0x1f
+
+    def __init__(self, machine='q35'):
+        self.pcie = is_q35(machine)
+        self.controllers = []
+        self._ports = 0
+        self._bus = 0
+        self._slot = self.PCIE_FIRST_SLOT if self.pcie else self.PCI_FIRST_SLOT
+
+    def allocate(self):
+        """
+        分配一个设备地址
+
+        Returns:
+            tuple: (bus, slot, function)
+        """
+        if self.pcie:
+            return self._allocate_root_port()
+        return self._allocate_pci_slot()
+
+    def _allocate_root_port(self):
+        port = self._ports
+        slot = self.PCIE_FIRST_SLOT + port // 8
+        function = port % 8
+        if slot > self.PCIE_LAST_SLOT:
+            raise ValueError('PCIe设备数量超出上限')
+
+        self._ports += 1
+        index = port + 1
+        self.controllers.append({
+            'index': index,
+            'model': 'pcie-root-port',
+            'chassis': index,
+            'port': 0x10 + port,
+            'address': (0, slot, function),
+            'multifunction': function == 0,
+        })
+        return (index, 0, 0)
+
+    def _allocate_pci_slot(self):
+        if self._slot == self.PCI_LAST_SLOT:
+            # 最后一个插槽留给下一级 pci-bridge
+            bridge_index = self._bus + 1
+            self.controllers.append({
+                'index': bridge_index,
+                'model': 'pci-bridge',
+                'address': (self._bus, self._slot, 0),
+            })
+            self._bus = bridge_index
+            self._slot = 1
+
+        address = (self._bus, self._slot, 0)
+        self._slot += 1
+        return address
+
+    def render(self, indent='    '):
+        """生成根总线和所有根端口/桥的控制器元素"""
+        root_model = 'pcie-root' if self.pcie else 'pci-root'
+        lines = [f'{indent}<controller type="pci" index="0" model="{root_model}"/>']
+
+        for ctrl in self.controllers:
+            address = pci_address_xml(ctrl['address'])
+            if ctrl.get('multifunction'):
+                address = address[:-2] + ' multifunction="on"/>'
+
+            lines.append(f'{indent}<controller type="pci" index="{ctrl["index"]}" model="{ctrl["model"]}">')
+            lines.append(f'{indent}  <model name="{ctrl["model"]}"/>')
+            if ctrl['model'] == 'pcie-root-port':
+                lines.append(f'{indent}  <target chassis="{ctrl["chassis"]}" port="0x{ctrl["port"]:x}"/>')
+            else:
+                lines.append(f'{indent}  <target chassisNr="{ctrl["index"]}"/>')
+            lines.append(f'{indent}  {address}')
+            lines.append(f'{indent}</controller>')
+
+        return '\n'.join(lines)
+
+
+class DeviceLayout:
+    """
+    虚拟机的磁盘、网卡和控制器布局
+
+    Args:
+        config_data (dict): PVE风格的配置字典
+    """
+
+    def __init__(self, config_data):
+        self.config_data = config_data
+        self.machine = str(config_data.get('machine', 'q35') or 'q35')
+        self.pcie = is_q35(self.machine)
+        self.pci = PciAddressAllocator(self.machine)
+
+        self.disks = []
+        self.interfaces = []
+        self.scsi_controllers = []
+        self.sata_controllers = []
+        self.ide_controller = not self.pcie
+        self.video_address = (0, 0x01, 0) if self.pcie else (0, 0x02, 0)
+
+        scsihw = str(config_data.get('scsihw', 'virtio-scsi-pci') or 'virtio-scsi-pci')
+        self.scsihw = scsihw
+        self.scsi_model = SCSI_CONTROLLER_MODELS.get(scsihw, 'virtio-scsi')
+        self.scsi_single = scsihw == 'virtio-scsi-single'
+        self.scsi_units = SCSI_UNITS.get(self.scsi_model, SCSI_UNITS_DEFAULT)
+
+        # 独立IO线程数和磁盘性能配置给出的队列数
+        self.iothreads = 0
+        self.queues = profile_queue_count(config_data)
+        # 默认镜像格式和qcow2参数
+        self.allocation = allocation_settings(config_data)
+
+        # 分配顺序固定，保证相同输入得到相同地址
+        for key in collect_net_keys(config_data):
+            self._add_interface(key, config_data[key])
+
+        self.usb_address = self.pci.allocate()
+        self.virtio_serial_address = self.pci.allocate()
+
+        # q35自带的SATA控制器0位于 00:1f.2，之后的控制器需要分配PCI地址
+        if self.pcie:
+            self.sata_controllers.append({'index': 0, 'address': (0, 0x1f, 2)})
+
+        self._vd_count = 0
+        self._sd_count = 0
+        self._sata_count = 0
+        for key, bus, number in collect_disk_keys(config_data):
+            self._add_disk(key, bus, number, config_data[key])
+        self._apply_clone()
+
+        self.memballoon_address = self.pci.allocate()
+
+    def _add_interface(self, key, value):
+        net = parse_network_config(value)
+        model = net.get('model') or 'virtio'
+        # 第一段不含MAC时 parse_network_config 会把整段当作型号
+        if net.get('mac') is None and re.fullmatch(r'[0-9A-Fa-f:]{17}', model):
+            net['mac'], model = model, 'virtio'
+
+        self.interfaces.append({
+            'key': key,
+            'model': model,
+            'mac': net.get('mac'),
+            'bridge': net.get('bridge') or DEFAULT_BRIDGE,
+            'options': net,
+            'tuning': libvirt_net_tuning(net),
+            'address': self.pci.allocate(),
+        })
+
+    def _add_disk(self, key, bus, number, value):
+        options = parse_disk_config(value)
+        if options.get('storage_type'):
+            source = f"{options['storage_type']}:{options['storage_path']}"
+        else:
+            source = options.get('storage_path', '')
+
+        device = 'cdrom' if options.get('media') == 'cdrom' else 'disk'
+        disk = {
+            'key': key,
+            'device': device,
+            'source': None if source == 'none' else source,
+            'options': options,
+            'driver': {'name': 'qemu', 'type': 'raw' if device == 'cdrom' else disk_format(options, self.allocation)},
+            'rotation_rate': None,
+            'backing': None,
+            'metadata_cache': None,
+        }
+        iothread = device == 'disk' and str(options.get('iothread', '0')) == '1'
+        if device == 'disk':
+            disk['driver'].update(libvirt_driver_attrs(options))
+            if disk['driver']['type'] == 'qcow2':
+                disk['metadata_cache'] = metadata_cache_size(options.get('size') or '32G', self.allocation)
+            if options.get('ssd') == '1' and bus != 'virtio':
+                disk['rotation_rate'] = 1
+
+        if bus == 'virtio':
+            disk['bus'] = 'virtio'
+            disk['dev'] = disk_name('vd', self._vd_count)
+            self._vd_count += 1
+            disk['address'] = pci_address_xml(self.pci.allocate())
+            if iothread:
+                disk['driver']['iothread'] = self._new_iothread()
+            if self.queues and device == 'disk':
+                disk['driver']['queues'] = self.queues
+        elif bus == 'scsi':
+            disk['bus'] = 'scsi'
+            disk['dev'] = disk_name('sd', self._sd_count)
+            self._sd_count += 1
+            disk['address'] = self._scsi_address(number, iothread)
+        elif bus == 'ide' and not self.pcie:
+            if number > 3:
+                raise ValueError(f"{key}: IDE设备编号超出范围")
+            disk['bus'] = 'ide'
+            disk['dev'] = disk_name('hd', number)
+            disk['address'] = drive_address_xml(0, number // 2, number % 2)
+        else:
+            # q35没有IDE控制器，IDE设备挂到SATA上
+            disk['bus'] = 'sata'
+            disk['dev'] = disk_name('sd', self._sd_count)
+            self._sd_count += 1
+            disk['address'] = self._sata_address()
+
+        self.disks.append(disk)
+
+    def _apply_clone(self):
+        # 第一个磁盘从基础镜像克隆为qcow2镜像：链接克隆是以基础镜像为后备文件的覆盖层，完整克隆是独立副本。
+        # 来源不是本地文件时改为部署脚本创建的 LIBVIRT_IMAGE_DIR/虚拟机名.qcow2
+        clone = libvirt_clone(self.config_data)
+        if clone is None:
+            return
+        for disk in self.disks:
+            if disk['device'] == 'disk':
+                if not is_image_file(disk['source']):
+                    vm_name = str(self.config_data.get('name', 'vm-default')).replace(' ', '_')
+                    disk['source'] = f"{LIBVIRT_IMAGE_DIR}/{vm_name}.qcow2"
+                if disk['driver']['type'] != 'qcow2':
+                    disk['driver']['type'] = 'qcow2'
+                    disk['metadata_cache'] = metadata_cache_size(disk['options'].get('size') or '32G',
+                                                                 self.allocation)
+                if clone['mode'] == 'linked':
+                    disk['backing'] = clone['source']
+                return
+
+    def _new_iothread(self):
+        self.iothreads += 1
+        return self.iothreads
+
+    def _scsi_address(self, number, iothread=False):
+        if self.scsi_single:
+            controller = len(self.scsi_controllers)
+            unit = 0
+        else:
+            controller, unit = divmod(number, self.scsi_units)
+
+        while len(self.scsi_controllers) <= controller:
+            driver = {}
+            if self.scsi_model == 'virtio-scsi' and self.queues:
+                driver['queues'] = self.queues
+            self.scsi_controllers.append({
+                'index': len(self.scsi_controllers),
+                'model': self.scsi_model,
+                'address': self.pci.allocate(),
+                'driver': driver,
+            })
+
+        # virtio-scsi-single 时每个磁盘独占控制器和IO线程，否则同一控制器共用一个
+        ctrl = self.scsi_controllers[controller]
+        if iothread and self.scsi_model == 'virtio-scsi' and 'iothread' not in ctrl['driver']:
+            ctrl['driver']['iothread'] = self._new_iothread()
+        return drive_address_xml(controller, 0, unit)
+
+    def _sata_address(self):
+        controller, unit = divmod(self._sata_count, SATA_UNITS)
+        self._sata_count += 1
+
+        while len(self.sata_controllers) <= controller:
+            self.sata_controllers.append({
+                'index': len(self.sata_controllers),
+                'address': self.pci.allocate(),
+            })
+        return drive_address_xml(controller, 0, unit)
+
+    def render_disks(self, indent='    '):
+        """生成所有磁盘元素"""
+        lines = []
+        for disk in self.disks:
+            driver_attrs = ' '.join(f'{k}={quoteattr(str(v))}' for k, v in disk['driver'].items())
+            lines.append(f'{indent}<disk type="file" device="{disk["device"]}">')
+            if disk['metadata_cache']:
+                lines.append(f'{indent}  <driver {driver_attrs}>')
+                lines.append(f'{indent}    <metadata_cache>')
+                lines.append(f'{indent}      <max_size unit="bytes">{disk["metadata_cache"]}</max_size>')
+                lines.append(f'{indent}    </metadata_cache>')
+                lines.append(f'{indent}  </driver>')
+            else:
+                lines.append(f'{indent}  <driver {driver_attrs}/>')
+            if disk['source']:
+                lines.append(f'{indent}  <source file={quoteattr(disk["source"])}/>')
+            if disk['backing']:
+                lines.append(f'{indent}  <backingStore type="file">')
+                lines.append(f'{indent}    <format type="qcow2"/>')
+                lines.append(f'{indent}    <source file={quoteattr(disk["backing"])}/>')
+                lines.append(f'{indent}  </backingStore>')
+            rotation = f' rotation_rate="{disk["rotation_rate"]}"' if disk['rotation_rate'] else ''
+            lines.append(f'{indent}  <target dev="{disk["dev"]}" bus="{disk["bus"]}"{rotation}/>')
+            if disk['device'] == 'cdrom':
+                lines.append(f'{indent}  <readonly/>')
+            lines.append(f'{indent}  {disk["address"]}')
+            lines.append(f'{indent}</disk>')
+        return '\n'.join(lines)
+
+    def render_interfaces(self, indent='    '):
+        """生成所有网卡元素"""
+        lines = []
+        for iface in self.interfaces:
+            lines.append(f'{indent}<interface type="bridge">')
+            if iface['mac']:
+                lines.append(f'{indent}  <mac address={quoteattr(iface["mac"])}/>')
+            lines.append(f'{indent}  <source bridge={quoteattr(iface["bridge"])}/>')
+            lines.append(f'{indent}  <model type={quoteattr(iface["model"])}/>')
+            tuning = iface['tuning']
+            if tuning['driver']:
+                driver_attrs = ' '.join(f'{k}="{v}"' for k, v in tuning['driver'].items())
+                lines.append(f'{indent}  <driver {driver_attrs}/>')
+            if tuning['mtu']:
+                lines.append(f'{indent}  <mtu size="{tuning["mtu"]}"/>')
+            if tuning['bandwidth']:
+                lines.append(f'{indent}  <bandwidth>')
+                lines.append(f'{indent}    <inbound average="{tuning["bandwidth"]}"/>')
+                lines.append(f'{indent}    <outbound average="{tuning["bandwidth"]}"/>')
+                lines.append(f'{indent}  </bandwidth>')
+            if tuning['link_down']:
+                lines.append(f'{indent}  <link state="down"/>')
+            lines.append(f'{indent}  {pci_address_xml(iface["address"])}')
+            lines.append(f'{indent}</interface>')
+        return '\n'.join(lines)
+
+    def render_controllers(self, indent='    '):
+        """生成USB、SATA、IDE、SCSI、virtio-serial及PCI控制器元素"""
+        lines = [
+            f'{indent}<controller type="usb" index="0" model="qemu-xhci" ports="15">',
+            f'{indent}  {pci_address_xml(self.usb_address)}',
+            f'{indent}</controller>',
+        ]
+
+        for ctrl in self.sata_controllers:
+            lines.append(f'{indent}<controller type="sata" index="{ctrl["index"]}">')
+            lines.append(f'{indent}  {pci_address_xml(ctrl["address"])}')
+            lines.append(f'{indent}</controller>')
+
+        if self.ide_controller:
+            lines.append(f'{indent}<controller type="ide" index="0">')
+            lines.append(f'{indent}  {pci_address_xml((0, 0x01, 1))}')
+            lines.append(f'{indent}</controller>')
+
+        for ctrl in self.scsi_controllers:
+            lines.append(f'{indent}<controller type="scsi" index="{ctrl["index"]}" model="{ctrl["model"]}">')
+            if ctrl['driver']:
+                driver_attrs = ' '.join(f'{k}="{v}"' for k, v in ctrl['driver'].items())
+                lines.append(f'{indent}  <driver {driver_attrs}/>')
+            lines.append(f'{indent}  {pci_address_xml(ctrl["address"])}')
+            lines.append(f'{indent}</controller>')
+
+        lines.append(self.pci.render(indent))
+
+        lines.append(f'{indent}<controller type="virtio-serial" index="0">')
+        lines.append(f'{indent}  {pci_address_xml(self.virtio_serial_address)}')
+        lines.append(f'{indent}</controller>')
+        return '\n'.join(lines)
+
+    def render_devices(self, indent='    '):
+        """按磁盘、网卡、控制器的顺序生成所有布局相关的设备元素"""
+        parts = (self.render_disks(indent), self.render_interfaces(indent),
+                 self.render_controllers(indent))
+        return '\n'.join(part for part in parts if part)
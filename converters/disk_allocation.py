@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+磁盘镜像创建参数
+部署脚本用 qemu-img create 创建镜像时的格式（qcow2/raw）、预分配、簇大小、延迟引用计数和扩展L2表，
+避免写入密集的虚拟机在首次写入时才分配空间；同时用于Libvirt <driver> 的镜像格式和qcow2元数据缓存大小
+"""
+
+import math
+
+from converters.capacity import parse_size_gb
+
+DISK_FORMATS = ('qcow2', 'raw')
+PREALLOCATION_MODES = ('off', 'metadata', 'falloc', 'full')
+CLUSTER_SIZES = ('', '16k', '32k', '64k', '128k', '256k', '512k', '1M', '2M')
+
+# qemu-img 的默认簇大小
+DEFAULT_CLUSTER_SIZE = 64 * 1024
+
+_CLUSTER_UNITS = {'k': 1024, 'M': 1024 * 1024}
+
+
+class DiskAllocationError(ValueError):
+    """
+    镜像创建参数无效
+
+    Args:
+        message (str): 错误信息
+        key (str): 出错的配置项
+    """
+
+    def __init__(self, message, key):
+        super().__init__(message)
+        self.key = key
+
+
+def cluster_size_bytes(cluster_size):
+    """把 "128k"、"1M" 转换为字节数，未设置时为默认簇大小"""
+    if not cluster_size:
+        return DEFAULT_CLUSTER_SIZE
+    return int(cluster_size[:-1]) * _CLUSTER_UNITS[cluster_size[-1]]
+
+
+def allocation_settings(config_data):
+    """
+    读取镜像创建参数
+
+    Args:
+        config_data (dict): 配置字典
+
+    Returns:
+        dict: format、preallocation、cluster_size、lazy_refcounts、extended_l2
+
+    Raises:
+        DiskAllocationError: 参数取值无效或相互冲突
+    """
+    settings = {
+        'format': str(config_data.get('disk_format', '') or 'qcow2'),
+        'preallocation': str(config_data.get('preallocation', '') or 'off'),
+        'cluster_size': str(config_data.get('cluster_size', '') or ''),
+        'lazy_refcounts': str(config_data.get('lazy_refcounts', '0')) == '1',
+        'extended_l2': str(config_data.get('extended_l2', '0')) == '1',
+    }
+    if settings['format'] not in DISK_FORMATS:
+        raise DiskAllocationError(f"磁盘格式必须是 {', '.join(DISK_FORMATS)} 之一", 'disk_format')
+    if settings['preallocation'] not in PREALLOCATION_MODES:
+        raise DiskAllocationError(f"预分配方式必须是 {', '.join(PREALLOCATION_MODES)} 之一", 'preallocation')
+    if settings['cluster_size'] not in CLUSTER_SIZES:
+        raise DiskAllocationError(f"簇大小必须是 {', '.join(size for size in CLUSTER_SIZES if size)} 之一",
+                                  'cluster_size')
+    if settings['format'] == 'raw' and settings['preallocation'] == 'metadata':
+        raise DiskAllocationError('raw格式不支持 metadata 预分配', 'preallocation')
+    # 扩展L2表把每个簇分为32个子簇，簇太小时没有意义
+    if settings['extended_l2'] and cluster_size_bytes(settings['cluster_size']) < 16 * 1024:
+        raise DiskAllocationError('扩展L2表要求簇大小至少为16k', 'extended_l2')
+    return settings
+
+
+def disk_format(options, settings):
+    """磁盘的镜像格式，磁盘上已写明的 format= 优先"""
+    return options.get('format') or settings['format']
+
+
+def image_extension(image_format):
+    """镜像文件扩展名，raw镜像使用 .img"""
+    return '.img' if image_format == 'raw' else f'.{image_format}'
+
+
+def qemu_img_options(image_format, settings):
+    """
+    生成 qemu-img create 的 -o 参数
+
+    Returns:
+        str: 如 "preallocation=falloc,cluster_size=128k"，没有需要设置的参数时为空字符串
+    """
+    options = []
+    preallocation = settings['preallocation']
+    if preallocation != 'off' and not (image_format != 'qcow2' and preallocation == 'metadata'):
+        options.append(f"preallocation={preallocation}")
+    if image_format == 'qcow2':
+        if settings['cluster_size']:
+            options.append(f"cluster_size={settings['cluster_size']}")
+        if settings['lazy_refcounts']:
+            options.append('lazy_refcounts=on')
+        if settings['extended_l2']:
+            options.append('extended_l2=on')
+    return ','.join(options)
+
+
+def metadata_cache_size(size, settings):
+    """
+    能覆盖整个qcow2磁盘的L2缓存大小（字节）
+
+    每个L2表项8字节（扩展L2表为16字节）对应一个簇；只在修改了簇大小或启用扩展L2表时返回，
+    默认参数下沿用QEMU的默认缓存大小
+
+    Returns:
+        int: 字节数，不需要设置时为None
+    """
+    if not settings['cluster_size'] and not settings['extended_l2']:
+        return None
+    disk_bytes = parse_size_gb(size) * 1024 ** 3
+    if not disk_bytes:
+        return None
+    entry_size = 16 if settings['extended_l2'] else 8
+    return math.ceil(disk_bytes / cluster_size_bytes(settings['cluster_size'])) * entry_size
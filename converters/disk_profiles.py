@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+磁盘性能配置
+命名的磁盘性能配置统一设置 cache、aio、iothread、discard 和队列数，
+同时作用于PVE磁盘参数和Libvirt的 <driver>/<iothreads> 输出
+"""
+
+from converters.pve_parser import collect_disk_keys, vcpu_count
+
+# options 写入PVE磁盘参数（单个磁盘上已有的同名参数优先）；
+# queues 只用于Libvirt（PVE没有对应的磁盘参数），'vcpus' 表示与vCPU数相同
+DISK_PROFILES = {
+    'db-nvme': {
+        'label': '数据库/NVMe（低延迟）',
+        'options': {'cache': 'none', 'aio': 'io_uring', 'iothread': '1', 'discard': 'on', 'ssd': '1'},
+        'queues': 'vcpus',
+    },
+    'throughput': {
+        'label': '大吞吐顺序读写',
+        'options': {'cache': 'none', 'aio': 'native', 'iothread': '1', 'discard': 'on'},
+        'queues': 4,
+    },
+    'safe': {
+        'label': '数据安全优先',
+        'options': {'cache': 'writethrough', 'aio': 'threads', 'iothread': '0', 'discard': 'ignore'},
+        'queues': None,
+    },
+}
+
+# 各总线在PVE中支持的参数
+BUS_SUPPORTED_OPTIONS = {
+    'scsi': ('cache', 'aio', 'iothread', 'discard', 'ssd'),
+    'virtio': ('cache', 'aio', 'iothread', 'discard'),
+    'sata': ('cache', 'aio', 'discard', 'ssd'),
+    'ide': ('cache', 'aio', 'discard', 'ssd'),
+}
+
+MAX_QUEUES = 16
+
+
+def get_disk_profile(config_data):
+    """返回配置选择的磁盘性能配置，未选择时返回None"""
+    return DISK_PROFILES.get(config_data.get('disk_profile') or '')
+
+
+def profile_queue_count(config_data):
+    """
+    计算磁盘性能配置对应的队列数
+
+    Returns:
+        int: 队列数，未设置时为None
+    """
+    profile = get_disk_profile(config_data)
+    if profile is None or not profile['queues']:
+        return None
+
+    if profile['queues'] == 'vcpus':
+        return min(vcpu_count(config_data), MAX_QUEUES)
+    return profile['queues']
+
+
+def merge_disk_options(disk_string, options):
+    """
+    把参数追加到PVE磁盘字符串中，已存在的参数保持不变
+
+    Args:
+        disk_string (str): 磁盘字符串，如 "local-lvm:vm-100-disk-0,size=32G"
+        options (dict): 要追加的参数
+
+    Returns:
+        str: 合并后的磁盘字符串
+    """
+    parts = disk_string.split(',')
+    existing = {part.split('=', 1)[0] for part in parts[1:]}
+    for key, value in options.items():
+        if key not in existing:
+            parts.append(f"{key}={value}")
+    return ','.join(parts)
+
+
+def apply_disk_profile(config_data):
+    """
+    把磁盘性能配置展开到每个磁盘的参数中
+
+    Args:
+        config_data (dict): 配置字典
+
+    Returns:
+        dict: 展开后的配置字典；未选择性能配置时返回原字典
+    """
+    profile = get_disk_profile(config_data)
+    if profile is None:
+        return config_data
+
+    result = dict(config_data)
+    scsi_iothread = False
+
+    for key, bus, number in collect_disk_keys(config_data):
+        value = config_data[key]
+        if 'media=cdrom' in value:
+            continue
+
+        supported = BUS_SUPPORTED_OPTIONS[bus]
+        options = {k: v for k, v in profile['options'].items() if k in supported}
+        result[key] = merge_disk_options(value, options)
+
+        if bus == 'scsi' and 'iothread=1' in result[key].split(','):
+            scsi_iothread = True
+
+    # PVE中SCSI磁盘的独立IO线程需要每盘一个控制器
+    if scsi_iothread and str(result.get('scsihw', '')).startswith('virtio-scsi'):
+        result['scsihw'] = 'virtio-scsi-single'
+
+    return result
+
+
+def libvirt_driver_attrs(options):
+    """
+    把PVE磁盘参数转换为Libvirt <driver> 属性
+
+    Args:
+        options (dict): parse_disk_config 解析得到的磁盘参数
+
+    Returns:
+        dict: driver属性（不含name/type/iothread）
+    """
+    attrs = {}
+    if options.get('cache'):
+        attrs['cache'] = options['cache']
+    if options.get('aio'):
+        attrs['io'] = options['aio']
+    if options.get('discard') == 'on':
+        attrs['discard'] = 'unmap'
+    elif options.get('discard') == 'ignore':
+        attrs['discard'] = 'ignore'
+    return attrs
+
+
+def pve_options_from_driver(driver, target=None, controller_iothread=False):
+    """
+    把Libvirt <driver> 属性（xmltodict格式）转换为PVE磁盘参数
+
+    Args:
+        driver (dict): 磁盘的 <driver> 元素
+        target (dict): 磁盘的 <target> 元素，rotation_rate="1" 对应 ssd=1
+        controller_iothread (bool): 磁盘所在的SCSI控制器是否绑定了IO线程
+
+    Returns:
+        dict: PVE磁盘参数
+    """
+    options = {}
+    if not isinstance(driver, dict):
+        driver = {}
+
+    if driver.get('@cache'):
+        options['cache'] = driver['@cache']
+    if driver.get('@io'):
+        options['aio'] = driver['@io']
+    if driver.get('@discard') == 'unmap':
+        options['discard'] = 'on'
+    elif driver.get('@discard') == 'ignore':
+        options['discard'] = 'ignore'
+    if driver.get('@iothread') or controller_iothread:
+        options['iothread'] = '1'
+    if isinstance(target, dict) and target.get('@rotation_rate') == '1':
+        options['ssd'] = '1'
+    return options
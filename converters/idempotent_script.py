@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+幂等部署脚本
+脚本中嵌入目标配置的校验和，与宿主机上的配置一致时直接跳过；已存在的虚拟机只应用有变化的参数
+（PVE用 qm set，Libvirt原地 virsh define），磁盘只创建缺少的卷、扩容容量不足的卷，
+重复执行整批部署脚本时不会重建虚拟机；设置了克隆来源时新虚拟机从模板或基础镜像克隆
+"""
+
+import hashlib
+import re
+
+from converters.clone_provisioning import (CLONE_DISK_SED, LIBVIRT_CLONE_FUNCTIONS, libvirt_clone,
+                                           normalize_clone_lines, pve_clone, render_pve_clone_functions)
+from converters.device_layout import LIBVIRT_IMAGE_DIR, DeviceLayout, is_image_file
+from converters.disk_allocation import image_extension, qemu_img_options
+from converters.pve_parser import collect_disk_keys, parse_disk_config, parse_pve_config
+from converters.script_runtime import render_runtime
+
+# 编辑器中的全局默认值，不是PVE配置参数，写入宿主机后 qm config 不会返回
+EDITOR_ONLY_KEYS = ('vmid', 'bridge', 'firewall', 'mtu', 'discard', 'cache')
+
+# 由宿主机维护的参数，不参与比较，也不会被删除（删除 unusedN 会销毁磁盘卷）
+HOST_MANAGED_RE = r'^(digest|meta|lock|parent|vmstate|runningmachine|runningcpu|unused[0-9]+):'
+
+# Libvirt域元数据的命名空间，用于在虚拟机定义中保存校验和
+METADATA_URI = 'urn:vm-config-generator:deploy'
+
+
+def pve_desired_lines(config_content):
+    """
+    把生成的PVE配置规范化为宿主机上 qm config 的形式
+
+    去掉注释、编辑器专用参数和宿主机维护的参数，同名参数以最后一个为准，
+    按字节顺序排序（与 LC_ALL=C sort 一致）
+
+    Returns:
+        list: "key: value" 行
+    """
+    host_managed = re.compile(HOST_MANAGED_RE)
+    config = parse_pve_config(config_content)
+    lines = []
+    for key, value in config.items():
+        line = f"{key}: {value}"
+        if key in EDITOR_ONLY_KEYS or host_managed.match(line) or value == '':
+            continue
+        lines.append(line)
+    return sorted(lines, key=lambda line: line.encode('utf-8'))
+
+
+def config_checksum(lines):
+    """按 sort | sha256sum 的方式计算规范化配置的校验和"""
+    text = ''.join(f"{line}\n" for line in lines)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def libvirt_checksum(xml_content):
+    """计算Libvirt XML的校验和，未指定时随机生成的UUID不参与计算"""
+    content = re.sub(r'^\s*<uuid>[^<]*</uuid>\n', '', xml_content, flags=re.MULTILINE)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def pve_disk_plan(config_data):
+    """
+    列出需要存在的磁盘卷
+
+    Returns:
+        list: (参数名, 存储, 卷名, 大小)；光驱、未指定卷名（如 local-lvm:32）的磁盘不包含在内
+    """
+    plan = []
+    for key, _, _ in collect_disk_keys(config_data):
+        options = parse_disk_config(config_data[key])
+        storage, volname = options.get('storage_type'), options.get('storage_path', '')
+        if options.get('media') == 'cdrom' or not storage or not volname or volname.isdigit():
+            continue
+        plan.append((key, storage, volname, options.get('size') or '32G'))
+    return plan
+
+
+def libvirt_disk_plan(config_data):
+    """
+    列出需要存在的磁盘镜像
+
+    来源为本地文件时按文件创建；都不是本地文件时同普通部署脚本，
+    只创建 LIBVIRT_IMAGE_DIR 下以虚拟机名命名的一个镜像
+
+    设置了克隆来源时第一个磁盘从基础镜像克隆（路径与XML中第一个磁盘的来源相同），基础镜像和克隆方式记录在第4、5列；
+    最后一列为 qemu-img 的 -o 参数（预分配、簇大小等），链接克隆的覆盖层不预分配。没有的值为 -
+
+    Returns:
+        list: (路径, 格式, 大小, 基础镜像, 克隆方式, 创建参数)
+    """
+    clone = libvirt_clone(config_data)
+    layout = DeviceLayout(config_data)
+    plan = []
+    first = None
+    for disk in layout.disks:
+        if disk['device'] != 'disk':
+            continue
+        size = disk['options'].get('size') or '32G'
+        image_format = disk['driver']['type']
+        row = [None, image_format, size, '-', '-', qemu_img_options(image_format, layout.allocation)]
+        if first is None:
+            first = row
+            if clone:
+                settings = layout.allocation
+                if clone['mode'] == 'linked':
+                    settings = dict(settings, preallocation='off')
+                row[1:] = ['qcow2', size, clone['source'], clone['mode'], qemu_img_options('qcow2', settings)]
+        # 块设备不需要创建
+        if is_image_file(disk['source']):
+            row[0] = disk['source']
+            plan.append(row)
+
+    if not plan and first:
+        vm_name = str(config_data.get('name', 'vm-default')).replace(' ', '_')
+        first[0] = f"{LIBVIRT_IMAGE_DIR}/{vm_name}{image_extension(first[1])}"
+        plan.append(first)
+    return [tuple(field or '-' for field in row) for row in plan]
+
+
+def _heredoc_lines(rows):
+    return '\n'.join(' '.join(str(field) for field in row) for row in rows)
+
+
+def _time_header(generated_at):
+    return f"# 生成时间: {generated_at}\n" if generated_at else ''
+
+
+def _checksum_command(clone):
+    # 克隆部署时去掉磁盘卷名后再计算校验和
+    normalize = f" | sed -E '{CLONE_DISK_SED}' | LC_ALL=C sort" if clone else ''
+    return f"current_config{normalize} | sha256sum | cut -d' ' -f1"
+
+
+def _pve_state(lines):
+    # 目标配置和当前配置，幂等部署脚本和克隆部署共用
+    desired = '\n'.join(lines)
+    return f'''# 目标配置（与 qm config 的输出格式相同，已排序）
+desired_config() {{
+    cat << 'EOF'
+{desired}
+EOF
+}}
+
+# 宿主机上的当前配置（规范化后）
+current_config() {{
+    qm config "$VMID" | {{ grep -Ev "$HOST_MANAGED" || true; }} | LC_ALL=C sort
+}}'''
+
+
+def render_pve_clone_block(config_data, config_content):
+    """
+    生成完整部署脚本从PVE模板克隆时使用的Bash代码
+
+    Returns:
+        str: 变量和函数定义（clone_vm、configure_clone），未设置模板时返回None
+    """
+    clone = pve_clone(config_data)
+    if clone is None:
+        return None
+    return f'''VMID={config_data.get('vmid', '100')}
+CONFIG_FILE="/etc/pve/qemu-server/$VMID.conf"
+HOST_MANAGED='{HOST_MANAGED_RE}'
+
+{_pve_state(pve_desired_lines(config_content))}
+
+{render_pve_clone_functions(config_data, clone)}'''
+
+
+def render_pve_script(config_data, config_content, generated_at, automation=False):
+    """
+    生成PVE幂等部署脚本
+
+    Args:
+        config_data (dict): 配置字典
+        config_content (str): generate_pve_config 生成的配置文件内容
+        generated_at (str): 生成时间，为空时不写入
+        automation (bool): 脚本默认不询问并输出JSON Lines进度事件
+
+    Returns:
+        str: 部署脚本
+    """
+    vmid = config_data.get('vmid', '100')
+    lines = pve_desired_lines(config_content)
+    clone = pve_clone(config_data)
+    checksum = config_checksum(normalize_clone_lines(lines) if clone else lines)
+    disks = _heredoc_lines(pve_disk_plan(config_data))
+
+    if clone:
+        clone_functions = '\n\n' + render_pve_clone_functions(config_data, clone)
+        create_phases = 'run_phase clone_vm\n        run_phase configure_clone'
+        update_phases = 'run_phase configure_clone'
+    else:
+        clone_functions = ''
+        create_phases = 'run_phase ensure_disks\n        run_phase create_config'
+        update_phases = ('load_current\n        run_phase ensure_disks\n'
+                         '        run_phase resize_disks\n        run_phase apply_changes')
+
+    return f'''#!/bin/bash
+# ============================================
+# PVE虚拟机幂等部署脚本
+{_time_header(generated_at)}# 虚拟机ID: {vmid}
+# 配置校验和: {checksum}
+# ============================================
+# 宿主机上的配置与目标一致时直接跳过；已存在的虚拟机只用 qm set 修改有变化的参数，
+# 磁盘只创建缺少的卷、扩容容量不足的卷，不会删除或重建虚拟机
+
+VMID={vmid}
+CONFIG_SHA256="{checksum}"
+CONFIG_FILE="/etc/pve/qemu-server/$VMID.conf"
+HOST_MANAGED='{HOST_MANAGED_RE}'
+
+{render_runtime(vmid, automation)}
+
+# 检查是否为root用户
+check_root() {{
+    if [[ $EUID -ne 0 ]]; then
+        log_error "此脚本需要root权限运行"
+    fi
+    command -v qm &> /dev/null || log_error "未找到qm命令"
+}}
+
+{_pve_state(lines)}
+
+# 用于比较的配置校验和
+config_sha256() {{
+    {_checksum_command(clone)}
+}}
+
+# 需要存在的磁盘卷：参数名 存储 卷名 大小
+desired_disks() {{
+    cat << 'EOF'
+{disks}
+EOF
+}}
+
+declare -A CURRENT=()
+
+load_current() {{
+    local line
+    while IFS= read -r line; do
+        CURRENT["${{line%%: *}}"]="${{line#*: }}"
+    done < <(current_config)
+}}
+
+# 创建缺少的磁盘卷
+ensure_disks() {{
+    local key storage volname size
+    while read -r key storage volname size; do
+        [ -n "$key" ] || continue
+        if ! pvesm path "$storage:$volname" &>/dev/null; then
+            log_info "创建磁盘卷: $storage:$volname ($size)"
+            run pvesm alloc "$storage" "$VMID" "$volname" "$size" >/dev/null || log_error "磁盘卷创建失败: $storage:$volname"
+        fi
+    done < <(desired_disks)
+}}
+
+# 扩容容量不足的磁盘（只扩不缩）
+resize_disks() {{
+    local key storage volname size current current_size
+    while read -r key storage volname size; do
+        [ -n "$key" ] || continue
+        current="${{CURRENT[$key]-}}"
+        # 只处理已挂载同一个卷的磁盘
+        [[ "$current" == "$storage:$volname"* ]] || continue
+        current_size=$(echo "$current" | grep -o 'size=[^,]*' | cut -d'=' -f2 || true)
+        if [ -n "$current_size" ] && [ "$(to_bytes "$current_size")" -lt "$(to_bytes "$size")" ]; then
+            log_info "扩容磁盘 $key: $current_size -> $size"
+            run qm resize "$VMID" "$key" "$size" || log_error "磁盘扩容失败: $key"
+            CURRENT[$key]="${{current/size=$current_size/size=$size}}"
+        fi
+    done < <(desired_disks)
+}}
+
+# 只修改有变化的参数，删除目标配置中没有的参数
+apply_changes() {{
+    local line key value
+    local -a set_args=() removed=()
+    local -A desired=()
+    while IFS= read -r line; do
+        [ -n "$line" ] || continue
+        key="${{line%%: *}}"
+        value="${{line#*: }}"
+        desired["$key"]=1
+        if [ "${{CURRENT[$key]-}}" != "$value" ]; then
+            log_info "修改 $key: ${{CURRENT[$key]-(未设置)}} -> $value"
+            set_args+=("--$key" "$value")
+        fi
+    done < <(desired_config)
+
+    for key in "${{!CURRENT[@]}}"; do
+        [ -n "${{desired[$key]-}}" ] || removed+=("$key")
+    done
+    if [ ${{#removed[@]}} -gt 0 ]; then
+        log_info "删除参数: ${{removed[*]}}"
+        set_args+=(--delete "$(IFS=,; echo "${{removed[*]}}")")
+    fi
+
+    if [ ${{#set_args[@]}} -gt 0 ]; then
+        run qm set "$VMID" "${{set_args[@]}}" >/dev/null || log_error "修改虚拟机配置失败"
+    fi
+}}
+
+create_config() {{
+    log_info "创建配置文件: $CONFIG_FILE"
+    desired_config | write_file "$CONFIG_FILE" || log_error "配置文件创建失败"
+    run chmod 644 "$CONFIG_FILE"
+}}
+
+verify_config() {{
+    if [ "$DRY_RUN" = "1" ]; then
+        return 0
+    fi
+    if [ "$(config_sha256)" = "$CONFIG_SHA256" ]; then
+        log_success "虚拟机 $VMID 部署完成"
+    else
+        log_warning "虚拟机 $VMID 的配置与目标不完全一致（宿主机可能规范化了部分参数），再次执行时会重新比较"
+    fi
+}}{clone_functions}
+
+main() {{
+    run_phase check_root $EXIT_ENVIRONMENT
+
+    if [ -f "$CONFIG_FILE" ]; then
+        if [ "$(config_sha256)" = "$CONFIG_SHA256" ]; then
+            emit_event unchanged checksum "$CONFIG_SHA256"
+            log_success "虚拟机 $VMID 配置未变化，跳过"
+            return 0
+        fi
+        log_info "虚拟机 $VMID 已存在，只应用有变化的参数"
+        {update_phases}
+    else
+        log_info "创建虚拟机 $VMID"
+        {create_phases}
+    fi
+    run_phase verify_config
+}}
+
+main "$@"
+'''
+
+
+def render_libvirt_script(config_data, xml_content, generated_at, automation=False):
+    """
+    生成Libvirt幂等部署脚本
+
+    校验和保存在域的元数据中；已存在的虚拟机保留原UUID原地重新定义，正在运行时新配置在重启后生效
+
+    Args:
+        config_data (dict): 配置字典
+        xml_content (str): generate_libvirt_xml 生成的XML
+        generated_at (str): 生成时间，为空时不写入
+        automation (bool): 脚本默认不询问并输出JSON Lines进度事件
+
+    Returns:
+        str: 部署脚本
+    """
+    vm_name = str(config_data.get('name', 'vm-default')).replace(' ', '_')
+    checksum = libvirt_checksum(xml_content)
+    plan = libvirt_disk_plan(config_data)
+    disks = _heredoc_lines(plan)
+    clone_functions = f'\n\n{LIBVIRT_CLONE_FUNCTIONS}' if any(row[3] != '-' for row in plan) else ''
+    autostart = '1' if str(config_data.get('onboot', '0')) == '1' else '0'
+
+    return f'''#!/bin/bash
+# ============================================
+# Libvirt虚拟机幂等部署脚本
+{_time_header(generated_at)}# 虚拟机名称: {vm_name}
+# 配置校验和: {checksum}
+# ============================================
+# 域元数据中记录的校验和与目标一致时直接跳过；已存在的虚拟机保留UUID原地 virsh define，
+# 磁盘只创建缺少的镜像、扩容容量不足的镜像，不会销毁或取消定义虚拟机
+
+VM_NAME="{vm_name}"
+CONFIG_SHA256="{checksum}"
+METADATA_URI="{METADATA_URI}"
+AUTOSTART={autostart}
+
+{render_runtime(vm_name, automation)}
+
+# 检查权限和依赖
+check_dependencies() {{
+    if [[ $EUID -ne 0 ]]; then
+        log_error "此脚本需要root权限运行"
+    fi
+    command -v virsh &> /dev/null || log_error "未找到virsh命令，请安装libvirt-clients"
+    command -v qemu-img &> /dev/null || log_error "未找到qemu-img命令，请安装qemu-utils"
+}}
+
+desired_xml() {{
+    cat << 'EOF'
+{xml_content}
+EOF
+}}
+
+# 需要存在的磁盘镜像：路径 格式 大小 基础镜像 克隆方式 创建参数
+desired_disks() {{
+    cat << 'EOF'
+{disks}
+EOF
+}}
+
+domain_exists() {{
+    virsh dominfo "$VM_NAME" &>/dev/null
+}}
+
+domain_running() {{
+    [ "$(virsh domstate "$VM_NAME" 2>/dev/null)" = "running" ]
+}}
+
+current_checksum() {{
+    virsh metadata "$VM_NAME" --uri "$METADATA_URI" --config 2>/dev/null \\
+        | grep -o 'checksum="[^"]*"' | cut -d'"' -f2 || true
+}}{clone_functions}
+
+# 创建缺少的镜像，扩容容量不足的镜像（只扩不缩）
+ensure_disks() {{
+    local path format size base mode options current
+    while read -r path format size base mode options; do
+        [ -n "$path" ] || continue
+        [ "$options" != "-" ] || options=""
+        if [ ! -e "$path" ] && [ "$base" != "-" ]; then
+            clone_image "$base" "$path" "$size" "$mode" "$options"
+            continue
+        fi
+        if [ ! -e "$path" ]; then
+            log_info "创建虚拟磁盘: $path ($size)"
+            run mkdir -p "$(dirname "$path")"
+            run qemu-img create -f "$format" ${{options:+-o "$options"}} "$path" "$size" >/dev/null \\
+                || log_error "虚拟磁盘创建失败: $path"
+            run chown libvirt-qemu:libvirt-qemu "$path" 2>/dev/null || true
+            run chmod 660 "$path"
+            continue
+        fi
+
+        current=$(qemu-img info -U --output=json "$path" 2>/dev/null \\
+            | grep -o '"virtual-size": *[0-9]*' | grep -o '[0-9]*$' || true)
+        if [ -n "$current" ] && [ "$current" -lt "$(to_bytes "$size")" ]; then
+            log_info "扩容虚拟磁盘: $path -> $size"
+            if domain_running; then
+                run virsh blockresize "$VM_NAME" "$path" "$size" >/dev/null || log_error "虚拟磁盘扩容失败: $path"
+            else
+                run qemu-img resize -f "$format" "$path" "$size" >/dev/null || log_error "虚拟磁盘扩容失败: $path"
+            fi
+        fi
+    done < <(desired_disks)
+}}
+
+define_domain() {{
+    local xml_file uuid
+    xml_file=$(mktemp "/tmp/$VM_NAME.XXXXXX.xml")
+    desired_xml > "$xml_file"
+
+    # 重新定义时必须沿用原UUID
+    if domain_exists; then
+        uuid=$(virsh domuuid "$VM_NAME")
+        sed -i "s|<uuid>[^<]*</uuid>|<uuid>$uuid</uuid>|" "$xml_file"
+    fi
+
+    run virsh define "$xml_file" >/dev/null || {{ rm -f "$xml_file"; log_error "虚拟机定义失败"; }}
+    rm -f "$xml_file"
+    run virsh metadata "$VM_NAME" --uri "$METADATA_URI" --key vmcg \\
+        --set "<deploy checksum=\\"$CONFIG_SHA256\\"/>" --config >/dev/null
+}}
+
+configure_autostart() {{
+    if [ "$AUTOSTART" = "1" ]; then
+        run virsh autostart "$VM_NAME" >/dev/null || log_warning "开机自启配置失败"
+    fi
+}}
+
+main() {{
+    run_phase check_dependencies $EXIT_ENVIRONMENT
+
+    if domain_exists; then
+        if [ "$(current_checksum)" = "$CONFIG_SHA256" ]; then
+            emit_event unchanged checksum "$CONFIG_SHA256"
+            log_success "虚拟机 $VM_NAME 配置未变化，跳过"
+            return 0
+        fi
+        log_info "虚拟机 $VM_NAME 已存在，原地更新定义"
+    else
+        log_info "创建虚拟机 $VM_NAME"
+    fi
+
+    run_phase ensure_disks
+    run_phase define_domain
+    run_phase configure_autostart
+
+    if domain_running; then
+        log_warning "虚拟机 $VM_NAME 正在运行，新配置在下次启动后生效"
+    fi
+    log_success "虚拟机 $VM_NAME 部署完成"
+}}
+
+main "$@"
+'''
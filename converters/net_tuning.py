@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+网卡性能参数
+virtio网卡的多队列、vhost、MTU、限速和链路状态，在PVE netN 参数与Libvirt <interface> 之间双向转换
+"""
+
+from converters.pve_parser import collect_net_keys, parse_network_config, vcpu_count
+
+# virtio-net 多队列上限
+MAX_QUEUES = 16
+
+# PVE mtu=1 表示继承网桥MTU
+MTU_INHERIT = '1'
+DEFAULT_MTU = 1500
+
+
+def _is_mac(value):
+    return len(value) == 17 and value.count(':') == 5
+
+
+def net_model(net):
+    """返回 parse_network_config 结果中的网卡型号，第一段只有MAC时视为virtio"""
+    model = net.get('model') or 'virtio'
+    if net.get('mac') is None and _is_mac(model):
+        return 'virtio'
+    return model
+
+
+def apply_net_tuning(config_data):
+    """
+    把全局网卡设置展开到每个virtio网卡的参数中：
+    启用 net_multiqueue 时队列数等于vCPU数（最多16），全局 mtu 不是1500时作为巨帧MTU；
+    网卡上已写明的参数优先
+
+    Args:
+        config_data (dict): 配置字典
+
+    Returns:
+        dict: 展开后的配置字典；没有需要展开的参数时返回原字典
+    """
+    options = {}
+    if str(config_data.get('net_multiqueue', '0')) in ('1', 'on', 'true'):
+        queues = min(vcpu_count(config_data), MAX_QUEUES)
+        if queues > 1:
+            options['queues'] = str(queues)
+    mtu = str(config_data.get('mtu') or '').strip()
+    if mtu and mtu != str(DEFAULT_MTU):
+        options['mtu'] = mtu
+    if not options:
+        return config_data
+
+    result = dict(config_data)
+    for key in collect_net_keys(config_data):
+        value = config_data[key]
+        net = parse_network_config(value)
+        if net_model(net) != 'virtio':
+            continue
+        missing = [f"{k}={v}" for k, v in options.items() if k not in net]
+        if missing:
+            result[key] = ','.join([value] + missing)
+    return result
+
+
+def libvirt_net_tuning(net):
+    """
+    把PVE网卡参数转换为Libvirt <interface> 的性能相关元素
+
+    Args:
+        net (dict): parse_network_config 解析得到的网卡参数
+
+    Returns:
+        dict: driver（属性字典）、mtu、bandwidth（KB/s）、link_down
+    """
+    tuning = {'driver': {}, 'mtu': None, 'bandwidth': None, 'link_down': False}
+
+    if net_model(net) == 'virtio':
+        tuning['driver']['name'] = 'vhost'
+        try:
+            queues = int(net.get('queues', 0))
+        except (TypeError, ValueError):
+            queues = 0
+        if queues > 1:
+            tuning['driver']['queues'] = queues
+
+    mtu = str(net.get('mtu') or '')
+    if mtu.isdigit() and mtu != MTU_INHERIT:
+        tuning['mtu'] = int(mtu)
+
+    # PVE rate 单位为 MB/s，Libvirt bandwidth 单位为 KB/s
+    try:
+        rate = float(net.get('rate', 0))
+    except (TypeError, ValueError):
+        rate = 0
+    if rate > 0:
+        tuning['bandwidth'] = int(rate * 1024)
+
+    tuning['link_down'] = str(net.get('link_down', '0')) == '1'
+    return tuning
+
+
+def pve_net_options_from_interface(iface):
+    """
+    把Libvirt <interface>（xmltodict格式）的性能相关元素转换为PVE网卡参数
+
+    Returns:
+        dict: PVE网卡参数
+    """
+    options = {}
+    if not isinstance(iface, dict):
+        return options
+
+    driver = iface.get('driver')
+    if isinstance(driver, dict) and driver.get('@queues'):
+        options['queues'] = driver['@queues']
+
+    mtu = iface.get('mtu')
+    if isinstance(mtu, dict) and mtu.get('@size'):
+        options['mtu'] = mtu['@size']
+
+    bandwidth = iface.get('bandwidth')
+    if isinstance(bandwidth, dict):
+        averages = []
+        for direction in ('inbound', 'outbound'):
+            entry = bandwidth.get(direction)
+            if isinstance(entry, dict) and entry.get('@average'):
+                averages.append(int(entry['@average']))
+        if averages:
+            # PVE只有一个双向限速值，取较大的方向
+            options['rate'] = f"{max(averages) / 1024:g}"
+
+    link = iface.get('link')
+    if isinstance(link, dict) and link.get('@state') == 'down':
+        options['link_down'] = '1'
+    return options
@@ -5,6 +5,15 @@ PVE配置文件解析器
 
 import re
 
+from services.tracing import traced
+
+DISK_KEY_RE = re.compile(r'^(scsi|virtio|sata|ide)(\d+)$')
+NET_KEY_RE = re.compile(r'^net(\d+)$')
+
+# 磁盘排序：先按总线，再按编号
+BUS_ORDER = {'scsi': 0, 'virtio': 1, 'sata': 2, 'ide': 3}
+
+@traced()
 def parse_pve_config(content):
     """
     解析PVE配置文件内容
@@ -120,6 +129,58 @@ def parse_network_config(net_string):
     
     return net_config
 
+def collect_disk_keys(config_dict):
+    """
+    找出配置中所有非空的磁盘键，按总线和编号排序
+    
+    Args:
+        config_dict (dict): 配置字典
+        
+    Returns:
+        list: (key, bus, number) 列表
+    """
+    disks = []
+    for key, value in config_dict.items():
+        match = DISK_KEY_RE.match(key)
+        if match and value:
+            disks.append((key, match.group(1), int(match.group(2))))
+    disks.sort(key=lambda d: (BUS_ORDER[d[1]], d[2]))
+    return disks
+
+def collect_net_keys(config_dict):
+    """
+    找出配置中所有非空的网卡键，按编号排序
+    
+    Args:
+        config_dict (dict): 配置字典
+        
+    Returns:
+        list: 网卡键列表
+    """
+    nets = []
+    for key, value in config_dict.items():
+        match = NET_KEY_RE.match(key)
+        if match and value:
+            nets.append((int(match.group(1)), key))
+    nets.sort()
+    return [key for _, key in nets]
+
+def vcpu_count(config_dict):
+    """
+    计算vCPU数（cores × sockets），无效值按1计算
+    
+    Args:
+        config_dict (dict): 配置字典
+        
+    Returns:
+        int: vCPU数
+    """
+    try:
+        return max(1, int(config_dict.get('cores', 1)) * int(config_dict.get('sockets', 1)))
+    except (TypeError, ValueError):
+        return 1
+
+@traced()
 def generate_pve_config(config_dict):
     """
     根据配置字典生成PVE配置文件内容
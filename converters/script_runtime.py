@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+部署脚本运行时
+所有生成的部署脚本共用的Bash函数：命令行参数（--yes、--dry-run、--json）、日志、
+确认提示、按阶段计时、演练模式下跳过修改操作，以及明确的退出码。
+--json 时标准输出只有JSON Lines事件，命令和提示信息输出到标准错误，便于编排工具并发执行和汇总耗时
+"""
+
+from functools import lru_cache
+
+# 退出码
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = 3
+EXIT_ENVIRONMENT = 4
+
+EXIT_CODES = {
+    EXIT_OK: '成功',
+    EXIT_FAILED: '部署失败',
+    EXIT_USAGE: '参数错误',
+    EXIT_CANCELLED: '已取消或需要确认（使用 --yes）',
+    EXIT_ENVIRONMENT: '环境检查失败（权限、依赖命令）',
+}
+
+_RUNTIME = r'''set -euo pipefail
+
+# 退出码
+EXIT_OK=__EXIT_OK__
+EXIT_FAILED=__EXIT_FAILED__
+EXIT_USAGE=__EXIT_USAGE__
+EXIT_CANCELLED=__EXIT_CANCELLED__
+EXIT_ENVIRONMENT=__EXIT_ENVIRONMENT__
+
+# 命令行参数，默认值由生成时的选项决定
+ASSUME_YES=__ASSUME_YES__
+DRY_RUN=0
+OUTPUT=__OUTPUT__
+
+usage() {
+    cat << USAGE
+用法: $0 [--yes] [--dry-run] [--json|--text]
+  -y, --yes    不询问，需要确认的操作直接执行
+  --dry-run    只输出将要执行的修改操作，不修改宿主机
+  --json       标准输出为JSON Lines进度事件（命令输出转到标准错误）
+  --text       输出带颜色的文本日志
+退出码: 0 成功, 1 部署失败, 2 参数错误, 3 已取消或需要确认, 4 环境检查失败
+USAGE
+}
+
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -y|--yes) ASSUME_YES=1 ;;
+        --dry-run) DRY_RUN=1 ;;
+        --json) OUTPUT=json ;;
+        --text) OUTPUT=text ;;
+        -h|--help) usage; exit $EXIT_OK ;;
+        *) echo "未知参数: $1" >&2; usage >&2; exit $EXIT_USAGE ;;
+    esac
+    shift
+done
+
+# 颜色定义
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+BLUE='\033[0;34m'
+NC='\033[0m' # No Color
+
+# JSON模式下事件写到原标准输出（fd 3），其余输出转到标准错误
+if [ "$OUTPUT" = "json" ]; then
+    exec 3>&1 1>&2
+fi
+
+now_ms() {
+    date +%s%3N
+}
+
+json_escape() {
+    local s=$1
+    s=${s//\\/\\\\}
+    s=${s//\"/\\\"}
+    s=${s//$'\n'/\\n}
+    s=${s//$'\r'/\\r}
+    s=${s//$'\t'/\\t}
+    printf '%s' "$s"
+}
+
+# emit_event 事件类型 [键 值]...，值为纯数字时按数字输出
+emit_event() {
+    [ "$OUTPUT" = "json" ] || return 0
+    local line="{\"ts\":$(now_ms),\"event\":\"$1\",\"target\":\"$(json_escape "$DEPLOY_TARGET")\""
+    shift
+    while [ $# -gt 1 ]; do
+        if [[ "$2" =~ ^-?[0-9]+$ ]]; then
+            line+=",\"$1\":$2"
+        else
+            line+=",\"$1\":\"$(json_escape "$2")\""
+        fi
+        shift 2
+    done
+    echo "$line}" >&3
+}
+
+CURRENT_PHASE=""
+PHASE_EXIT=$EXIT_FAILED
+SCRIPT_START=$(now_ms)
+
+# 日志函数
+log() {
+    if [ "$OUTPUT" = "json" ]; then
+        emit_event log level info phase "$CURRENT_PHASE" message "$*"
+    else
+        echo -e "$(date '+%Y-%m-%d %H:%M:%S') - $*"
+    fi
+}
+
+log_info() {
+    if [ "$OUTPUT" = "json" ]; then
+        emit_event log level info phase "$CURRENT_PHASE" message "$*"
+    else
+        echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${BLUE}INFO${NC}: $*"
+    fi
+}
+
+log_success() {
+    if [ "$OUTPUT" = "json" ]; then
+        emit_event log level success phase "$CURRENT_PHASE" message "$*"
+    else
+        echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${GREEN}SUCCESS${NC}: $*"
+    fi
+}
+
+log_warning() {
+    if [ "$OUTPUT" = "json" ]; then
+        emit_event log level warning phase "$CURRENT_PHASE" message "$*"
+    else
+        echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${YELLOW}WARNING${NC}: $*"
+    fi
+}
+
+# 以指定退出码结束
+fail() {
+    local code=$1
+    shift
+    if [ "$OUTPUT" = "json" ]; then
+        emit_event error phase "$CURRENT_PHASE" message "$*" exit_code "$code"
+    else
+        echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${RED}ERROR${NC}: $*"
+    fi
+    exit "$code"
+}
+
+# 以当前阶段的退出码结束
+log_error() {
+    fail "$PHASE_EXIT" "$@"
+}
+
+# 脚本结束时输出结果事件
+on_exit() {
+    local code=$?
+    local status=ok
+    [ $code -eq 0 ] || status=failed
+    emit_event result status "$status" exit_code "$code" dry_run "$DRY_RUN" \
+        phase "$CURRENT_PHASE" duration_ms $(( $(now_ms) - SCRIPT_START ))
+}
+trap on_exit EXIT
+
+# run_phase 函数名 [失败时的退出码]：执行一个阶段并记录耗时
+run_phase() {
+    local name=$1 start
+    CURRENT_PHASE=$name
+    PHASE_EXIT=${2:-$EXIT_FAILED}
+    start=$(now_ms)
+    emit_event phase_start phase "$name"
+    "$name"
+    emit_event phase_end phase "$name" status ok duration_ms $(( $(now_ms) - start ))
+    CURRENT_PHASE=""
+    PHASE_EXIT=$EXIT_FAILED
+}
+
+# 询问是否继续；--yes 时直接继续，无法交互时以 EXIT_CANCELLED 结束
+confirm() {
+    if [ "$ASSUME_YES" = "1" ]; then
+        return 0
+    fi
+    if [ "$OUTPUT" = "json" ] || [ ! -t 0 ]; then
+        fail $EXIT_CANCELLED "$1 需要确认，请使用 --yes"
+    fi
+    read -p "$1 (y/N): " -n 1 -r
+    echo
+    [[ $REPLY =~ ^[Yy]$ ]] || fail $EXIT_CANCELLED "操作已取消"
+}
+
+# 执行修改宿主机的命令，演练模式下只输出命令
+run() {
+    if [ "$DRY_RUN" = "1" ]; then
+        if [ "$OUTPUT" = "json" ]; then
+            emit_event dry_run phase "$CURRENT_PHASE" command "$*"
+        else
+            echo -e "$(date '+%Y-%m-%d %H:%M:%S') - ${YELLOW}DRY-RUN${NC}: $*"
+        fi
+        return 0
+    fi
+    "$@"
+}
+
+# 磁盘大小转换为字节，不带单位时按GB计算
+to_bytes() {
+    echo "$1" | awk '{
+        n = $0 + 0; u = toupper(substr($0, length($0)))
+        m = (u == "K") ? 1024 : (u == "M") ? 1048576 : (u == "T") ? 1099511627776 : 1073741824
+        printf "%.0f\n", n * m
+    }'
+}
+
+# 把标准输入写入文件，演练模式下只输出文件名
+write_file() {
+    if [ "$DRY_RUN" = "1" ]; then
+        cat > /dev/null
+        run write "$1"
+        return 0
+    fi
+    cat > "$1"
+}'''
+
+
+@lru_cache(maxsize=None)
+def runtime_body(automation=False):
+    """
+    运行时中与部署目标无关的固定部分，同一选项下内容不变（HTTP响应压缩时预先压缩）
+
+    Args:
+        automation (bool): 为True时默认不询问并输出JSON Lines，等同于 --yes --json
+
+    Returns:
+        str: Bash代码
+    """
+    replacements = {
+        '__EXIT_OK__': EXIT_OK,
+        '__EXIT_FAILED__': EXIT_FAILED,
+        '__EXIT_USAGE__': EXIT_USAGE,
+        '__EXIT_CANCELLED__': EXIT_CANCELLED,
+        '__EXIT_ENVIRONMENT__': EXIT_ENVIRONMENT,
+        '__ASSUME_YES__': 1 if automation else 0,
+        '__OUTPUT__': 'json' if automation else 'text',
+    }
+    runtime = _RUNTIME
+    for placeholder, value in replacements.items():
+        runtime = runtime.replace(placeholder, str(value))
+    return runtime
+
+
+def runtime_bodies():
+    """所有选项下的运行时固定部分"""
+    return [runtime_body(False), runtime_body(True)]
+
+
+def render_runtime(target, automation=False):
+    """
+    生成部署脚本的运行时部分
+
+    Args:
+        target (str): 部署目标（虚拟机ID或名称），写入每个JSON事件
+        automation (bool): 为True时默认不询问并输出JSON Lines，等同于 --yes --json
+
+    Returns:
+        str: Bash代码
+    """
+    return f"DEPLOY_TARGET=\"{target}\"\n\n{runtime_body(automation)}"
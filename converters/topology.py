@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+CPU/NUMA拓扑
+根据宿主机布局（JSON或lscpu输出）计算vCPU绑核、模拟器线程绑核、客户机NUMA节点和大页内存，
+同时生成PVE的 affinity/numaN 参数和Libvirt的 <cpu>/<cputune>/<numatune>/<memoryBacking>
+"""
+
+import json
+
+# PVE hugepages 取值（MB）到页大小（KiB）；2048 按 KiB 写法理解为2MiB页
+HUGEPAGE_SIZES_KIB = {'2': 2048, '1024': 1048576, '2048': 2048}
+
+
+class TopologyError(ValueError):
+    """宿主机布局无法解析"""
+
+
+def parse_cpuset(text):
+    """
+    解析CPU列表，如 "0-3,8,10-11"
+
+    Returns:
+        list: 排序去重后的CPU编号
+    """
+    cpus = set()
+    for part in str(text).replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpuset(cpus):
+    """
+    把CPU编号压缩为区间写法：[0, 1, 2, 3, 8] -> "0-3,8"
+    """
+    ranges = []
+    start = prev = None
+    for cpu in sorted(set(cpus)):
+        if prev is not None and cpu == prev + 1:
+            prev = cpu
+            continue
+        if start is not None:
+            ranges.append(f"{start}-{prev}" if prev != start else str(start))
+        start = prev = cpu
+    if start is not None:
+        ranges.append(f"{start}-{prev}" if prev != start else str(start))
+    return ','.join(ranges)
+
+
+class HostTopology:
+    """
+    宿主机CPU/NUMA布局
+
+    Args:
+        cpus (list): 每项为 (cpu, core, socket, node)
+        node_memory (dict): NUMA节点到内存大小（MB），未知时为空
+        node_hugepages (dict): NUMA节点到 {页大小KiB: 空闲页数}，未知时为空
+        reserved_cpus (list): 留给宿主机和模拟器线程的CPU，None表示自动选择
+    """
+
+    def __init__(self, cpus, node_memory=None, node_hugepages=None, reserved_cpus=None):
+        if not cpus:
+            raise TopologyError('宿主机布局中没有CPU')
+
+        self.cpus = sorted(cpus)
+        self.node_memory = dict(node_memory or {})
+        self.node_hugepages = dict(node_hugepages or {})
+
+        # 每个节点内先排每个物理核的第一个线程，再排超线程，绑核时优先占满物理核
+        self.nodes = {}
+        seen_cores = {}
+        for cpu, core, socket, node in self.cpus:
+            thread = seen_cores.get((socket, core), 0)
+            seen_cores[(socket, core)] = thread + 1
+            self.nodes.setdefault(node, []).append((thread, socket, core, cpu))
+        for node in self.nodes:
+            self.nodes[node] = [entry[3] for entry in sorted(self.nodes[node])]
+
+        if reserved_cpus is None:
+            reserved_cpus = self._default_reserved()
+        self.reserved_cpus = sorted(reserved_cpus)
+
+    def _default_reserved(self):
+        """默认保留编号最小的物理核（含超线程），只有一个物理核时不保留"""
+        cores = sorted({(socket, core) for _, core, socket, _ in self.cpus})
+        if len(cores) < 2:
+            return []
+        first = cores[0]
+        return [cpu for cpu, core, socket, _ in self.cpus if (socket, core) == first]
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        从JSON布局创建，支持两种格式：
+
+        - 本项目格式：{"nodes": [{"id": 0, "cpus": [0, 1] 或 [{"cpu": 0, "core": 0}],
+          "memory_mb": 65536, "hugepages": {"2048": 1024}}], "reserved_cpus": "0,1"}
+        - lscpu -J -e 输出：{"cpus": [{"cpu": "0", "node": "0", "socket": "0", "core": "0"}]}
+        """
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError as e:
+                raise TopologyError(f"宿主机布局不是有效的JSON: {e}")
+        if not isinstance(data, dict):
+            raise TopologyError('宿主机布局必须是对象')
+
+        try:
+            if 'nodes' in data:
+                cpus, memory, hugepages = [], {}, {}
+                for index, node in enumerate(data['nodes']):
+                    node_id = int(node.get('id', index))
+                    for entry in node.get('cpus', []):
+                        if isinstance(entry, dict):
+                            cpu = int(entry['cpu'])
+                            core = int(entry.get('core', cpu))
+                            socket = int(entry.get('socket', node_id))
+                        else:
+                            cpu = core = int(entry)
+                            socket = node_id
+                        cpus.append((cpu, core, socket, node_id))
+                    if node.get('memory_mb'):
+                        memory[node_id] = int(node['memory_mb'])
+                    if node.get('hugepages'):
+                        hugepages[node_id] = {int(k): int(v) for k, v in node['hugepages'].items()}
+            elif 'cpus' in data or 'lscpu' in data:
+                cpus = _lscpu_json_cpus(data.get('cpus') or data.get('lscpu'))
+                memory, hugepages = {}, {}
+            else:
+                raise TopologyError('宿主机布局缺少 nodes 或 cpus')
+
+            reserved = data.get('reserved_cpus')
+            if isinstance(reserved, (list, tuple)):
+                reserved = [int(cpu) for cpu in reserved]
+            elif reserved is not None:
+                reserved = parse_cpuset(reserved)
+        except TopologyError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise TopologyError(f"宿主机布局格式错误: {e}")
+
+        return cls(cpus, memory, hugepages, reserved)
+
+    @classmethod
+    def from_lscpu(cls, text):
+        """
+        从lscpu文本输出创建，支持 lscpu -p（可解析格式）和 lscpu -e（表格格式）
+        """
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        header = None
+        rows = []
+
+        if any(line.startswith('#') for line in lines):
+            # lscpu -p：注释行中最后一行是列名，默认为 CPU,Core,Socket,Node,...
+            for line in lines:
+                if line.startswith('#'):
+                    header = [col.strip().lower() for col in line[1:].split(',')]
+                else:
+                    rows.append(line.split(','))
+            if not header or 'cpu' not in header:
+                header = ['cpu', 'core', 'socket', 'node']
+        elif lines:
+            # lscpu -e：第一行是以空格分隔的列名
+            header = [col.lower() for col in lines[0].split()]
+            rows = [line.split() for line in lines[1:]]
+
+        if not header or 'cpu' not in header:
+            raise TopologyError('无法识别的lscpu输出')
+
+        entries = [dict(zip(header, row)) for row in rows]
+        try:
+            cpus = _lscpu_json_cpus(entries)
+        except (KeyError, ValueError) as e:
+            raise TopologyError(f"lscpu输出格式错误: {e}")
+        return cls(cpus)
+
+    @classmethod
+    def load(cls, path):
+        """从文件加载，自动识别JSON和lscpu文本"""
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return cls.parse(content)
+
+    @classmethod
+    def parse(cls, content):
+        """从JSON字符串/对象或lscpu文本创建"""
+        if isinstance(content, dict):
+            return cls.from_json(content)
+        if content.lstrip().startswith('{'):
+            return cls.from_json(content)
+        return cls.from_lscpu(content)
+
+    def to_dict(self):
+        return {
+            'nodes': {node: format_cpuset(cpus) for node, cpus in sorted(self.nodes.items())},
+            'node_memory_mb': self.node_memory,
+            'reserved_cpus': format_cpuset(self.reserved_cpus),
+        }
+
+
+def _lscpu_json_cpus(entries):
+    """把lscpu的每CPU记录转换为 (cpu, core, socket, node)，离线CPU被忽略"""
+    cpus = []
+    for entry in entries or []:
+        entry = {str(k).lower(): v for k, v in entry.items()}
+        if str(entry.get('online', 'yes')).lower() in ('no', 'false'):
+            continue
+        cpu = int(entry['cpu'])
+        node = _int_or_zero(entry.get('node'))
+        socket = _int_or_zero(entry.get('socket'))
+        core = entry.get('core')
+        cpus.append((cpu, cpu if core in (None, '', '-') else int(core), socket, node))
+    return cpus
+
+
+def _int_or_zero(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ('1', 'on', 'true', 'yes')
+
+
+class VmTopology:
+    """
+    虚拟机CPU/NUMA拓扑规划
+
+    客户机每个CPU插槽对应一个NUMA节点；给出宿主机布局且启用绑核时，
+    每个客户机节点尽量放在同一个宿主机节点上，模拟器线程和IO线程绑定到保留CPU
+
+    Args:
+        config_data (dict): 配置字典
+        host (HostTopology): 宿主机布局，为None时不生成绑核
+    """
+
+    def __init__(self, config_data, host=None):
+        self.sockets = max(1, _int_or_zero(config_data.get('sockets', 1)))
+        self.cores = max(1, _int_or_zero(config_data.get('cores', 1)))
+        self.vcpus = self.sockets * self.cores
+        self.memory_mb = _int_or_zero(config_data.get('memory', 2048))
+        self.numa = _truthy(config_data.get('numa', '0'))
+        self.hugepages = str(config_data.get('hugepages') or '')
+        self.hugepage_kib = HUGEPAGE_SIZES_KIB.get(self.hugepages)
+        self.warnings = []
+
+        # 客户机NUMA节点：按插槽划分vCPU，内存平均分配，余数给最后一个节点
+        cell_count = self.sockets if self.numa else 1
+        base_memory = self.memory_mb // cell_count
+        self.cells = []
+        for i in range(cell_count):
+            per_cell = self.vcpus // cell_count
+            memory = base_memory if i < cell_count - 1 else self.memory_mb - base_memory * (cell_count - 1)
+            self.cells.append({
+                'id': i,
+                'vcpus': list(range(i * per_cell, (i + 1) * per_cell)),
+                'memory_mb': memory,
+                'host_nodes': [],
+            })
+
+        if self.hugepage_kib:
+            for cell in self.cells:
+                if (cell['memory_mb'] * 1024) % self.hugepage_kib:
+                    self.warnings.append(f"NUMA节点{cell['id']}的内存不是大页大小的整数倍")
+
+        self.vcpu_pins = {}
+        self.emulator_cpus = []
+        pinning = _truthy(config_data.get('cpu_pinning', '0'))
+        if host is not None and pinning:
+            pool = None
+            if config_data.get('affinity'):
+                # 已手工指定 affinity 时只在其中绑核
+                pool = set(parse_cpuset(config_data['affinity']))
+            self._pin(host, pool)
+
+    def _pin(self, host, pool):
+        reserved = set(host.reserved_cpus)
+        free = {}
+        for node, cpus in host.nodes.items():
+            available = [cpu for cpu in cpus if cpu not in reserved and (pool is None or cpu in pool)]
+            if available:
+                free[node] = available
+        node_memory = dict(host.node_memory)
+
+        if sum(len(cpus) for cpus in free.values()) < self.vcpus:
+            self.warnings.append('宿主机可用CPU不足，未生成绑核')
+            return
+
+        pins = {}
+        used_nodes = set()
+        for cell in self.cells:
+            need = len(cell['vcpus'])
+            # 优先选择能容纳整个节点（CPU和内存）且尚未被本虚拟机使用的宿主机节点
+            candidates = sorted(free, key=lambda n: (len(free[n]) < need,
+                                                     node_memory.get(n, cell['memory_mb']) < cell['memory_mb'],
+                                                     n in used_nodes, n))
+            assigned = []
+            for node in candidates:
+                if len(assigned) == need:
+                    break
+                take = free[node][:need - len(assigned)]
+                if not take:
+                    continue
+                free[node] = free[node][len(take):]
+                assigned.extend(take)
+                cell['host_nodes'].append(node)
+                used_nodes.add(node)
+                if node in node_memory:
+                    node_memory[node] -= cell['memory_mb'] * len(take) // need
+
+            for vcpu, cpu in zip(cell['vcpus'], assigned):
+                pins[vcpu] = cpu
+            if len(cell['host_nodes']) > 1:
+                self.warnings.append(f"NUMA节点{cell['id']}跨越了多个宿主机节点")
+
+            self._check_hugepages(host, cell)
+
+        self.vcpu_pins = pins
+        self.emulator_cpus = list(host.reserved_cpus)
+        # 每台虚拟机都从宿主机的全部空闲CPU开始分配，不记录其他虚拟机已绑定的CPU
+        self.warnings.append('绑核只按本虚拟机计算，未与宿主机上的其他虚拟机协调，多台虚拟机可能绑定到相同的CPU')
+
+    def _check_hugepages(self, host, cell):
+        if not self.hugepage_kib or not host.node_hugepages:
+            return
+        pages = cell['memory_mb'] * 1024 // self.hugepage_kib
+        available = sum(host.node_hugepages.get(node, {}).get(self.hugepage_kib, 0)
+                        for node in cell['host_nodes'])
+        if available < pages:
+            self.warnings.append(f"NUMA节点{cell['id']}所在宿主机节点的空闲大页不足（需要{pages}页）")
+
+    @property
+    def host_nodes(self):
+        nodes = []
+        for cell in self.cells:
+            nodes.extend(n for n in cell['host_nodes'] if n not in nodes)
+        return sorted(nodes)
+
+    def pve_options(self):
+        """
+        生成PVE参数：affinity（PVE只支持整个进程的CPU集合）和每个NUMA节点的 numaN
+
+        Returns:
+            dict: 参数名到值的映射
+        """
+        options = {}
+        if self.vcpu_pins:
+            options['affinity'] = format_cpuset(self.vcpu_pins.values())
+        if self.numa:
+            for cell in self.cells:
+                value = f"cpus={format_cpuset(cell['vcpus'])},memory={cell['memory_mb']}"
+                if cell['host_nodes']:
+                    value += f",hostnodes={format_cpuset(cell['host_nodes'])},policy=bind"
+                options[f"numa{cell['id']}"] = value
+        return options
+
+    def render_cpu(self, mode='host-passthrough', indent='  '):
+        """生成 <cpu> 元素，包含插槽/核心拓扑和客户机NUMA节点"""
+        lines = [f'{indent}<cpu mode="{mode}" check="none">',
+                 f'{indent}  <topology sockets="{self.sockets}" dies="1" cores="{self.cores}" threads="1"/>']
+        if self.numa:
+            lines.append(f'{indent}  <numa>')
+            shared = ' memAccess="shared"' if self.hugepage_kib or self.hugepages == 'any' else ''
+            for cell in self.cells:
+                lines.append(f'{indent}    <cell id="{cell["id"]}" cpus="{format_cpuset(cell["vcpus"])}" '
+                             f'memory="{cell["memory_mb"]}" unit="MiB"{shared}/>')
+            lines.append(f'{indent}  </numa>')
+        lines.append(f'{indent}</cpu>')
+        return '\n'.join(lines)
+
+    def render_cputune(self, iothreads=0, indent='  '):
+        """生成 <cputune>：vCPU、模拟器线程和IO线程绑核，未绑核时返回空字符串"""
+        if not self.vcpu_pins:
+            return ''
+        lines = [f'{indent}<cputune>']
+        for vcpu in sorted(self.vcpu_pins):
+            lines.append(f'{indent}  <vcpupin vcpu="{vcpu}" cpuset="{self.vcpu_pins[vcpu]}"/>')
+        if self.emulator_cpus:
+            emulator = format_cpuset(self.emulator_cpus)
+            lines.append(f'{indent}  <emulatorpin cpuset="{emulator}"/>')
+            for iothread in range(1, iothreads + 1):
+                lines.append(f'{indent}  <iothreadpin iothread="{iothread}" cpuset="{emulator}"/>')
+        lines.append(f'{indent}</cputune>')
+        return '\n'.join(lines)
+
+    def render_numatune(self, indent='  '):
+        """生成 <numatune>，内存严格绑定到vCPU所在的宿主机节点"""
+        if not self.host_nodes:
+            return ''
+        lines = [f'{indent}<numatune>',
+                 f'{indent}  <memory mode="strict" nodeset="{format_cpuset(self.host_nodes)}"/>']
+        if self.numa:
+            for cell in self.cells:
+                lines.append(f'{indent}  <memnode cellid="{cell["id"]}" mode="strict" '
+                             f'nodeset="{format_cpuset(cell["host_nodes"])}"/>')
+        lines.append(f'{indent}</numatune>')
+        return '\n'.join(lines)
+
+    def render_memory_backing(self, indent='  '):
+        """生成 <memoryBacking>，未启用大页时返回空字符串"""
+        if self.hugepage_kib:
+            page = f'<page size="{self.hugepage_kib}" unit="KiB"/>'
+            return (f'{indent}<memoryBacking>\n{indent}  <hugepages>\n{indent}    {page}\n'
+                    f'{indent}  </hugepages>\n{indent}</memoryBacking>')
+        if self.hugepages == 'any':
+            return f'{indent}<memoryBacking>\n{indent}  <hugepages/>\n{indent}</memoryBacking>'
+        return ''
+
+    def to_dict(self):
+        return {
+            'sockets': self.sockets,
+            'cores': self.cores,
+            'vcpus': self.vcpus,
+            'numa': self.numa,
+            'hugepage_kib': self.hugepage_kib,
+            'cells': [dict(cell, vcpus=format_cpuset(cell['vcpus'])) for cell in self.cells],
+            'vcpu_pins': self.vcpu_pins,
+            'emulator_cpus': format_cpuset(self.emulator_cpus),
+            'host_nodes': self.host_nodes,
+            'warnings': self.warnings,
+        }
+
+
+def pve_options_from_domain(domain):
+    """
+    从Libvirt domain（xmltodict格式）中提取插槽/核心、NUMA、大页和绑核设置
+
+    Returns:
+        dict: PVE参数
+    """
+    options = {}
+    cpu = domain.get('cpu')
+    if isinstance(cpu, dict):
+        topology = cpu.get('topology')
+        if isinstance(topology, dict):
+            if topology.get('@sockets'):
+                options['sockets'] = topology['@sockets']
+            if topology.get('@cores'):
+                options['cores'] = topology['@cores']
+
+        numa = cpu.get('numa')
+        if isinstance(numa, dict):
+            cells = numa.get('cell', [])
+            if not isinstance(cells, list):
+                cells = [cells]
+            if cells:
+                options['numa'] = '1'
+            for i, cell in enumerate(cells):
+                if isinstance(cell, dict):
+                    memory = _int_or_zero(cell.get('@memory'))
+                    if cell.get('@unit', 'KiB') in ('KiB', 'k', 'K'):
+                        memory //= 1024
+                    elif cell.get('@unit') in ('GiB', 'G'):
+                        memory *= 1024
+                    options[f"numa{cell.get('@id', i)}"] = f"cpus={cell.get('@cpus', '')},memory={memory}"
+
+    backing = domain.get('memoryBacking')
+    if isinstance(backing, dict) and 'hugepages' in backing:
+        options['hugepages'] = 'any'
+        page = (backing.get('hugepages') or {}).get('page') if isinstance(backing.get('hugepages'), dict) else None
+        if isinstance(page, list):
+            page = page[0]
+        if isinstance(page, dict):
+            size = _int_or_zero(page.get('@size'))
+            if page.get('@unit', 'KiB') in ('M', 'MiB'):
+                size *= 1024
+            elif page.get('@unit') in ('G', 'GiB'):
+                size *= 1024 * 1024
+            options['hugepages'] = {2048: '2', 1048576: '1024'}.get(size, 'any')
+
+    cputune = domain.get('cputune')
+    if isinstance(cputune, dict):
+        pins = cputune.get('vcpupin', [])
+        if not isinstance(pins, list):
+            pins = [pins]
+        cpus = []
+        for pin in pins:
+            if isinstance(pin, dict) and pin.get('@cpuset'):
+                cpus.extend(parse_cpuset(pin['@cpuset']))
+        if cpus:
+            options['affinity'] = format_cpuset(cpus)
+    return options
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+配置校验器
+根据配置选项定义中的 type、min、max、options、required 生成逐字段校验函数，
+一次遍历返回所有错误。
+下拉选项只列出常用值，PVE支持的其他值（如 cpu: x86-64-v2-AES、machine: pc-q35-8.1）原样写入配置，
+只作为警告；仅用于生成的选项（定义中 pve 为 False，取值由生成函数解析）不在可选值中时才是错误
+"""
+
+from converters.pve_parser import DISK_KEY_RE
+
+CHECKBOX_VALUES = ('0', '1', 'on', 'off', 'true', 'false', 'yes', 'no')
+
+# hotplug 为 0/1 或以逗号分隔的设备类型，如 network,disk,usb
+HOTPLUG_DEVICES = ('network', 'disk', 'cpu', 'memory', 'usb', 'cloudinit')
+
+# PVE支持的磁盘编号上限：ide0-3、sata0-5、scsi0-30、virtio0-15
+DISK_SLOT_LIMITS = {'ide': 3, 'sata': 5, 'scsi': 30, 'virtio': 15}
+
+
+class ConfigValidationError(ValueError):
+    """
+    配置校验失败
+
+    Args:
+        errors (list): 错误列表，每项包含 key、label、message
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f"{e['key']}: {e['message']}" for e in errors))
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and value.strip() == '')
+
+
+def _number_checker(opt):
+    minimum = opt.get('min')
+    maximum = opt.get('max')
+
+    def check(value):
+        if isinstance(value, bool):
+            return '必须是整数'
+        try:
+            number = int(str(value).strip())
+        except ValueError:
+            return '必须是整数'
+        if minimum is not None and number < minimum:
+            return f"不能小于 {minimum}"
+        if maximum is not None and number > maximum:
+            return f"不能大于 {maximum}"
+        return None
+    return check
+
+
+def _is_strict(opt):
+    # 仅用于生成的选项
+    return opt.get('pve', True) is False
+
+
+def _select_checker(opt):
+    allowed = frozenset(str(o) for o in opt.get('options', []))
+
+    def check(value):
+        # PVE允许在基础值后追加参数，如 cpu: host,flags=+aes
+        base = str(value).split(',', 1)[0].strip()
+        if base not in allowed:
+            if _is_strict(opt):
+                return f"不支持的值 '{base}'，可选值: {', '.join(o for o in opt['options'] if o)}"
+            return f"'{base}' 不在常用值中，将原样写入配置"
+        return None
+    return check
+
+
+def _checkbox_checker(opt):
+    def check(value):
+        if isinstance(value, bool) or value in (0, 1):
+            return None
+        if str(value).strip().lower() not in CHECKBOX_VALUES:
+            return '必须是 0/1 或 on/off'
+        return None
+    return check
+
+
+def _agent_checker(opt):
+    # PVE属性串：[enabled=]0|1 之后可追加 key=value，如 1,fstrim_cloned_disks=1
+    def check(value):
+        if isinstance(value, bool) or value in (0, 1):
+            return None
+        items = str(value).split(',')
+        enabled = items[0].strip().lower()
+        if enabled.startswith('enabled='):
+            enabled = enabled[len('enabled='):]
+        if enabled not in CHECKBOX_VALUES or any('=' not in item for item in items[1:]):
+            return '必须是 0/1，可追加 key=value 参数，如 1,fstrim_cloned_disks=1'
+        return None
+    return check
+
+
+def _hotplug_checker(opt):
+    def check(value):
+        if isinstance(value, bool) or value in (0, 1):
+            return None
+        text = str(value).strip().lower()
+        if text in CHECKBOX_VALUES:
+            return None
+        if any(item.strip() not in HOTPLUG_DEVICES for item in text.split(',')):
+            return f"必须是 0/1 或以逗号分隔的 {', '.join(HOTPLUG_DEVICES)}"
+        return None
+    return check
+
+
+def _text_checker(opt):
+    def check(value):
+        if not isinstance(value, (str, int, float)):
+            return '必须是字符串'
+        return None
+    return check
+
+
+CHECKER_FACTORIES = {
+    'number': _number_checker,
+    'select': _select_checker,
+    'checkbox': _checkbox_checker,
+    'text': _text_checker,
+    'textarea': _text_checker,
+}
+
+# 取值为PVE属性串或列表的字段，按键名使用专门的检查
+KEY_CHECKER_FACTORIES = {
+    'agent': _agent_checker,
+    'hotplug': _hotplug_checker,
+}
+
+
+class ConfigValidator:
+    """
+    由配置选项定义编译得到的校验器
+
+    Args:
+        sections (dict): 配置分节定义，格式同 PVE_CONFIG_SECTIONS
+    """
+
+    def __init__(self, sections):
+        self.fields = {}
+        for section_key, section in sections.items():
+            for opt in section['options']:
+                # 同名选项以第一次出现的定义为准（如基本设置中的 memory）
+                if opt['key'] in self.fields:
+                    continue
+                factory = KEY_CHECKER_FACTORIES.get(opt['key']) or CHECKER_FACTORIES.get(opt['type'], _text_checker)
+                self.fields[opt['key']] = (
+                    factory(opt),
+                    opt.get('label', opt['key']),
+                    section_key,
+                    bool(opt.get('required')),
+                    # PVE下拉选项不在可选值中时只是警告
+                    opt['type'] != 'select' or _is_strict(opt),
+                )
+
+    def validate(self, config_data, warnings=None):
+        """
+        校验配置字典，未定义的键（自定义字段）不做检查
+
+        Args:
+            config_data (dict): 配置字典
+            warnings (list): 可选，不影响生成的问题（如下拉选项的非常用值）追加到该列表
+
+        Returns:
+            list: 错误列表，为空表示校验通过
+        """
+        if not isinstance(config_data, dict):
+            return [{'key': '', 'label': '', 'section': '', 'message': '配置必须是对象'}]
+
+        errors = []
+        fields = self.fields
+        for key, value in config_data.items():
+            # 磁盘键（如 ide4）大多不在选项定义中，编号超出范围时无法生成
+            match = DISK_KEY_RE.match(key)
+            if match and not _is_empty(value) and int(match.group(2)) > DISK_SLOT_LIMITS[match.group(1)]:
+                errors.append({'key': key, 'label': key, 'section': 'disks',
+                               'message': f"{match.group(1)} 设备编号必须在 0~{DISK_SLOT_LIMITS[match.group(1)]} 之间"})
+                continue
+
+            field = fields.get(key)
+            if field is None:
+                continue
+
+            checker, label, section, required, blocking = field
+            if _is_empty(value):
+                if required:
+                    errors.append({'key': key, 'label': label, 'section': section,
+                                   'message': '不能为空'})
+                continue
+
+            message = checker(value)
+            if message and blocking:
+                errors.append({'key': key, 'label': label, 'section': section,
+                               'message': message})
+            elif message and warnings is not None:
+                warnings.append({'key': key, 'label': label, 'section': section,
+                                 'message': message})
+        return errors
+
+    def validate_many(self, configs):
+        """
+        批量校验
+
+        Args:
+            configs (list): 配置字典列表
+
+        Returns:
+            dict: 序号到错误列表的映射，只包含校验失败的配置
+        """
+        failures = {}
+        for index, config_data in enumerate(configs):
+            errors = self.validate(config_data)
+            if errors:
+                failures[index] = errors
+        return failures
+
+    def check(self, config_data):
+        """校验失败时抛出 ConfigValidationError"""
+        errors = self.validate(config_data)
+        if errors:
+            raise ConfigValidationError(errors)
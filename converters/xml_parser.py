@@ -7,6 +7,12 @@ import xml.etree.ElementTree as ET
 import xmltodict
 import re
 
+from converters.disk_profiles import apply_disk_profile, libvirt_driver_attrs, pve_options_from_driver
+from converters.net_tuning import apply_net_tuning, libvirt_net_tuning, pve_net_options_from_interface
+from converters.pve_parser import collect_net_keys, parse_network_config
+from services.tracing import traced
+
+@traced()
 def parse_libvirt_xml(content):
     """
     解析Libvirt XML配置文件
@@ -160,7 +166,6 @@ def parse_disk_device(disk, config, index):
         driver = disk.get('driver', {})
         if isinstance(driver, dict):
             driver_type = driver.get('@type', '')
-            driver_cache = driver.get('@cache', '')
         
         # 构建配置字符串
         config_str = source_file
@@ -169,9 +174,9 @@ def parse_disk_device(disk, config, index):
         if driver_type:
             config_str += f",format={driver_type}"
         
-        # 添加缓存
-        if driver_cache:
-            config_str += f",cache={driver_cache}"
+        # 添加缓存、aio、discard、iothread
+        for opt_key, opt_value in pve_options_from_driver(driver, target).items():
+            config_str += f",{opt_key}={opt_value}"
         
         # 根据设备类型设置不同的key
         if 'vda' in target_dev or 'vdb' in target_dev:
@@ -221,8 +226,13 @@ def parse_network_device(iface, config, index):
     if iface.get('filterref'):
         config_str += ",firewall=1"
     
+    # 多队列、MTU、限速、链路状态
+    for opt_key, opt_value in pve_net_options_from_interface(iface).items():
+        config_str += f",{opt_key}={opt_value}"
+    
     config[f"net{index}"] = config_str
 
+@traced()
 def generate_libvirt_xml(config_dict):
     """
     根据配置字典生成Libvirt XML配置文件
@@ -233,6 +243,8 @@ def generate_libvirt_xml(config_dict):
     Returns:
         str: Libvirt XML配置文件内容
     """
+    config_dict = apply_net_tuning(apply_disk_profile(config_dict))
+    
     # 创建根元素
     root = ET.Element('domain')
     root.set('type', 'kvm')
@@ -339,13 +351,11 @@ def parse_disk_configs(config_dict, devices):
         driver = ET.SubElement(disk, 'driver')
         driver.set('name', 'qemu')
         
-        # 检测格式
-        for part in parts[1:]:
-            if part.startswith('format='):
-                driver.set('type', part.split('=')[1])
-                break
-        else:
-            driver.set('type', 'qcow2')
+        # 检测格式及性能参数
+        options = dict(part.split('=', 1) for part in parts[1:] if '=' in part)
+        driver.set('type', options.get('format') or config_dict.get('disk_format') or 'qcow2')
+        for attr, attr_value in libvirt_driver_attrs(options).items():
+            driver.set(attr, attr_value)
         
         # 目标设备
         target = ET.SubElement(disk, 'target')
@@ -369,10 +379,7 @@ def parse_network_configs(config_dict, devices):
         devices (ET.Element): 设备元素
     """
     # 扫描网络配置
-    net_configs = []
-    for key, value in config_dict.items():
-        if key.startswith('net') and value:
-            net_configs.append((key, value))
+    net_configs = [(key, config_dict[key]) for key in collect_net_keys(config_dict)]
     
     # 添加网络设备
     for i, (key, config_str) in enumerate(net_configs):
@@ -410,6 +417,21 @@ def parse_network_configs(config_dict, devices):
         model_elem = ET.SubElement(interface, 'model')
         model_elem.set('type', model)
         
+        # 多队列、vhost、MTU、限速、链路状态
+        tuning = libvirt_net_tuning(parse_network_config(config_str))
+        if tuning['driver']:
+            driver = ET.SubElement(interface, 'driver')
+            for attr, attr_value in tuning['driver'].items():
+                driver.set(attr, str(attr_value))
+        if tuning['mtu']:
+            ET.SubElement(interface, 'mtu').set('size', str(tuning['mtu']))
+        if tuning['bandwidth']:
+            bandwidth = ET.SubElement(interface, 'bandwidth')
+            for direction in ('inbound', 'outbound'):
+                ET.SubElement(bandwidth, direction).set('average', str(tuning['bandwidth']))
+        if tuning['link_down']:
+            ET.SubElement(interface, 'link').set('state', 'down')
+        
         # 防火墙
         for part in parts[1:]:
             if part == 'firewall=1':
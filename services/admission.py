@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+准入控制
+按路由限制同时处理的请求数和排队数，保护CPU密集的接口：
+- 超过路由并发数的请求排队等待，队列已满时立即返回429，排队超时返回503，均带 Retry-After
+- 全局同时处理的请求数有上限，其中批量请求（导入、生成、批量导出等）最多占用一部分，
+  其余留给交互请求；有空位时优先放行排队的交互请求（如预览）
+- 批量请求在逐项生成之间调用 pause，有交互请求正在处理或排队时暂停，把CPU（GIL）让给交互请求，
+  批量任务运行时编辑器延迟保持平稳
+"""
+
+import itertools
+import math
+import threading
+import time
+
+# 优先级，数值小的先放行
+INTERACTIVE = 0
+BATCH = 1
+
+PRIORITIES = {'interactive': INTERACTIVE, 'batch': BATCH}
+
+# 估算 Retry-After 时处理耗时的平滑系数
+EWMA_ALPHA = 0.2
+
+# 批量请求每次暂停的最长秒数，交互请求持续不断时批量请求仍能推进
+PAUSE_MAX = 0.1
+
+
+class AdmissionRejected(Exception):
+    """
+    请求未被放行
+
+    Args:
+        message (str): 错误信息
+        status (int): HTTP状态码（429或503）
+        retry_after (int): 建议的重试等待秒数
+    """
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RouteLimit:
+    """
+    单个路由的限制
+
+    Args:
+        priority (str): interactive 或 batch
+        concurrency (int): 同时处理的最大请求数
+        queue (int): 最大排队数，0为不排队
+        timeout (float): 最长排队秒数
+        methods (tuple): 受限制的请求方法
+    """
+
+    def __init__(self, priority='interactive', concurrency=8, queue=64, timeout=10.0,
+                 methods=('POST', 'PUT')):
+        if priority not in PRIORITIES:
+            raise ValueError(f"优先级必须是 {', '.join(PRIORITIES)} 之一")
+        self.priority = PRIORITIES[priority]
+        self.concurrency = max(1, int(concurrency))
+        self.queue = max(0, int(queue))
+        self.timeout = float(timeout)
+        self.methods = tuple(methods)
+
+
+class _RouteState:
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.paused = 0.0  # 批量请求累计暂停秒数
+        self.duration = 0.0  # 处理耗时的指数加权平均（秒）
+
+
+class Ticket:
+    """放行凭证，处理结束后交给 release"""
+
+    def __init__(self, route, started):
+        self.route = route
+        self.started = started
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    Args:
+        limits (dict): 路由（Flask endpoint）到 RouteLimit 的映射，未列出的路由不受限制
+        max_active (int): 全局同时处理的最大请求数
+        max_batch (int): 其中批量请求最多占用的数量
+    """
+
+    def __init__(self, limits, max_active=8, max_batch=1):
+        self.max_active = max(1, int(max_active))
+        self.max_batch = max(1, min(int(max_batch), self.max_active))
+        self._routes = {route: _RouteState(limit) for route, limit in limits.items()}
+        self._cond = threading.Condition()
+        self._active = 0
+        self._batch_active = 0
+        self._waiters = []  # (优先级, 序号, 路由)
+        self._sequence = itertools.count()
+
+    def limited(self, route, method):
+        """路由和请求方法是否受限制"""
+        state = self._routes.get(route)
+        return state is not None and method in state.limit.methods
+
+    def acquire(self, route):
+        """
+        等待放行
+
+        Returns:
+            Ticket: 放行凭证
+
+        Raises:
+            AdmissionRejected: 队列已满（429）或排队超时（503）
+        """
+        state = self._routes[route]
+        limit = state.limit
+        with self._cond:
+            # 没有同等或更高优先级的等待者可以放行时直接处理
+            ahead = self._next_runnable()
+            if self._can_run(state) and (ahead is None or ahead[0] > limit.priority):
+                return self._start(route, state)
+
+            if state.waiting >= limit.queue:
+                state.rejected += 1
+                raise AdmissionRejected('服务器繁忙，请稍后重试', 429, self._retry_after(state))
+
+            entry = (limit.priority, next(self._sequence), route)
+            self._waiters.append(entry)
+            state.waiting += 1
+            deadline = time.monotonic() + limit.timeout
+            try:
+                while self._next_runnable() != entry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.timed_out += 1
+                        raise AdmissionRejected('排队超时，请稍后重试', 503, self._retry_after(state))
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(entry)
+                state.waiting -= 1
+                # 队首变化后其他等待者可能可以放行
+                self._cond.notify_all()
+            return self._start(route, state)
+
+    def pause(self, ticket, max_wait=PAUSE_MAX):
+        """批量请求在逐项处理之间调用：有交互请求正在处理或排队时等待其结束，最多 max_wait 秒"""
+        state = self._routes[ticket.route]
+        if state.limit.priority != BATCH:
+            return
+        with self._cond:
+            if not self._interactive_busy():
+                return
+            start = time.monotonic()
+            deadline = start + max_wait
+            while self._interactive_busy():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            state.paused += time.monotonic() - start
+
+    def release(self, ticket):
+        """处理结束，释放名额"""
+        state = self._routes[ticket.route]
+        elapsed = time.monotonic() - ticket.started
+        with self._cond:
+            state.active -= 1
+            self._active -= 1
+            if state.limit.priority == BATCH:
+                self._batch_active -= 1
+            state.duration = elapsed if not state.duration else \
+                EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * state.duration
+            self._cond.notify_all()
+
+    def stats(self):
+        """各路由的当前处理数、排队数和累计放行、拒绝、超时数"""
+        with self._cond:
+            return {
+                'active': self._active,
+                'max_active': self.max_active,
+                'batch_active': self._batch_active,
+                'max_batch': self.max_batch,
+                'routes': {
+                    route: {
+                        'priority': 'batch' if state.limit.priority == BATCH else 'interactive',
+                        'concurrency': state.limit.concurrency,
+                        'queue': state.limit.queue,
+                        'active': state.active,
+                        'waiting': state.waiting,
+                        'admitted': state.admitted,
+                        'rejected': state.rejected,
+                        'timed_out': state.timed_out,
+                        'paused_s': round(state.paused, 3),
+                        'avg_ms': round(state.duration * 1000, 2),
+                    }
+                    for route, state in self._routes.items()
+                },
+            }
+
+    def _can_run(self, state):
+        if state.active >= state.limit.concurrency or self._active >= self.max_active:
+            return False
+        return state.limit.priority != BATCH or self._batch_active < self.max_batch
+
+    def _interactive_busy(self):
+        return self._active > self._batch_active or any(entry[0] == INTERACTIVE for entry in self._waiters)
+
+    def _next_runnable(self):
+        """按优先级和到达顺序，第一个现在可以放行的等待者"""
+        for entry in sorted(self._waiters):
+            if self._can_run(self._routes[entry[2]]):
+                return entry
+        return None
+
+    def _start(self, route, state):
+        state.active += 1
+        state.admitted += 1
+        self._active += 1
+        if state.limit.priority == BATCH:
+            self._batch_active += 1
+        return Ticket(route, time.monotonic())
+
+    def _retry_after(self, state):
+        """按平均处理耗时估算排在队尾的请求需要等待的秒数"""
+        if not state.duration:
+            return 1
+        wait = state.duration * (state.waiting + state.active + 1) / state.limit.concurrency
+        return max(1, min(60, math.ceil(wait)))
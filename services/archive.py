@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+流式归档导出
+边生成边把文件写入 tar.gz / tar.zst / zip 归档并分块输出，不使用临时文件，
+内存占用只与单个文件、输出块大小和清单项数有关；归档末尾附带带SHA-256校验和的清单
+"""
+
+import hashlib
+import io
+import json
+import tarfile
+import time
+import zipfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # tar.zst 为可选格式
+    zstandard = None
+
+ARCHIVE_FORMATS = {
+    'tar.gz': 'application/gzip',
+    'tar.zst': 'application/zstd',
+    'zip': 'application/zip',
+}
+
+MANIFEST_NAME = 'MANIFEST.json'
+
+# 累计到该大小再输出一块，避免产生大量很小的块
+CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveError(ValueError):
+    """不支持的归档格式"""
+
+
+class _Sink:
+    """只写的缓冲区，归档库写入的数据由生成器分块取走"""
+
+    def __init__(self):
+        self._chunks = []
+        self.pending = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self.pending += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.pending = 0
+        return data
+
+
+class _CompressingSink(_Sink):
+    """写入时压缩（gzip或zstd）"""
+
+    def __init__(self, compressor):
+        super().__init__()
+        self._compressor = compressor
+
+    def write(self, data):
+        if data:
+            super().write(self._compressor.compress(bytes(data)))
+        return len(data)
+
+    def finish(self):
+        super().write(self._compressor.flush())
+
+
+def check_format(archive_format):
+    """检查归档格式是否可用"""
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ArchiveError(f"不支持的归档格式，可选: {', '.join(ARCHIVE_FORMATS)}")
+    if archive_format == 'tar.zst' and zstandard is None:
+        raise ArchiveError('服务器未安装 zstandard，无法导出 tar.zst')
+
+
+class ArchiveWriter:
+    """
+    流式归档写入器
+
+    Args:
+        archive_format (str): tar.gz、tar.zst 或 zip
+        compresslevel (int): 压缩级别
+    """
+
+    def __init__(self, archive_format, compresslevel=6):
+        check_format(archive_format)
+        self.archive_format = archive_format
+        self.entries = []
+        self.mtime = time.time()
+
+        if archive_format == 'zip':
+            self._sink = _Sink()
+            self._zip = zipfile.ZipFile(self._sink, 'w', zipfile.ZIP_DEFLATED,
+                                        compresslevel=compresslevel)
+            self._tar = None
+        else:
+            if archive_format == 'tar.gz':
+                # wbits=31 输出带gzip头的数据
+                compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+            else:
+                compressor = zstandard.ZstdCompressor(level=min(compresslevel, 19)).compressobj()
+            self._sink = _CompressingSink(compressor)
+            self._tar = tarfile.open(fileobj=self._sink, mode='w|', format=tarfile.PAX_FORMAT)
+            self._zip = None
+
+    def add(self, path, data):
+        """
+        写入一个文件
+
+        Args:
+            path (str): 归档内路径
+            data (bytes|str): 文件内容
+
+        Returns:
+            bytes: 可以输出的数据，可能为空
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        mode = 0o755 if path.endswith('.sh') else 0o644
+
+        if self._zip is not None:
+            info = zipfile.ZipInfo(path, time.localtime(self.mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0o100000 | mode) << 16
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mtime = int(self.mtime)
+            info.mode = mode
+            self._tar.addfile(info, io.BytesIO(data))
+            # 流式写入时不需要保留已写入成员的信息
+            self._tar.members.clear()
+
+        # 清单项用元组保存，一万台虚拟机的清单也只占几MB
+        self.entries.append((path, len(data), hashlib.sha256(data).hexdigest()))
+        if self._sink.pending >= CHUNK_SIZE:
+            return self._sink.drain()
+        return b''
+
+    def close(self, manifest_info=None):
+        """
+        写入清单并结束归档
+
+        Args:
+            manifest_info (dict): 附加到清单中的信息，如生成失败的项
+
+        Returns:
+            bytes: 剩余的全部数据
+        """
+        manifest = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.mtime)),
+            'format': self.archive_format,
+        }
+        manifest.update(manifest_info or {})
+        # 每个文件一行，不为整个列表构造字典
+        files = ',\n'.join(json.dumps({'path': path, 'size': size, 'sha256': digest}, ensure_ascii=False)
+                           for path, size, digest in self.entries)
+        data = (json.dumps(manifest, ensure_ascii=False)[:-1]
+                + f', "files": [\n{files}\n]}}\n').encode('utf-8')
+
+        # 清单不计入自身的文件列表
+        head = self.add(MANIFEST_NAME, data)
+        self.entries.pop()
+
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+            self._sink.finish()
+        return head + self._sink.drain()
+
+
+def stream_archive(files, archive_format, manifest_info=None, compresslevel=6):
+    """
+    把 (路径, 内容) 逐个写入归档并分块输出
+
+    Args:
+        files (iterable): 产生 (path, data) 的可迭代对象，可以是边生成边产出的生成器
+        archive_format (str): tar.gz、tar.zst 或 zip
+        manifest_info (dict): 附加到清单中的信息，迭代过程中可以继续修改
+
+    Yields:
+        bytes: 归档数据块
+    """
+    writer = ArchiveWriter(archive_format, compresslevel)
+    for path, data in files:
+        chunk = writer.add(path, data)
+        if chunk:
+            yield chunk
+    yield writer.close(manifest_info)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+HTTP压缩
+按 Accept-Encoding 协商 zstd/br/gzip 压缩超过阈值的文本类响应，并解压带 Content-Encoding 的请求体。
+部署脚本中固定不变的运行时部分预先压缩为字节对齐的deflate块，gzip响应只压缩其余部分再拼接；
+zstd整体压缩本身已足够快，brotli不支持拼接，二者都整体压缩
+"""
+
+import struct
+import tempfile
+import zlib
+
+try:
+    import brotli
+except ImportError:  # br 为可选编码
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选编码
+    zstandard = None
+
+# 客户端给出相同权重时按此顺序选择
+ENCODINGS = ('zstd', 'br', 'gzip')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/xml', 'application/x-shellscript',
+                      'application/javascript')
+
+DEFAULT_MIN_SIZE = 1024
+
+# 每次压缩的级别（兼顾速度）和预先压缩固定文本块时的级别
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+STATIC_GZIP_LEVEL = 9
+
+# send_file 直传的响应不超过该大小时才读入内存压缩
+MAX_PASSTHROUGH_SIZE = 8 * 1024 * 1024
+
+# 解压请求体时每次处理的数据量，解压结果超过该大小后转存到临时文件
+READ_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024
+DECOMPRESS_SLICE = 256
+
+# gzip头：无文件名、mtime为0、操作系统未知
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# 空的最后一个deflate块（固定Huffman，只有结束符）
+_DEFLATE_END = b'\x03\x00'
+
+
+class DecompressionError(ValueError):
+    """
+    请求体无法解压
+
+    Args:
+        message (str): 错误信息
+        status (int): HTTP状态码
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def available_encodings():
+    """服务器支持的压缩编码，按优先顺序"""
+    return tuple(encoding for encoding in ENCODINGS
+                 if (encoding != 'br' or brotli is not None) and (encoding != 'zstd' or zstandard is not None))
+
+
+def negotiate(accept_encoding):
+    """
+    根据 Accept-Encoding 选择压缩编码
+
+    Returns:
+        str: 编码名称，客户端不接受任何可用编码时为None
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights['gzip' if name == 'x-gzip' else name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def etag_variants(etag):
+    """同一内容各压缩编码下的ETag（未压缩的在前）"""
+    return [etag] + [f"{etag}-{encoding}" for encoding in ENCODINGS]
+
+
+def _deflate_segment(data, level):
+    # 独立的压缩器，以字节对齐的完全刷新结束，可以与其他段直接拼接
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+
+class StaticBlocks:
+    """
+    预先压缩（deflate）的固定文本块
+
+    Args:
+        blocks (iterable): 固定文本（str）
+    """
+
+    def __init__(self, blocks):
+        self.blocks = []
+        for block in blocks:
+            data = block.encode('utf-8')
+            self.blocks.append((data, _deflate_segment(data, STATIC_GZIP_LEVEL)))
+
+    def split(self, data):
+        """
+        把数据按固定文本块切分
+
+        Returns:
+            list: (数据, 预先压缩的结果或None)
+        """
+        segments = []
+        start = 0
+        while self.blocks:
+            found = None
+            for block, compressed in self.blocks:
+                index = data.find(block, start)
+                if index >= 0 and (found is None or index < found[0]):
+                    found = (index, block, compressed)
+            if found is None:
+                break
+            index, block, compressed = found
+            if index > start:
+                segments.append((data[start:index], None))
+            segments.append((block, compressed))
+            start = index + len(block)
+        if start < len(data):
+            segments.append((data[start:], None))
+        return segments
+
+
+def compress(data, encoding, static_blocks=None):
+    """
+    压缩数据，gzip编码时拼接固定文本块预先压缩的结果
+
+    Args:
+        data (bytes): 原始数据
+        encoding (str): zstd、br 或 gzip
+        static_blocks (StaticBlocks): 预先压缩的固定文本块
+
+    Returns:
+        bytes: 压缩后的数据
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    if encoding == 'gzip':
+        segments = static_blocks.split(data) if static_blocks is not None else [(data, None)]
+        parts = [_GZIP_HEADER]
+        crc = 0
+        for segment, compressed in segments:
+            crc = zlib.crc32(segment, crc)
+            parts.append(compressed or _deflate_segment(segment, GZIP_LEVEL))
+        parts.append(_DEFLATE_END)
+        parts.append(struct.pack('<II', crc & 0xffffffff, len(data) & 0xffffffff))
+        return b''.join(parts)
+
+    raise ValueError(f"不支持的压缩编码: {encoding}")
+
+
+def compress_response(response, accept_encoding, min_size=DEFAULT_MIN_SIZE, static_blocks=None):
+    """
+    按协商结果压缩响应，压缩后的ETag加上编码后缀
+
+    只处理状态200、文本类型、未压缩且不是流式输出的响应；send_file 直传的小文件读入内存后压缩
+
+    Args:
+        response: Flask响应
+        accept_encoding (str): 请求头 Accept-Encoding
+        min_size (int): 小于该字节数的响应不压缩
+        static_blocks (StaticBlocks): 预先压缩的固定文本块
+
+    Returns:
+        响应对象
+    """
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    if not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if response.direct_passthrough:
+        if response.content_length is None or response.content_length > MAX_PASSTHROUGH_SIZE:
+            return response
+        response.direct_passthrough = False
+    elif response.is_streamed:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    response.set_data(compress(data, encoding, static_blocks))
+    response.headers['Content-Encoding'] = encoding
+    # 压缩后的内容不支持按原始内容的字节范围请求
+    response.headers.pop('Accept-Ranges', None)
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def _sliced(process):
+    # brotli、zstd 的解压接口不能限制输出大小，分小块输入，超过限制后不再继续
+    def feed(data, limit):
+        output = b''
+        for start in range(0, len(data), DECOMPRESS_SLICE):
+            output += process(data[start:start + DECOMPRESS_SLICE])
+            if len(output) > limit:
+                break
+        return output
+    return feed
+
+
+def _decompressor(encoding):
+    """返回 feed(数据, 最大输出) -> 输出 的解压函数"""
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        # wbits=47 自动识别gzip和zlib格式
+        decompressor = zlib.decompressobj(47)
+
+        def feed(data, limit):
+            output = decompressor.decompress(data, limit)
+            while decompressor.unconsumed_tail and len(output) <= limit:
+                output += decompressor.decompress(decompressor.unconsumed_tail, limit)
+            return output
+        return feed
+
+    if encoding == 'br' and brotli is not None:
+        return _sliced(brotli.Decompressor().process)
+
+    if encoding == 'zstd' and zstandard is not None:
+        return _sliced(zstandard.ZstdDecompressor().decompressobj(read_across_frames=True).decompress)
+
+    return None
+
+
+def decompress_stream(stream, encoding, content_length, max_size):
+    """
+    边读边解压请求体
+
+    Args:
+        stream: 请求体输入流
+        encoding (str): Content-Encoding
+        content_length (int): 压缩数据长度，未知时为None
+        max_size (int): 解压后允许的最大字节数，None为不限制
+
+    Returns:
+        tuple: (解压后的文件对象, 字节数)
+
+    Raises:
+        DecompressionError: 不支持的编码、数据损坏或超过大小限制
+    """
+    feed = _decompressor(encoding)
+    if feed is None:
+        raise DecompressionError(f"不支持的请求体编码: {encoding}", 415)
+
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    size = 0
+    remaining = content_length
+    limit = (max_size or (1 << 62)) + 1
+    try:
+        while remaining is None or remaining > 0:
+            chunk = stream.read(READ_SIZE if remaining is None else min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            try:
+                output = feed(chunk, limit - size)
+            except Exception as e:
+                raise DecompressionError(f"请求体解压失败: {e}") from e
+            size += len(output)
+            if max_size is not None and size > max_size:
+                raise DecompressionError('请求体解压后过大', 413)
+            body.write(output)
+    except BaseException:
+        body.close()
+        raise
+
+    body.seek(0)
+    return body, size
+
+
+class DecompressingMiddleware:
+    """
+    WSGI中间件：解压带 Content-Encoding 的请求体，应用看到的是解压后的内容和长度
+
+    Args:
+        wsgi_app: WSGI应用
+        max_size (int): 解压后允许的最大字节数，None为不限制
+    """
+
+    def __init__(self, wsgi_app, max_size=None):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.wsgi_app(environ, start_response)
+
+        content_length = environ.get('CONTENT_LENGTH')
+        try:
+            body, size = decompress_stream(environ['wsgi.input'], encoding,
+                                           int(content_length) if content_length else None, self.max_size)
+        except DecompressionError as e:
+            message = str(e).encode('utf-8')
+            status = {400: '400 Bad Request', 413: '413 Request Entity Too Large',
+                      415: '415 Unsupported Media Type'}[e.status]
+            start_response(status, [('Content-Type', 'text/plain; charset=utf-8'),
+                                    ('Content-Length', str(len(message)))])
+            return [message]
+
+        environ = dict(environ)
+        environ['wsgi.input'] = body
+        environ['CONTENT_LENGTH'] = str(size)
+        environ['vmcg.request_encoding'] = encoding
+        del environ['HTTP_CONTENT_ENCODING']
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            # 应用在返回前已读取请求体
+            body.close()
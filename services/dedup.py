@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+配置去重存储
+同一集群中的虚拟机大多使用相同的CPU、启动、显示和高级选项，以及相同的磁盘、网卡参数。
+存储时按内容寻址：
+- 配置按分组（cpu、boot、display、advanced、disks、network）计算指纹，相同内容的分组只保存一份，按引用计数释放
+- 磁盘和网卡的值拆为卷名/MAC（每台虚拟机不同）和其后的参数串（如 cache=writeback,discard=on），参数串归入分组
+- 键、键的顺序和较短的值（如 2048、host）只保存一份
+所有分组都相同的虚拟机属于同一个 profile，"哪些虚拟机使用这个 profile" 是按指纹的字典查找
+"""
+
+import hashlib
+import json
+import re
+
+# 分组及其中的键，同时包含PVE配置和Libvirt解析结果中的键
+SECTIONS = {
+    'cpu': ('cores', 'sockets', 'vcpus', 'vcpu', 'cpu', 'cpu_mode', 'cpu_check', 'numa', 'cpuunits', 'cpulimit',
+            'affinity', 'cpu_pinning'),
+    'boot': ('boot', 'bios', 'machine', 'arch', 'acpi', 'kvm', 'ostype', 'onboot', 'startup', 'agent'),
+    'display': ('vga', 'serial0', 'usb0', 'keyboard', 'tablet', 'audio0'),
+    'advanced': ('hotplug', 'protection', 'hugepages', 'balloon', 'tags', 'localtime', 'tdf'),
+    'disks': ('scsihw', 'discard', 'cache', 'disk_profile', 'disk_format', 'preallocation', 'cluster_size',
+              'lazy_refcounts', 'extended_l2'),
+    'network': ('bridge', 'firewall', 'mtu', 'net_multiqueue'),
+}
+
+# 卷名或MAC在前、参数串在后的设备键，参数串归入对应分组
+DEVICE_KEYS = {
+    'disks': re.compile(r'^(scsi|virtio|ide|sata|efidisk|tpmstate)[0-9]+$'),
+    'network': re.compile(r'^net[0-9]+$'),
+}
+
+KEY_SECTIONS = {key: name for name, keys in SECTIONS.items() for key in keys}
+
+
+def fingerprint(section):
+    """分组内容的指纹"""
+    data = json.dumps(section, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _section_of(key):
+    name = KEY_SECTIONS.get(key)
+    if name is None:
+        for device_section, pattern in DEVICE_KEYS.items():
+            if pattern.match(key):
+                return device_section
+    return name
+
+
+# 不超过该长度的值（如 2048、host、1）在虚拟机之间大多重复，保存唯一实例；更长的值（名称、UUID、卷名）大多各不相同
+INTERN_MAX_LENGTH = 16
+
+
+class _Record:
+    """一台虚拟机：键的顺序、profile 指纹，以及分组之外的键和值"""
+
+    __slots__ = ('order', 'profile', 'own_keys', 'own_values')
+
+    def __init__(self, order, profile, own_keys, own_values):
+        self.order = order
+        self.profile = profile
+        self.own_keys = own_keys
+        self.own_values = own_values
+
+
+class ConfigStore:
+    """
+    按内容寻址去重的配置存储
+
+    以ID（如配置文件路径）保存配置，可查询共用某个 profile（全部分组都相同）或某个分组的虚拟机
+    """
+
+    def __init__(self):
+        self._records = {}   # ID -> _Record
+        self._sections = {}  # 分组指纹 -> [分组名, 内容, 引用数, 内容键]
+        self._profiles = {}  # profile 指纹 -> [{分组名: 分组指纹}, 使用它的ID集合, 内容键]
+        # 分组内容（可哈希时）到指纹的映射，相同内容不重复计算指纹
+        self._section_index = {}
+        self._profile_index = {}
+        self._strings = {}   # 键、短值和键顺序的唯一实例
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, item_id):
+        return item_id in self._records
+
+    def add(self, item_id, config):
+        """
+        保存配置，已存在时替换
+
+        Returns:
+            str: profile 指纹
+        """
+        self.remove(item_id)
+        intern = self._intern
+        sections = {}
+        own = {}
+        order = []
+        for key, value in config.items():
+            key = intern(str(key))
+            order.append(key)
+            name = _section_of(key)
+            if name is None:
+                own[key] = intern(value) if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH else value
+            elif name in DEVICE_KEYS and isinstance(value, str):
+                # 卷名/MAC 每台虚拟机不同，参数串归入分组
+                head, sep, options = value.partition(',')
+                own[key] = head
+                sections.setdefault(name, {})[key] = options if sep else None
+            else:
+                sections.setdefault(name, {})[key] = value
+
+        section_fps = {name: self._acquire_section(name, section) for name, section in sections.items()}
+        profile_key = tuple(section_fps.items())
+        profile = self._profile_index.get(profile_key)
+        if profile is None:
+            profile = fingerprint(section_fps)
+            self._profile_index[profile_key] = profile
+            self._profiles[profile] = [section_fps, set(), profile_key]
+        self._profiles[profile][1].add(item_id)
+        self._records[item_id] = _Record(intern(tuple(order)), profile, intern(tuple(own)), tuple(own.values()))
+        return profile
+
+    def remove(self, item_id):
+        """删除配置，不再被引用的分组同时释放"""
+        record = self._records.pop(item_id, None)
+        if record is None:
+            return False
+        section_fps, members, profile_key = self._profiles[record.profile]
+        members.discard(item_id)
+        if not members:
+            del self._profiles[record.profile]
+            del self._profile_index[profile_key]
+        for fp in section_fps.values():
+            entry = self._sections[fp]
+            entry[2] -= 1
+            if not entry[2]:
+                del self._sections[fp]
+                self._section_index.pop(entry[3], None)
+        return True
+
+    def get(self, item_id):
+        """按原来的键顺序还原配置，不存在时返回 None"""
+        record = self._records.get(item_id)
+        if record is None:
+            return None
+        values = {}
+        for fp in self._profiles[record.profile][0].values():
+            values.update(self._sections[fp][1])
+        own = dict(zip(record.own_keys, record.own_values))
+        config = {}
+        for key in record.order:
+            if key in own and key in values:
+                # 设备键：卷名/MAC + 参数串
+                options = values[key]
+                config[key] = own[key] + ',' + options if options is not None else own[key]
+            elif key in own:
+                config[key] = own[key]
+            else:
+                config[key] = values[key]
+        return config
+
+    def fingerprints(self, item_id):
+        """
+        配置的指纹
+
+        Returns:
+            dict: profile 和 sections（分组名 -> 指纹）；不存在时返回 None
+        """
+        record = self._records.get(item_id)
+        if record is None:
+            return None
+        return {'profile': record.profile, 'sections': dict(self._profiles[record.profile][0])}
+
+    def sharing(self, fp):
+        """
+        共用某个 profile 或分组的配置
+
+        Returns:
+            dict: kind（profile 或分组名）、content（各分组指纹或分组内容）、members（ID列表）；指纹不存在时返回 None
+        """
+        profile = self._profiles.get(fp)
+        if profile is not None:
+            return {'kind': 'profile', 'content': dict(profile[0]), 'members': sorted(profile[1])}
+        entry = self._sections.get(fp)
+        if entry is None:
+            return None
+        # 分组的使用者是包含该分组的各 profile 的使用者，profile 的种类远少于虚拟机数
+        members = set()
+        for section_fps, profile_members, _ in self._profiles.values():
+            if section_fps.get(entry[0]) == fp:
+                members.update(profile_members)
+        return {'kind': entry[0], 'content': dict(entry[1]), 'members': sorted(members)}
+
+    def top_profiles(self, limit=20):
+        """使用最多的 profile：指纹和虚拟机数"""
+        counts = sorted(((len(profile[1]), fp) for fp, profile in self._profiles.items()), reverse=True)[:limit]
+        return [{'profile': fp, 'count': count} for count, fp in counts]
+
+    def stats(self):
+        return {
+            'configs': len(self._records),
+            'profiles': len(self._profiles),
+            'sections': {name: sum(1 for entry in self._sections.values() if entry[0] == name)
+                         for name in SECTIONS},
+            'strings': len(self._strings),
+        }
+
+    def _acquire_section(self, name, section):
+        """返回分组指纹并增加引用数，新内容只保存一份"""
+        try:
+            content_key = (name, tuple(section.items()))
+            fp = self._section_index.get(content_key)
+        except TypeError:
+            # 值不可哈希（如列表），每次计算指纹
+            content_key, fp = None, None
+        if fp is None:
+            fp = fingerprint(section)
+        entry = self._sections.get(fp)
+        if entry is None:
+            intern = self._intern
+            entry = self._sections[fp] = [name, {intern(k): intern(v) if isinstance(v, str) else v
+                                                 for k, v in section.items()}, 0, content_key]
+            if content_key is not None:
+                self._section_index[content_key] = fp
+        entry[2] += 1
+        return fp
+
+    def _intern(self, value):
+        """返回相同内容的唯一实例（只用于字符串和字符串元组）"""
+        return self._strings.setdefault(value, value)
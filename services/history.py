@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+配置历史
+每次保存配置只追加与上一版本相比变化的键（逐键增量），不改写旧记录；每隔若干版本写入一份完整快照，
+重建任意版本时从该版本之前最近的快照开始，最多重放快照间隔个版本的增量。
+版本按 (配置ID, 版本号) 和 (配置ID, 保存时间) 建索引，按版本号或时间点查找、按页列出变化都是索引查找，
+与历史长度无关
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS history_heads (
+    config_id TEXT PRIMARY KEY,
+    config_type TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    snapshot_version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history_versions (
+    config_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    saved_at REAL NOT NULL,
+    config_type TEXT NOT NULL,
+    changed INTEGER NOT NULL,
+    PRIMARY KEY (config_id, version)
+);
+CREATE INDEX IF NOT EXISTS history_versions_time ON history_versions (config_id, saved_at);
+CREATE TABLE IF NOT EXISTS history_deltas (
+    config_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (config_id, version, key)
+);
+CREATE INDEX IF NOT EXISTS history_deltas_key ON history_deltas (config_id, key, version);
+CREATE TABLE IF NOT EXISTS history_snapshots (
+    config_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    PRIMARY KEY (config_id, version)
+);
+'''
+
+CONFIG_ID_RE = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+
+
+class HistoryError(ValueError):
+    """配置历史的请求参数无效"""
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+class ConfigHistory:
+    """
+    配置历史存储
+
+    Args:
+        db_path (str): SQLite数据库路径，':memory:' 表示不落盘
+        snapshot_every (int): 每隔多少个版本写入一份完整快照
+    """
+
+    def __init__(self, db_path, snapshot_every=50):
+        self.snapshot_every = max(1, int(snapshot_every))
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+
+        with self._db_lock:
+            if db_path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def record(self, config_id, config, config_type='pve'):
+        """
+        保存一个版本，只记录变化的键；与当前版本相同时不增加版本
+
+        Args:
+            config_id (str): 配置ID
+            config (dict): 完整配置
+            config_type (str): 配置类型
+
+        Returns:
+            dict: config_id、version、changed（变化的键数）
+        """
+        if not isinstance(config_id, str) or not CONFIG_ID_RE.match(config_id):
+            raise HistoryError('配置ID只能包含字母、数字和 _.:-，最长64个字符')
+        if not isinstance(config, dict):
+            raise HistoryError('配置必须是对象')
+        encoded = {str(key): _encode(value) for key, value in config.items()}
+
+        with self._db_lock:
+            head = self._db.execute('SELECT * FROM history_heads WHERE config_id = ?', (config_id,)).fetchone()
+            previous = json.loads(head['config']) if head is not None else {}
+            deltas = [(key, value) for key, value in encoded.items() if previous.get(key) != value]
+            deltas += [(key, None) for key in previous if key not in encoded]
+            if head is not None and not deltas and head['config_type'] == config_type:
+                return {'config_id': config_id, 'version': head['version'], 'changed': 0}
+
+            now = time.time()
+            version = head['version'] + 1 if head is not None else 1
+            # 保存时间不早于上一版本，按时间查找与按版本号的顺序一致
+            saved_at = max(now, head['updated_at']) if head is not None else now
+            snapshot_version = head['snapshot_version'] if head is not None else 0
+            head_config = json.dumps(encoded, ensure_ascii=False)
+
+            self._db.execute(
+                'INSERT INTO history_versions (config_id, version, saved_at, config_type, changed) '
+                'VALUES (?, ?, ?, ?, ?)', (config_id, version, saved_at, config_type, len(deltas)))
+            self._db.executemany(
+                'INSERT INTO history_deltas (config_id, version, key, value) VALUES (?, ?, ?, ?)',
+                ((config_id, version, key, value) for key, value in deltas))
+            if version - snapshot_version >= self.snapshot_every:
+                # 快照：之后的重建从这里开始，不再重放之前的增量
+                self._db.execute('INSERT INTO history_snapshots (config_id, version, config) VALUES (?, ?, ?)',
+                                 (config_id, version, head_config))
+                snapshot_version = version
+            self._db.execute(
+                'INSERT INTO history_heads (config_id, config_type, version, snapshot_version, created_at, '
+                'updated_at, config) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (config_id) DO UPDATE SET config_type = excluded.config_type, '
+                'version = excluded.version, snapshot_version = excluded.snapshot_version, '
+                'updated_at = excluded.updated_at, config = excluded.config',
+                (config_id, config_type, version, snapshot_version, saved_at, saved_at, head_config))
+            self._db.commit()
+        return {'config_id': config_id, 'version': version, 'changed': len(deltas)}
+
+    def get(self, config_id):
+        """配置历史概况（不含配置内容），不存在时返回 None"""
+        rows = self._execute(
+            'SELECT config_id, config_type, version, snapshot_version, created_at, updated_at '
+            'FROM history_heads WHERE config_id = ?', (config_id,))
+        return dict(rows[0]) if rows else None
+
+    def config_at(self, config_id, version=None, at=None):
+        """
+        重建某个版本的完整配置
+
+        Args:
+            config_id (str): 配置ID
+            version (int): 版本号，与 at 都不给出时为最新版本
+            at (float): 时间点（Unix时间戳），取该时间之前最后保存的版本
+
+        Returns:
+            dict: version、saved_at、config_type、config；版本不存在时返回 None
+        """
+        with self._db_lock:
+            if at is not None:
+                row = self._db.execute(
+                    'SELECT version, saved_at, config_type FROM history_versions '
+                    'WHERE config_id = ? AND saved_at <= ? ORDER BY saved_at DESC, version DESC LIMIT 1',
+                    (config_id, at)).fetchone()
+            elif version is not None:
+                row = self._db.execute(
+                    'SELECT version, saved_at, config_type FROM history_versions '
+                    'WHERE config_id = ? AND version = ?', (config_id, version)).fetchone()
+            else:
+                row = self._db.execute(
+                    'SELECT version, updated_at AS saved_at, config_type FROM history_heads '
+                    'WHERE config_id = ?', (config_id,)).fetchone()
+            if row is None:
+                return None
+
+            head = self._db.execute('SELECT version, config FROM history_heads WHERE config_id = ?',
+                                    (config_id,)).fetchone()
+            if head['version'] == row['version']:
+                encoded = json.loads(head['config'])
+            else:
+                snapshot = self._db.execute(
+                    'SELECT version, config FROM history_snapshots '
+                    'WHERE config_id = ? AND version <= ? ORDER BY version DESC LIMIT 1',
+                    (config_id, row['version'])).fetchone()
+                encoded = json.loads(snapshot['config']) if snapshot is not None else {}
+                deltas = self._db.execute(
+                    'SELECT key, value FROM history_deltas '
+                    'WHERE config_id = ? AND version > ? AND version <= ? ORDER BY version',
+                    (config_id, snapshot['version'] if snapshot is not None else 0, row['version'])).fetchall()
+                for delta in deltas:
+                    if delta['value'] is None:
+                        encoded.pop(delta['key'], None)
+                    else:
+                        encoded[delta['key']] = delta['value']
+
+        return {
+            'version': row['version'],
+            'saved_at': row['saved_at'],
+            'config_type': row['config_type'],
+            'config': {key: json.loads(value) for key, value in encoded.items()},
+        }
+
+    def changes(self, config_id, offset=1, limit=100, key=None):
+        """
+        按版本号顺序列出每个版本变化的键，可多次调用增量获取
+
+        Args:
+            config_id (str): 配置ID
+            offset (int): 起始版本号
+            limit (int): 最多返回的版本数
+            key (str): 只列出该键变化的版本
+
+        Returns:
+            list: 每项包含 version、saved_at、changes（键 -> 新值）、removed（删除的键）
+        """
+        with self._db_lock:
+            if key is None:
+                versions = self._db.execute(
+                    'SELECT version, saved_at FROM history_versions '
+                    'WHERE config_id = ? AND version >= ? ORDER BY version LIMIT ?',
+                    (config_id, offset, limit)).fetchall()
+                if not versions:
+                    return []
+                deltas = self._db.execute(
+                    'SELECT version, key, value FROM history_deltas '
+                    'WHERE config_id = ? AND version >= ? AND version <= ? ORDER BY version',
+                    (config_id, versions[0]['version'], versions[-1]['version'])).fetchall()
+            else:
+                deltas = self._db.execute(
+                    'SELECT version, key, value FROM history_deltas '
+                    'WHERE config_id = ? AND key = ? AND version >= ? ORDER BY version LIMIT ?',
+                    (config_id, key, offset, limit)).fetchall()
+                if not deltas:
+                    return []
+                versions = self._db.execute(
+                    'SELECT version, saved_at FROM history_versions '
+                    'WHERE config_id = ? AND version >= ? AND version <= ? ORDER BY version',
+                    (config_id, deltas[0]['version'], deltas[-1]['version'])).fetchall()
+
+        items = {}
+        for delta in deltas:
+            items.setdefault(delta['version'], {'changes': {}, 'removed': []})
+            if delta['value'] is None:
+                items[delta['version']]['removed'].append(delta['key'])
+            else:
+                items[delta['version']]['changes'][delta['key']] = json.loads(delta['value'])
+        # 只改变配置类型的版本没有增量
+        return [dict(items.get(row['version'], {'changes': {}, 'removed': []}),
+                     version=row['version'], saved_at=row['saved_at'])
+                for row in versions if key is None or row['version'] in items]
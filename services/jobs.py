@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+后台批量任务
+任务和每一项的结果保存在SQLite中，由进程内线程池执行，支持进度查询、增量获取结果和取消
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+'''
+
+
+class JobError(Exception):
+    """任务提交或查询错误"""
+
+
+class JobManager:
+    """
+    批量任务管理器
+
+    Args:
+        db_path (str): SQLite数据库路径，':memory:' 表示不落盘
+        handlers (dict): 任务类型到处理函数的映射，处理函数接收单项输入并返回结果
+        max_workers (int): 同时执行的任务数
+        max_items (int): 单个任务允许的最大项数
+        commit_every (int): 每处理多少项提交一次结果
+    """
+
+    def __init__(self, db_path, handlers, max_workers=2, max_items=10000, commit_every=50):
+        self.handlers = dict(handlers)
+        self.max_workers = max_workers
+        self.max_items = max_items
+        self.commit_every = commit_every
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        self._cancelled = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='vmcg-job')
+
+        with self._db_lock:
+            if db_path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def _execute(self, sql, params=(), commit=False):
+        with self._db_lock:
+            cursor = self._db.execute(sql, params)
+            rows = cursor.fetchall()
+            if commit:
+                self._db.commit()
+            return rows
+
+    def submit(self, kind, items):
+        """
+        提交任务
+
+        Args:
+            kind (str): 任务类型
+            items (list): 每项的输入数据
+
+        Returns:
+            str: 任务ID
+        """
+        if kind not in self.handlers:
+            raise JobError(f"不支持的任务类型: {kind}")
+        if not isinstance(items, list) or not items:
+            raise JobError('任务项不能为空')
+        if len(items) > self.max_items:
+            raise JobError(f"任务项数量超过上限 {self.max_items}")
+
+        job_id = uuid.uuid4().hex
+        with self._db_lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, kind, status, total, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, QUEUED, len(items), time.time()))
+            self._db.executemany(
+                'INSERT INTO job_items (job_id, idx, payload, status) VALUES (?, ?, ?, ?)',
+                ((job_id, i, json.dumps(item, ensure_ascii=False), QUEUED)
+                 for i, item in enumerate(items)))
+            self._db.commit()
+
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        """重新排队上次进程退出时未完成的任务，已完成的项不会重复执行"""
+        rows = self._execute('SELECT id FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING))
+        for row in rows:
+            self._executor.submit(self._run, row['id'])
+        return len(rows)
+
+    def cancel(self, job_id):
+        """
+        取消任务，正在执行的任务会在当前项处理完后停止
+
+        Returns:
+            bool: 任务是否存在且尚未结束
+        """
+        job = self.get(job_id)
+        if job is None or job['status'] in FINISHED_STATES:
+            return False
+
+        self._cancelled.add(job_id)
+        self._execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+                      (CANCELLED, time.time(), job_id, QUEUED), commit=True)
+        # 任务恰好在此期间执行完毕时不会再检查取消标记
+        job = self.get(job_id)
+        if job['status'] in FINISHED_STATES and job['status'] != CANCELLED:
+            self._cancelled.discard(job_id)
+        return True
+
+    def get(self, job_id):
+        """查询任务进度，不存在时返回None"""
+        rows = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+
+        job = dict(rows[0])
+        processed = job['completed'] + job['failed']
+        job['progress'] = round(processed / job['total'], 4) if job['total'] else 1.0
+        return job
+
+    def list(self, limit=50):
+        """最近提交的任务"""
+        rows = self._execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        return [dict(row) for row in rows]
+
+    def results(self, job_id, offset=0, limit=100):
+        """
+        按顺序获取已处理完成的结果，可多次调用增量获取
+
+        Args:
+            job_id (str): 任务ID
+            offset (int): 起始序号
+            limit (int): 最多返回的项数
+
+        Returns:
+            list: 每项包含 index、status、result 或 error
+        """
+        rows = self._execute(
+            'SELECT idx, status, result, error FROM job_items '
+            'WHERE job_id = ? AND idx >= ? AND status IN (?, ?) ORDER BY idx LIMIT ?',
+            (job_id, offset, DONE, FAILED, limit))
+
+        items = []
+        for row in rows:
+            item = {'index': row['idx'], 'status': row['status']}
+            if row['status'] == DONE:
+                item['result'] = json.loads(row['result'])
+            else:
+                item['error'] = row['error']
+            items.append(item)
+        return items
+
+    def _run(self, job_id):
+        """在线程池中逐项执行任务"""
+        job = self.get(job_id)
+        if job is None or job['status'] in FINISHED_STATES or job_id in self._cancelled:
+            # 排队时被取消的任务不再执行，同时清除取消标记
+            self._cancelled.discard(job_id)
+            return
+
+        handler = self.handlers[job['kind']]
+        self._execute('UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE id = ?',
+                      (RUNNING, time.time(), job_id), commit=True)
+
+        pending = self._execute(
+            'SELECT idx, payload FROM job_items WHERE job_id = ? AND status = ? ORDER BY idx',
+            (job_id, QUEUED))
+
+        updates = []
+        completed = failed = 0
+        try:
+            for row in pending:
+                if job_id in self._cancelled:
+                    break
+
+                try:
+                    result = handler(json.loads(row['payload']))
+                    updates.append((DONE, json.dumps(result, ensure_ascii=False), None,
+                                    job_id, row['idx']))
+                    completed += 1
+                except Exception as e:
+                    updates.append((FAILED, None, str(e), job_id, row['idx']))
+                    failed += 1
+
+                if len(updates) >= self.commit_every:
+                    self._flush(job_id, updates, completed, failed)
+                    updates, completed, failed = [], 0, 0
+
+                # 让出GIL，保证交互式请求的响应
+                time.sleep(0)
+
+            self._flush(job_id, updates, completed, failed)
+        except Exception as e:
+            self._execute('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                          (FAILED, str(e), time.time(), job_id), commit=True)
+            return
+
+        final_status = CANCELLED if job_id in self._cancelled else DONE
+        self._cancelled.discard(job_id)
+        self._execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?',
+                      (final_status, time.time(), job_id), commit=True)
+
+    def _flush(self, job_id, updates, completed, failed):
+        """批量写入结果并更新进度"""
+        if not updates:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                'UPDATE job_items SET status = ?, result = ?, error = ? WHERE job_id = ? AND idx = ?',
+                updates)
+            self._db.execute(
+                'UPDATE jobs SET completed = completed + ?, failed = failed + ? WHERE id = ?',
+                (completed, failed, job_id))
+            self._db.commit()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        with self._db_lock:
+            self._db.close()
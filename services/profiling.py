@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+请求级性能剖析
+使用cProfile和tracemalloc记录转换器调用，结果保存在有界环形缓冲区中
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# tracemalloc是进程级的，多个请求同时剖析时用引用计数控制启停
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class ProfileStore:
+    """
+    剖析结果环形缓冲区，超过容量时丢弃最旧的记录
+
+    Args:
+        capacity (int): 最多保留的剖析记录数
+        top_n (int): 文本摘要中保留的函数/分配行数
+    """
+
+    def __init__(self, capacity=20, top_n=30):
+        self.capacity = capacity
+        self.top_n = top_n
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label, meta=None):
+        """
+        在上下文中运行cProfile和tracemalloc，退出时保存记录
+
+        Args:
+            label (str): 记录名称，通常为请求路径
+            meta (dict): 附加信息，如输出格式
+
+        Yields:
+            dict: 剖析记录，退出上下文后填充统计数据
+        """
+        record = {
+            'id': uuid.uuid4().hex,
+            'label': label,
+            'meta': meta or {},
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+        _start_tracemalloc()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield record
+        finally:
+            profiler.disable()
+            record['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            _stop_tracemalloc()
+
+            self._fill_record(record, profiler, before, after, current, peak)
+            with self._lock:
+                self._records.append(record)
+
+    def _fill_record(self, record, profiler, before, after, current, peak):
+        """整理cProfile和tracemalloc的统计结果"""
+        stats = pstats.Stats(profiler)
+        record['raw_stats'] = marshal.dumps(stats.stats)
+
+        # 按累计耗时排序的文本摘要
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.top_n)
+        record['stats_text'] = stream.getvalue()
+        record['total_calls'] = stats.total_calls
+
+        # 请求期间新增的内存分配
+        diff = after.compare_to(before, 'lineno')
+        record['memory'] = {
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'top_allocations': [str(stat) for stat in diff[:self.top_n]],
+        }
+
+    def list(self):
+        """返回所有记录的摘要（最新的在前）"""
+        with self._lock:
+            records = list(self._records)
+
+        return [{
+            'id': r['id'],
+            'label': r['label'],
+            'meta': r['meta'],
+            'created_at': r['created_at'],
+            'duration_ms': r['duration_ms'],
+            'total_calls': r['total_calls'],
+            'peak_bytes': r['memory']['peak_bytes'],
+        } for r in reversed(records)]
+
+    def get(self, profile_id):
+        """按ID查找记录，不存在时返回None"""
+        with self._lock:
+            for record in self._records:
+                if record['id'] == profile_id:
+                    return record
+        return None
+
+    def clear(self):
+        """清空缓冲区"""
+        with self._lock:
+            self._records.clear()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+目录同步
+监视本地目录（如挂载的 /etc/pve/qemu-server、virsh dumpxml 导出的XML目录），在内存中维护解析后的配置索引：
+- 启动时全量扫描，记录每个文件的 mtime/size 并解析
+- Linux 下用 inotify 得到变化的文件，只重新解析这些文件；inotify 不可用或事件队列溢出时，
+  扫描目录比较 mtime/size，同样只重新解析变化的文件
+- FUSE 文件系统（如 pmxcfs 挂载的 /etc/pve）不一定产生 inotify 事件，使用 inotify 时仍定期比较 mtime/size
+- 解析后的配置保存在去重存储中，相同的分组只保存一份，可按 profile 指纹查找共用的配置文件
+"""
+
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import threading
+import time
+
+from services.dedup import ConfigStore
+
+# 按文件名识别的虚拟机配置：PVE 为 <vmid>.conf，Libvirt 为 *.xml；忽略隐藏文件和编辑器临时文件
+PVE_FILE_RE = re.compile(r'^([0-9]+)\.conf$')
+LIBVIRT_FILE_RE = re.compile(r'^[^.].*\.xml$')
+
+# inotify 事件
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+def file_type(name):
+    """按文件名判断配置类型，不是虚拟机配置时返回 None"""
+    if PVE_FILE_RE.match(name):
+        return 'pve'
+    if LIBVIRT_FILE_RE.match(name):
+        return 'libvirt'
+    return None
+
+
+class _Inotify:
+    """通过 libc 调用 inotify，不可用时构造抛出 OSError"""
+
+    def __init__(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except (AttributeError, TypeError, OSError):
+            raise OSError('系统不支持inotify')
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify初始化失败')
+        self._watches = {}  # 监视描述符 -> 目录
+
+    def watch(self, directory):
+        wd = self._add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录 {directory}")
+        self._watches[wd] = directory
+
+    def read(self, timeout):
+        """
+        等待事件
+
+        Returns:
+            tuple: (事件列表 [(路径, 掩码)], 是否溢出)
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return [], False
+        events, overflow = [], False
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                directory = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                if directory is not None:
+                    events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events, overflow
+
+    def close(self):
+        os.close(self._fd)
+
+
+class DirectoryIndex:
+    """
+    目录中虚拟机配置的解析索引
+
+    Args:
+        directories (list): 监视的目录，包含子目录
+        parsers (dict): 配置类型（pve/libvirt）到解析函数的映射
+        interval (float): 未使用inotify时比较 mtime/size 的间隔秒数
+        rescan_interval (float): 使用inotify时比较 mtime/size 的间隔秒数
+        use_inotify (bool): 是否尝试使用inotify
+    """
+
+    def __init__(self, directories, parsers, interval=2.0, rescan_interval=60.0, use_inotify=True):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.parsers = parsers
+        self.interval = interval
+        self.rescan_interval = rescan_interval
+        self.use_inotify = use_inotify
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # 后台线程和手动扫描不同时进行
+        self._entries = {}  # 路径 -> 条目（不含配置内容）
+        self.store = ConfigStore()  # 路径 -> 解析后的配置
+        self._version = 0
+        self._inotify = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'scans': 0, 'syncs': 0, 'parsed': 0, 'last_scan_ms': None, 'last_sync_ms': None,
+                       'last_sync_at': None}
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify is not None else 'poll'
+
+    def start(self):
+        """在后台线程中全量扫描并持续同步"""
+        self._thread = threading.Thread(target=self._run, name='directory-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def wait_ready(self, timeout=None):
+        """等待首次全量扫描完成"""
+        return self._ready.wait(timeout)
+
+    def scan(self):
+        """
+        遍历所有目录，比较 mtime/size，只解析新增或变化的文件，移除已删除的文件
+
+        Returns:
+            int: 变化的文件数
+        """
+        with self._sync_lock:
+            start = time.perf_counter()
+            with self._lock:
+                known = {path: (entry['mtime_ns'], entry['size']) for path, entry in self._entries.items()}
+            changed = 0
+            for directory in self.directories:
+                for path, stat in self._walk(directory):
+                    if known.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                        changed += self._update(path, stat)
+            # 剩下的是已删除的文件
+            for path in known:
+                changed += self._remove(path)
+            self._stats['scans'] += 1
+            self._stats['last_scan_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return changed
+
+    def sync(self, paths):
+        """
+        只检查给出的路径（inotify 报告的文件或新建的目录）
+
+        Returns:
+            int: 变化的文件数
+        """
+        with self._sync_lock:
+            start = time.perf_counter()
+            changed = 0
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # 文件或目录已删除
+                    changed += self._remove(path)
+                    with self._lock:
+                        prefix = path + os.sep
+                        nested = [p for p in self._entries if p.startswith(prefix)]
+                    for nested_path in nested:
+                        changed += self._remove(nested_path)
+                    continue
+                if os.path.isdir(path):
+                    if self._inotify is not None:
+                        self._watch_tree(path)
+                    for nested_path, nested_stat in self._walk(path):
+                        changed += self._update(nested_path, nested_stat)
+                elif file_type(os.path.basename(path)):
+                    changed += self._update(path, stat)
+            self._stats['syncs'] += 1
+            self._stats['last_sync_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self._stats['last_sync_at'] = time.time()
+            return changed
+
+    def get(self, path):
+        """单个文件的条目（含解析后的配置和分组指纹），不存在时返回 None"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            return dict(entry, config=self.store.get(path), fingerprints=self.store.fingerprints(path))
+
+    def profiles(self, limit=20):
+        """使用最多的 profile 和去重统计"""
+        with self._lock:
+            return {'profiles': self.store.top_profiles(limit), 'stats': self.store.stats()}
+
+    def sharing(self, fp):
+        """使用某个 profile 或分组的配置文件，指纹不存在时返回 None"""
+        with self._lock:
+            return self.store.sharing(fp)
+
+    def list(self, offset=0, limit=100, config_type=None, since=0):
+        """
+        按路径排序分页列出条目（不含配置内容）
+
+        Args:
+            offset (int): 起始位置
+            limit (int): 最多返回的条数
+            config_type (str): 只列出 pve 或 libvirt
+            since (int): 只列出版本号大于该值（之后变化）的条目
+
+        Returns:
+            dict: total、items、next_offset、version
+        """
+        with self._lock:
+            entries = [entry for entry in self._entries.values()
+                       if (config_type is None or entry['type'] == config_type) and entry['version'] > since]
+            version = self._version
+        entries.sort(key=lambda entry: entry['path'])
+        page = entries[offset:offset + limit]
+        next_offset = offset + len(page) if offset + len(page) < len(entries) else None
+        return {
+            'total': len(entries),
+            'items': [dict(entry) for entry in page],
+            'next_offset': next_offset,
+            'version': version,
+        }
+
+    def status(self):
+        with self._lock:
+            files = len(self._entries)
+            errors = sum(1 for entry in self._entries.values() if entry['error'])
+            version = self._version
+        return dict(self._stats, directories=self.directories, mode=self.mode, ready=self._ready.is_set(),
+                    files=files, errors=errors, version=version)
+
+    def _run(self):
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                for directory in self.directories:
+                    self._watch_tree(directory)
+            except OSError:
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        # 先建立监视再扫描，扫描期间的变化不会遗漏
+        self.scan()
+        self._ready.set()
+
+        next_scan = time.monotonic() + (self.rescan_interval if self._inotify is not None else self.interval)
+        while not self._stop.is_set():
+            timeout = max(0.0, next_scan - time.monotonic())
+            if self._inotify is None:
+                self._stop.wait(timeout)
+                overflow, events = True, []
+            else:
+                events, overflow = self._inotify.read(min(timeout, 1.0))
+                overflow = overflow or time.monotonic() >= next_scan
+            if self._stop.is_set():
+                break
+            if overflow:
+                self.scan()
+                next_scan = time.monotonic() + (self.rescan_interval if self._inotify is not None else self.interval)
+            elif events:
+                # 同一文件的多个事件只检查一次
+                self.sync(dict.fromkeys(path for path, _ in events))
+
+    def _watch_tree(self, directory):
+        for root, _, _ in os.walk(directory):
+            try:
+                self._inotify.watch(root)
+            except OSError:
+                pass
+
+    def _walk(self, directory):
+        """递归列出目录中的配置文件及其 stat"""
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif file_type(entry.name) and entry.is_file():
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+    def _update(self, path, stat):
+        """mtime/size 变化时重新解析，返回是否变化"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+                return 0
+
+        name = os.path.basename(path)
+        config_type = file_type(name)
+        config, error = None, None
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode('utf-8', errors='ignore')
+            config = self.parsers[config_type](text)
+        except FileNotFoundError:
+            return self._remove(path)
+        except Exception as e:
+            error = str(e)
+        self._stats['parsed'] += 1
+
+        vmid = PVE_FILE_RE.match(name).group(1) if config_type == 'pve' else (config or {}).get('vmid')
+        with self._lock:
+            self._version += 1
+            if config is not None:
+                profile = self.store.add(path, config)
+            else:
+                # 解析失败时去掉上一次的解析结果
+                self.store.remove(path)
+                profile = None
+            self._entries[path] = {
+                'path': path,
+                'type': config_type,
+                'vmid': vmid,
+                'name': (config or {}).get('name'),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'version': self._version,
+                'profile': profile,
+                'error': error,
+            }
+        return 1
+
+    def _remove(self, path):
+        with self._lock:
+            if self._entries.pop(path, None) is None:
+                return 0
+            self.store.remove(path)
+            self._version += 1
+        return 1
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+轻量级请求链路追踪
+记录上传解码、解析、生成、模板渲染、响应写出等阶段的耗时和数据大小，
+以结构化JSON日志或OTLP JSON文件的形式导出
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+SERVICE_NAME = 'vm-config-generator'
+
+# 当前线程/协程中正在进行的span
+_current_span = ContextVar('vmcg_current_span', default=None)
+
+_exporter = None
+
+
+class _NoopSpan:
+    """未启用追踪时返回的占位span"""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    单个追踪阶段
+
+    Args:
+        trace (Trace): 所属的追踪
+        name (str): 阶段名称
+        parent (Span): 父span，根span为None
+        attributes (dict): 阶段属性，如数据大小
+    """
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent', 'attributes',
+                 'start_ns', 'end_ns', 'status')
+
+    def __init__(self, trace, name, parent=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'ok'
+
+    def set(self, **attributes):
+        """补充属性"""
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self):
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return round((end_ns - self.start_ns) / 1e6, 3)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start_time': self.start_ns / 1e9,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """一次请求的所有span"""
+
+    def __init__(self, exporter):
+        self.trace_id = os.urandom(16).hex()
+        self.exporter = exporter
+        self.spans = []
+        self.root = None
+
+    def finish(self):
+        """结束根span并导出整条追踪"""
+        if self.root is not None:
+            self.root.end()
+        try:
+            self.exporter.export(self)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"导出追踪数据失败: {e}")
+
+
+class LogExporter:
+    """每个span输出一行JSON日志"""
+
+    def __init__(self, logger_name='vmcg.trace'):
+        self.logger = logging.getLogger(logger_name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def export(self, trace):
+        for span in trace.spans:
+            self.logger.info(json.dumps(span.to_dict(), ensure_ascii=False))
+
+
+class OTLPFileExporter:
+    """
+    按OTLP/JSON格式（ExportTraceServiceRequest）每条追踪追加一行到文件，
+    可直接交给OpenTelemetry Collector的otlpjsonfile接收器读取
+
+    Args:
+        path (str): 输出文件路径
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        return {'key': key, 'value': typed}
+
+    def _span(self, span):
+        otlp_span = {
+            'traceId': span.trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 2 if span.parent is None else 1,  # SERVER / INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [self._attribute(k, v) for k, v in span.attributes.items()],
+            'status': {'code': 2 if span.status == 'error' else 1},
+        }
+        if span.parent is not None:
+            otlp_span['parentSpanId'] = span.parent.span_id
+        return otlp_span
+
+    def export(self, trace):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [self._attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'vmcg.tracing'},
+                    'spans': [self._span(span) for span in trace.spans],
+                }],
+            }]
+        }
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class MemoryExporter:
+    """把追踪保存在内存中，便于本地调试"""
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+def configure(exporter_name, trace_file='traces.otlp.jsonl'):
+    """
+    根据名称配置导出器
+
+    Args:
+        exporter_name (str): log、otlp-file、memory，空字符串表示关闭追踪
+        trace_file (str): otlp-file 导出器的输出文件
+
+    Returns:
+        object: 导出器实例，关闭时为None
+    """
+    global _exporter
+
+    if exporter_name == 'log':
+        _exporter = LogExporter()
+    elif exporter_name == 'otlp-file':
+        _exporter = OTLPFileExporter(trace_file)
+    elif exporter_name == 'memory':
+        _exporter = MemoryExporter()
+    else:
+        _exporter = None
+    return _exporter
+
+
+def enabled():
+    return _exporter is not None
+
+
+def start_trace(name, **attributes):
+    """
+    开始一条追踪并把根span设为当前span
+
+    Returns:
+        Trace: 追踪对象，未启用追踪时为None
+    """
+    if _exporter is None:
+        return None
+
+    trace = Trace(_exporter)
+    trace.root = Span(trace, name, attributes=attributes)
+    _current_span.set(trace.root)
+    return trace
+
+
+def current_span():
+    return _current_span.get()
+
+
+def detach():
+    """请求结束后清除当前span，避免后续代码挂到已结束的追踪上"""
+    _current_span.set(None)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    在当前追踪中记录一个阶段，没有进行中的追踪时不做任何记录
+
+    Yields:
+        Span: 当前阶段，可调用 set() 补充属性；未追踪时为占位对象
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(parent.trace, name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = 'error'
+        current.set(error=str(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def _size(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return len(value)
+    return None
+
+
+def traced(name=None):
+    """
+    为函数记录span的装饰器，自动记录首个参数和返回值的大小
+    （字符串为长度，字典为键数量）
+
+    Args:
+        name (str): span名称，默认使用函数名
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+
+            with span(span_name) as current:
+                if args:
+                    input_size = _size(args[0])
+                    if input_size is not None:
+                        current.set(input_size=input_size)
+                result = func(*args, **kwargs)
+                output_size = _size(result)
+                if output_size is not None:
+                    current.set(output_size=output_size)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+"""
+分块续传上传
+大于单次请求上限的配置归档（如 /etc/pve 的 tar.gz/tar.zst 备份）分块上传：创建上传得到上传ID，
+按偏移量依次写入块，中断后查询已接收的偏移量继续上传，最后提交。
+块写入临时文件的同时流式解压并解析tar，每解析出一个虚拟机配置就写入SQLite，内存占用与归档大小无关；
+进程重启后重放临时文件恢复解析状态。zip的目录位于文件末尾，提交时才解析
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # tar.zst 为可选格式
+    zstandard = None
+
+# 上传状态
+RECEIVING = 'receiving'
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    size INTEGER,
+    received INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    sha256 TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS upload_results (
+    upload_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    file_type TEXT NOT NULL,
+    config TEXT,
+    error TEXT,
+    PRIMARY KEY (upload_id, idx)
+);
+'''
+
+# 每次从请求体读取、写入临时文件并解析的数据量
+READ_SIZE = 64 * 1024
+# 解压时单次输出的上限；zstd 接口不能限制输出，分小块输入
+INFLATE_SIZE = 256 * 1024
+ZSTD_SLICE = 256
+
+TAR_BLOCK = 512
+
+# 归档中按路径识别的虚拟机配置
+PVE_MEMBER_RE = re.compile(r'(^|/)qemu-server/[0-9]+\.conf$')
+LIBVIRT_MEMBER_RE = re.compile(r'(^|/)qemu/[^/]+\.xml$')
+
+
+class UploadError(ValueError):
+    """
+    上传请求无效
+
+    Args:
+        message (str): 错误信息
+        status (int): HTTP状态码
+        offset (int): 偏移量不符时服务器已接收的字节数
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def member_type(path):
+    """归档成员对应的配置类型，不是虚拟机配置时返回None"""
+    if PVE_MEMBER_RE.search(path):
+        return 'pve'
+    if LIBVIRT_MEMBER_RE.search(path):
+        return 'libvirt'
+    return None
+
+
+def _octal(field):
+    """tar头中的数字字段（八进制，或GNU的base-256）"""
+    if field[0] & 0x80:
+        return int.from_bytes(field[1:], 'big')
+    field = field.split(b'\0', 1)[0].strip()
+    return int(field, 8) if field else 0
+
+
+def _pax_path(data):
+    """从pax扩展头中取出 path"""
+    pos = 0
+    while pos < len(data):
+        space = data.index(b' ', pos)
+        length = int(data[pos:space])
+        key, _, value = data[space + 1:pos + length - 1].partition(b'=')
+        if key == b'path':
+            return value.decode('utf-8', errors='replace')
+        pos += length
+    return None
+
+
+class _TarReader:
+    """
+    逐块输入的tar解析器，只保留需要的成员内容
+
+    Args:
+        wanted (callable): 路径 -> 是否需要该成员
+        on_member (callable): (路径, 内容) 回调，成员超过大小上限时内容为None
+        max_member_size (int): 单个成员的最大字节数
+    """
+
+    def __init__(self, wanted, on_member, max_member_size):
+        self.wanted = wanted
+        self.on_member = on_member
+        self.max_member_size = max_member_size
+        self._buffer = bytearray()
+        self._state = 'header'
+        self._remaining = 0
+        self._padding = 0
+        self._path = None
+        self._collect = None
+        self._kind = None
+        self._long_path = None
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        pos = 0
+        while pos < len(buffer):
+            if self._state == 'header':
+                if len(buffer) - pos < TAR_BLOCK:
+                    break
+                self._header(bytes(buffer[pos:pos + TAR_BLOCK]))
+                pos += TAR_BLOCK
+            elif self._state == 'data':
+                take = min(self._remaining, len(buffer) - pos)
+                if self._collect is not None:
+                    self._collect += buffer[pos:pos + take]
+                pos += take
+                self._remaining -= take
+                if not self._remaining:
+                    self._end_member()
+            elif self._state == 'padding':
+                take = min(self._padding, len(buffer) - pos)
+                pos += take
+                self._padding -= take
+                if not self._padding:
+                    self._state = 'header'
+            else:
+                # 结束块之后的内容忽略
+                pos = len(buffer)
+        del buffer[:pos]
+
+    def _header(self, block):
+        if block == b'\0' * TAR_BLOCK:
+            self._state = 'end'
+            return
+        checksum = sum(block[:148]) + 8 * 32 + sum(block[156:])
+        if checksum != _octal(block[148:156]):
+            raise UploadError('tar头校验和错误，归档已损坏')
+
+        name = block[:100].split(b'\0', 1)[0]
+        if block[257:262] == b'ustar' and block[345] != 0:
+            name = block[345:500].split(b'\0', 1)[0] + b'/' + name
+        path = name.decode('utf-8', errors='replace')
+        if self._long_path is not None:
+            path, self._long_path = self._long_path, None
+
+        size = _octal(block[124:136])
+        typeflag = block[156:157]
+        if typeflag in (b'L', b'x'):
+            # GNU长文件名和pax扩展头：内容作用于下一个成员
+            self._kind = typeflag
+            collect = True
+        elif typeflag in (b'0', b'\0', b'7'):
+            self._kind = b'0'
+            collect = self.wanted(path)
+        else:
+            self._kind = None
+            collect = False
+
+        self._path = path
+        self._remaining = size
+        self._padding = -size % TAR_BLOCK
+        self._collect = None
+        if collect and size <= self.max_member_size:
+            self._collect = bytearray()
+        elif collect and self._kind == b'0':
+            self.on_member(path, None)
+            self._kind = None
+        self._state = 'data'
+        if not size:
+            self._end_member()
+
+    def _end_member(self):
+        data, self._collect = self._collect, None
+        if data is not None:
+            if self._kind == b'L':
+                self._long_path = bytes(data).split(b'\0', 1)[0].decode('utf-8', errors='replace')
+            elif self._kind == b'x':
+                self._long_path = _pax_path(bytes(data)) or self._long_path
+            else:
+                self.on_member(self._path, bytes(data))
+        self._state = 'padding' if self._padding else 'header'
+
+    def close(self):
+        if self._state != 'end' and (self._state != 'header' or self._buffer):
+            raise UploadError('tar归档不完整')
+
+
+class _PlainReader:
+    """不是归档的单个配置文件"""
+
+    def __init__(self, name, on_member, max_member_size):
+        self.name = name
+        self.on_member = on_member
+        self.max_member_size = max_member_size
+        self._data = bytearray()
+
+    def feed(self, data):
+        self._data += data
+        if len(self._data) > self.max_member_size:
+            raise UploadError('不是支持的归档格式（tar、tar.gz、tar.zst、zip），且超过单个配置文件的大小上限')
+
+    def close(self):
+        self.on_member(self.name, bytes(self._data))
+
+
+class ArchiveParser:
+    """
+    逐块输入的归档解析器：识别gzip/zstd压缩，解压后是tar时逐个成员回调，否则作为单个配置文件
+
+    Args:
+        name (str): 上传的文件名，单个配置文件时作为成员路径
+        wanted (callable): 路径 -> 是否需要该成员
+        on_member (callable): (路径, 内容) 回调，成员超过大小上限时内容为None
+        max_member_size (int): 单个成员的最大字节数
+    """
+
+    def __init__(self, name, wanted, on_member, max_member_size):
+        self.name = name
+        self.wanted = wanted
+        self.on_member = on_member
+        self.max_member_size = max_member_size
+        self.format = None
+        self._head = b''
+        self._inner_head = b''
+        self._decompressor = None
+        self._reader = None
+
+    @property
+    def archived(self):
+        """输入是否为归档（而不是单个配置文件）"""
+        return self.format == 'zip' or isinstance(self._reader, _TarReader)
+
+    def feed(self, data):
+        if self.format is None:
+            self._head += data
+            if len(self._head) < 4:
+                return
+            self._detect()
+            data, self._head = self._head, b''
+        if self.format == 'zip':
+            return
+        for piece in self._decompress(data):
+            self._inner(piece)
+
+    def close(self, spool_path):
+        """输入结束，spool_path 为完整的上传文件（zip在此时解析）"""
+        if self.format is None:
+            self._detect()
+            data, self._head = self._head, b''
+            if self.format != 'zip':
+                for piece in self._decompress(data):
+                    self._inner(piece)
+        if self.format == 'zip':
+            self._read_zip(spool_path)
+            return
+        if self._decompressor is not None and not getattr(self._decompressor, 'eof', True):
+            raise UploadError('压缩数据不完整')
+        if self._reader is None:
+            self._start_reader()
+        self._reader.close()
+
+    def _detect(self):
+        head = self._head
+        if head[:2] == b'\x1f\x8b':
+            self.format = 'gzip'
+            self._decompressor = zlib.decompressobj(31)
+        elif head[:4] == b'\x28\xb5\x2f\xfd':
+            if zstandard is None:
+                raise UploadError('未安装 zstandard，无法解析 zstd 压缩的归档')
+            self.format = 'zstd'
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+            self.format = 'zip'
+        else:
+            self.format = 'raw'
+
+    def _decompress(self, data):
+        """解压输入，每次产生的数据量有上限"""
+        try:
+            if self.format == 'raw':
+                yield data
+            elif self.format == 'gzip':
+                while data:
+                    piece = self._decompressor.decompress(data, INFLATE_SIZE)
+                    if piece:
+                        yield piece
+                    if self._decompressor.eof and self._decompressor.unused_data:
+                        # 多个gzip成员首尾相接
+                        data = self._decompressor.unused_data
+                        self._decompressor = zlib.decompressobj(31)
+                    else:
+                        data = self._decompressor.unconsumed_tail
+            else:
+                for start in range(0, len(data), ZSTD_SLICE):
+                    piece = self._decompressor.decompress(data[start:start + ZSTD_SLICE])
+                    if piece:
+                        yield piece
+                    if self._decompressor.eof and self._decompressor.unused_data:
+                        # 多个zstd帧首尾相接
+                        rest = self._decompressor.unused_data + data[start + ZSTD_SLICE:]
+                        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+                        yield from self._decompress(rest)
+                        return
+        except (zlib.error, getattr(zstandard, 'ZstdError', zlib.error)) as e:
+            raise UploadError(f"解压失败: {e}") from e
+
+    def _inner(self, data):
+        if self._reader is None:
+            self._inner_head += data
+            if len(self._inner_head) < 262:
+                return
+            self._start_reader()
+            return
+        self._reader.feed(data)
+
+    def _start_reader(self):
+        head, self._inner_head = self._inner_head, b''
+        if head[257:262] == b'ustar':
+            self._reader = _TarReader(self.wanted, self.on_member, self.max_member_size)
+        else:
+            name = re.sub(r'\.(gz|zst)$', '', self.name)
+            self._reader = _PlainReader(name, self.on_member, self.max_member_size)
+        self._reader.feed(head)
+
+    def _read_zip(self, spool_path):
+        try:
+            with zipfile.ZipFile(spool_path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not self.wanted(info.filename):
+                        continue
+                    if info.file_size > self.max_member_size:
+                        self.on_member(info.filename, None)
+                        continue
+                    self.on_member(info.filename, archive.read(info))
+        except zipfile.BadZipFile as e:
+            raise UploadError(f"zip归档无效: {e}") from e
+
+
+class _Session:
+    """进行中的上传在内存中的解析状态"""
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+        self.rows = []
+        self.next_index = 0
+        self.skipped = 0
+
+
+class UploadManager:
+    """
+    分块上传管理器
+
+    Args:
+        db_path (str): SQLite数据库路径，':memory:' 表示不落盘
+        spool_dir (str): 存放上传数据的目录
+        parsers (dict): 配置类型（pve/libvirt）到解析函数的映射，解析函数接收文本返回配置字典
+        max_size (int): 单个上传的最大字节数
+        max_member_size (int): 归档中单个配置文件的最大字节数
+        ttl (int): 超过该秒数未更新的上传被清理
+    """
+
+    def __init__(self, db_path, spool_dir, parsers, max_size=1024 ** 3, max_member_size=1024 * 1024,
+                 ttl=24 * 3600):
+        self.spool_dir = spool_dir
+        self.parsers = dict(parsers)
+        self.max_size = max_size
+        self.max_member_size = max_member_size
+        self.ttl = ttl
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+        os.makedirs(spool_dir, exist_ok=True)
+        with self._db_lock:
+            if db_path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def _execute(self, sql, params=(), commit=False):
+        with self._db_lock:
+            cursor = self._db.execute(sql, params)
+            rows = cursor.fetchall()
+            if commit:
+                self._db.commit()
+            return rows
+
+    def _spool_path(self, upload_id):
+        return os.path.join(self.spool_dir, f"{upload_id}.part")
+
+    def create(self, filename, file_type='pve', size=None, sha256=None):
+        """
+        创建上传
+
+        Args:
+            filename (str): 文件名
+            file_type (str): 不是归档时按此类型解析（pve/libvirt）
+            size (int): 文件总大小，提交时核对
+            sha256 (str): 文件的SHA-256，提交时核对
+
+        Returns:
+            str: 上传ID
+        """
+        if file_type not in self.parsers:
+            raise UploadError(f"配置类型必须是 {', '.join(self.parsers)} 之一")
+        if size is not None:
+            if not isinstance(size, int) or size < 0:
+                raise UploadError('size 必须是非负整数')
+            if size > self.max_size:
+                raise UploadError(f"文件超过上传大小上限 {self.max_size} 字节", 413)
+        self.cleanup()
+
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        open(self._spool_path(upload_id), 'wb').close()
+        self._execute(
+            'INSERT INTO uploads (id, filename, file_type, size, status, sha256, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (upload_id, str(filename or 'upload'), file_type, size, RECEIVING, sha256, now, now), commit=True)
+        return upload_id
+
+    def get(self, upload_id):
+        """查询上传进度和已解析的配置数，不存在时返回None"""
+        rows = self._execute('SELECT * FROM uploads WHERE id = ?', (upload_id,))
+        if not rows:
+            return None
+        upload = dict(rows[0])
+        counts = self._execute(
+            'SELECT COUNT(*) AS files, COUNT(config) AS configs FROM upload_results WHERE upload_id = ?',
+            (upload_id,))[0]
+        upload['files'] = counts['files']
+        upload['configs'] = counts['configs']
+        upload['errors'] = counts['files'] - counts['configs']
+        return upload
+
+    def write(self, upload_id, offset, stream, length=None):
+        """
+        在指定偏移量写入一块数据并解析
+
+        Args:
+            upload_id (str): 上传ID
+            offset (int): 块的起始偏移量，必须等于已接收的字节数
+            stream: 块数据的输入流
+            length (int): 块长度，未知时读到流结束
+
+        Returns:
+            int: 写入后已接收的字节数
+
+        Raises:
+            UploadError: 上传不存在或已结束、偏移量不符（409）、超过大小上限（413）或归档无法解析
+        """
+        session, upload = self._session(upload_id)
+        with session.lock:
+            upload = self._check_receiving(upload_id)
+            received = upload['received']
+            if offset != received:
+                raise UploadError(f"偏移量不符，已接收 {received} 字节", 409, received)
+            limit = upload['size'] if upload['size'] is not None else self.max_size
+
+            try:
+                with open(self._spool_path(upload_id), 'ab') as spool:
+                    remaining = length
+                    while remaining is None or remaining > 0:
+                        data = stream.read(READ_SIZE if remaining is None else min(READ_SIZE, remaining))
+                        if not data:
+                            break
+                        if remaining is not None:
+                            remaining -= len(data)
+                        if received + len(data) > limit:
+                            raise UploadError(f"数据超过文件大小 {limit} 字节", 413, received)
+                        spool.write(data)
+                        session.hasher.update(data)
+                        received += len(data)
+                        session.parser.feed(data)
+            except UploadError as e:
+                if e.status != 413:
+                    self._fail(upload_id, session, str(e), received)
+                raise
+            finally:
+                # 连接中断时已写入的部分同样保留，客户端查询偏移量后续传
+                self._flush(upload_id, session, received)
+        return received
+
+    def commit(self, upload_id, sha256=None):
+        """
+        结束上传：核对大小和校验和，解析剩余数据
+
+        Returns:
+            dict: 上传信息（同 get）
+
+        Raises:
+            UploadError: 数据不完整、校验和不符或归档无法解析
+        """
+        session, upload = self._session(upload_id)
+        with session.lock:
+            upload = self._check_receiving(upload_id)
+            if upload['size'] is not None and upload['received'] != upload['size']:
+                raise UploadError(f"上传不完整，已接收 {upload['received']}/{upload['size']} 字节",
+                                  409, upload['received'])
+            expected = sha256 or upload['sha256']
+            if expected and expected.lower() != session.hasher.hexdigest():
+                self._fail(upload_id, session, 'SHA-256校验和不符', upload['received'])
+                raise UploadError('SHA-256校验和不符')
+            try:
+                session.parser.close(self._spool_path(upload_id))
+            except UploadError as e:
+                self._fail(upload_id, session, str(e), upload['received'])
+                raise
+            self._flush(upload_id, session, upload['received'], COMMITTED)
+            self._discard(upload_id)
+        return self.get(upload_id)
+
+    def abort(self, upload_id):
+        """删除上传和已解析的结果"""
+        if self.get(upload_id) is None:
+            return False
+        self._discard(upload_id)
+        with self._db_lock:
+            self._db.execute('DELETE FROM upload_results WHERE upload_id = ?', (upload_id,))
+            self._db.execute('DELETE FROM uploads WHERE id = ?', (upload_id,))
+            self._db.commit()
+        return True
+
+    def results(self, upload_id, offset=0, limit=100):
+        """
+        按顺序获取已解析的配置，上传过程中即可增量获取
+
+        Returns:
+            list: 每项包含 index、path、type 以及 config 或 error
+        """
+        rows = self._execute(
+            'SELECT idx, path, file_type, config, error FROM upload_results '
+            'WHERE upload_id = ? AND idx >= ? ORDER BY idx LIMIT ?',
+            (upload_id, offset, limit))
+        items = []
+        for row in rows:
+            item = {'index': row['idx'], 'path': row['path'], 'type': row['file_type']}
+            if row['config'] is not None:
+                item['config'] = json.loads(row['config'])
+            else:
+                item['error'] = row['error']
+            items.append(item)
+        return items
+
+    def cleanup(self):
+        """清理超过 ttl 未更新的上传"""
+        rows = self._execute('SELECT id FROM uploads WHERE updated_at < ?', (time.time() - self.ttl,))
+        for row in rows:
+            self.abort(row['id'])
+        return len(rows)
+
+    def _check_receiving(self, upload_id):
+        upload = self.get(upload_id)
+        if upload is None:
+            raise UploadError('上传不存在', 404)
+        if upload['status'] != RECEIVING:
+            raise UploadError(f"上传已结束（{upload['status']}）", 409, upload['received'])
+        return upload
+
+    def _session(self, upload_id):
+        """取得上传的解析状态，进程重启后重放已接收的数据恢复"""
+        upload = self._check_receiving(upload_id)
+        with self._sessions_lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session, upload
+            session = self._new_session(upload)
+            # 重放完成前其他请求等待该锁
+            session.lock.acquire()
+            self._sessions[upload_id] = session
+
+        try:
+            self._execute('DELETE FROM upload_results WHERE upload_id = ?', (upload_id,), commit=True)
+            received = 0
+            try:
+                with open(self._spool_path(upload_id), 'rb') as spool:
+                    for data in iter(lambda: spool.read(READ_SIZE), b''):
+                        session.hasher.update(data)
+                        received += len(data)
+                        session.parser.feed(data)
+            except FileNotFoundError:
+                pass
+            except UploadError as e:
+                self._fail(upload_id, session, str(e), received)
+            self._flush(upload_id, session, received)
+        finally:
+            session.lock.release()
+        return session, upload
+
+    def _new_session(self, upload):
+        session = None
+
+        def on_member(path, data):
+            file_type = member_type(path) if session.parser.archived else upload['file_type']
+            config, error = None, None
+            if data is None:
+                error = '配置文件过大'
+            else:
+                text = data.decode('utf-8', errors='ignore')
+                if session.parser.archived and file_type == 'libvirt' and '<domain' not in text:
+                    # qemu 目录下的其他XML（如网络定义）
+                    session.skipped += 1
+                    return
+                try:
+                    config = json.dumps(self.parsers[file_type](text), ensure_ascii=False)
+                except Exception as e:
+                    error = str(e)
+            session.rows.append((upload['id'], session.next_index, path, file_type, config, error))
+            session.next_index += 1
+
+        def wanted(path):
+            if member_type(path) is not None:
+                return True
+            session.skipped += 1
+            return False
+
+        session = _Session(ArchiveParser(upload['filename'], wanted, on_member, self.max_member_size))
+        return session
+
+    def _flush(self, upload_id, session, received, status=None):
+        """写入解析结果并更新进度"""
+        rows, session.rows = session.rows, []
+        with self._db_lock:
+            if rows:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO upload_results (upload_id, idx, path, file_type, config, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self._db.execute(
+                'UPDATE uploads SET received = ?, skipped = ?, updated_at = ?, status = COALESCE(?, status) '
+                'WHERE id = ?',
+                (received, session.skipped, time.time(), status, upload_id))
+            self._db.commit()
+
+    def _fail(self, upload_id, session, error, received):
+        self._flush(upload_id, session, received, FAILED)
+        self._execute('UPDATE uploads SET error = ? WHERE id = ?', (error, upload_id), commit=True)
+        self._discard(upload_id)
+
+    def _discard(self, upload_id):
+        """删除临时文件和内存中的解析状态"""
+        with self._sessions_lock:
+            self._sessions.pop(upload_id, None)
+        try:
+            os.remove(self._spool_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self):
+        with self._db_lock:
+            self._db.close()